@@ -1,21 +1,39 @@
 # Replace the load_dotenv() section with:
+import time
+SCRIPT_START = time.perf_counter()
+
 import streamlit as st
-import os
+STREAMLIT_IMPORT_SECONDS = time.perf_counter() - SCRIPT_START
 
-# For Streamlit Cloud deployment
-if 'GEMINI_API_KEY' in st.secrets:
-    os.environ['GEMINI_API_KEY'] = st.secrets['GEMINI_API_KEY']
+import os
+import sys
+import argparse
+import base64
+import importlib
+import logging
     
-import pandas as pd
-import google.generativeai as genai
+# pandas, google.generativeai and PyPDF2 are imported on first use (see lazy_import)
 from dotenv import load_dotenv
-import time
-import PyPDF2
 from pathlib import Path
 import json
 from datetime import datetime
 import re
 import tempfile
+import copy
+import hashlib
+import threading
+import sqlite3
+import uuid
+import zlib
+import io
+import bisect
+import shutil
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
 
 APP_VERSION = "1.0.3"  # Change this to track versions
 
@@ -24,40 +42,99 @@ APP_VERSION = "1.0.3"  # Change this to track versions
 # Load environment variables
 load_dotenv()
 
-# Configure page
-st.set_page_config(
-    page_title=f"Notariële Clausule Processor v{APP_VERSION}",
-    page_icon="🏛️",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+logger = logging.getLogger("notarial_clause_processor")
+
+# ============= APP SETUP =============
+
+@st.cache_resource(show_spinner=False)
+def get_startup_timings():
+    """Timings of the first script run of this process (cold start), kept across reruns"""
+    return {
+        'script_start': SCRIPT_START,
+        'imports': {'streamlit': STREAMLIT_IMPORT_SECONDS},
+        'first_render': None
+    }
+
+def lazy_import(module_name):
+    """Import a heavy module on first use and record its import time for the startup report"""
+    module = sys.modules.get(module_name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        get_startup_timings()['imports'][module_name] = time.perf_counter() - start
+    return module
+
+def record_render_time():
+    """Record the time to first render of this process, once"""
+    timings = get_startup_timings()
+    if timings['first_render'] is None:
+        timings['first_render'] = time.perf_counter() - timings['script_start']
+
+def show_startup_report():
+    """Sidebar report of the cold start and the current rerun"""
+    timings = get_startup_timings()
+    with st.expander("⏱️ Opstarttijd", expanded=False):
+        if timings['first_render'] is not None:
+            st.caption(f"Eerste render: {timings['first_render']:.2f}s")
+        st.caption(f"Deze run: {time.perf_counter() - SCRIPT_START:.2f}s")
+        for module_name, seconds in sorted(timings['imports'].items(), key=lambda item: -item[1]):
+            st.caption(f"import {module_name}: {seconds * 1000:.0f} ms")
+
+def load_api_key():
+    """Return the Gemini API key from Streamlit secrets (Streamlit Cloud) or the environment"""
+    try:
+        if 'GEMINI_API_KEY' in st.secrets:
+            os.environ['GEMINI_API_KEY'] = st.secrets['GEMINI_API_KEY']
+    except Exception:
+        # No secrets file, e.g. local or headless runs
+        pass
+    return os.getenv('GEMINI_API_KEY')
+
+@st.cache_resource(show_spinner=False)
+def configure_gemini_client(api_key):
+    lazy_import('google.generativeai').configure(api_key=api_key)
+
+def configure_gemini():
+    """Configure the Gemini client once per process; returns False when no API key is available"""
+    api_key = load_api_key()
+    if not api_key:
+        return False
+    configure_gemini_client(api_key)
+    return True
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_model():
+    """One model instance per process, so every session and worker reuses its client connection"""
+    return lazy_import('google.generativeai').GenerativeModel('gemini-2.5-flash-lite')
 
-# Initialize session state
-if 'notarial_info' not in st.session_state:
-    st.session_state.notarial_info = {}
-if 'processed_clauses' not in st.session_state:
-    st.session_state.processed_clauses = {}
-if 'source_content' not in st.session_state:
-    st.session_state.source_content = ""
-if 'current_step' not in st.session_state:
-    st.session_state.current_step = 'intake'
-if 'user_answers' not in st.session_state:
-    st.session_state.user_answers = {}
-if 'csv_data' not in st.session_state:
-    st.session_state.csv_data = None
-if 'processing_state' not in st.session_state:
-    st.session_state.processing_state = {}
-if 'current_questions' not in st.session_state:
-    st.session_state.current_questions = []
-if 'question_index' not in st.session_state:
-    st.session_state.question_index = 0
-
-# Configure Gemini API
-if os.getenv('GEMINI_API_KEY'):
-    genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-else:
-    st.error("⚠️ GEMINI_API_KEY not found in environment variables!")
-    st.stop()
+def init_session_state():
+    """Initialize the Streamlit session state"""
+    if 'notarial_info' not in st.session_state:
+        st.session_state.notarial_info = {}
+    if 'processed_clauses' not in st.session_state:
+        st.session_state.processed_clauses = {}
+    if 'source_manifest' not in st.session_state:
+        st.session_state.source_manifest = ()
+    if 'source_normalization' not in st.session_state:
+        st.session_state.source_normalization = []
+    if 'current_step' not in st.session_state:
+        st.session_state.current_step = 'intake'
+    if 'user_answers' not in st.session_state:
+        st.session_state.user_answers = {}
+    if 'csv_data' not in st.session_state:
+        st.session_state.csv_data = None
+    if 'processing_state' not in st.session_state:
+        st.session_state.processing_state = {}
+    if 'deferred_clauses' not in st.session_state:
+        st.session_state.deferred_clauses = {}
+    if 'llm_call_log' not in st.session_state:
+        st.session_state.llm_call_log = []
+    if 'clause_fingerprints' not in st.session_state:
+        st.session_state.clause_fingerprints = {}
+    if 'prefetch_cache' not in st.session_state:
+        st.session_state.prefetch_cache = {}
+    if 'prefetch_stats' not in st.session_state:
+        st.session_state.prefetch_stats = {'started': 0, 'hits': 0, 'late_hits': 0, 'misses': 0, 'stale': 0}
 
 # Essential clauses that should always be kept
 ESSENTIAL_CLAUSES = [
@@ -70,50 +147,808 @@ ESSENTIAL_CLAUSES = [
     54, 55, 56, 57, 58, 59, 60  # 54-60
 ]
 
+# Category 1a clauses: skipped unless the dossier contains positive evidence.
+# Each entry lists the keywords/phrases that count as evidence (lowercase). Keyed on the clause
+# number (see get_clause_number); essential clauses such as 26 BOSDECREET are never skipped, so
+# they have no entry.
+FACTUAL_CLAUSE_EVIDENCE = {
+    # Clauses 28-32 each cover a specific right of pre-emption
+    **{number: {
+        'label': 'VOORKOOPRECHTEN',
+        'terms': ['voorkooprecht', 'recht van voorkoop', 'voorkoopgerechtigd']
+    } for number in range(28, 33)},
+    37: {
+        'label': 'RISICOGROND',
+        'terms': ['risicogrond', 'risico-inrichting', 'risico inrichting', 'bodemverontreiniging',
+                  'bodemsanering', 'oriënterend bodemonderzoek', 'orienterend bodemonderzoek']
+    },
+    39: {
+        'label': 'STOOKOLIETANKS',
+        'terms': ['stookolietank', 'stookolie', 'mazouttank', 'mazout', 'brandstoftank',
+                  'ondergrondse tank', 'bovengrondse tank', 'tankattest', 'tankkeuring']
+    },
+    45: {
+        'label': 'ALARMINSTALLATIE',
+        'terms': ['alarminstallatie', 'alarmsysteem', 'inbraakalarm', 'alarmcentrale',
+                  'inbraakbeveiliging', 'beveiligingssysteem']
+    },
+    46: {
+        'label': 'ZONNEPANELEN',
+        'terms': ['zonnepaneel', 'zonnepanelen', 'fotovoltaïsche', 'fotovoltaische',
+                  'pv-installatie', 'pv installatie', 'zonneboiler', 'groenestroomcertificaten']
+    },
+    53: {
+        'label': 'VERWIJZING VORIGE AKTE',
+        'terms': ['basisakte', 'verkavelingsakte', 'verkavelingsvergunning', 'splitsingsakte',
+                  'reglement van mede-eigendom']
+    },
+}
+
+# Clause categorisation rules shared by the per-clause and batch applicability agents
+CLAUSE_KNOWLEDGE_BASE = """GOUDEN REGEL: HET DOSSIER IS DE VOLLEDIGE EN ENIGE WAARHEID
+Je analyseert enkel en alleen de informatie in [Klantinformatie] en [Documenten]. Je hanteert het onwrikbare principe dat dit dossier 100% compleet is. De afwezigheid van informatie over een feit (bv. Bosdecreet, stookolietank) is voor jou het definitieve bewijs dat dit feit niet van toepassing is.
+
+CLAUSULE KENNISBANK
+Je categoriseert elke clausule en past de bijbehorende logica strikt toe.
+
+Categorie 1a: Feitelijk Bepaalde Clausules
+Logica: SCHRAPPEN, tenzij er positief bewijs in het dossier is.
+- Clausule 26 "BOSDECREET": Schrappen, tenzij een document vermeldt dat het goed onder het Bosdecreet valt.
+- Clausules 28-32 "Specifieke Voorkooprechten": Schrappen, tenzij een document de toepassing bevestigt.
+- Clausule 37 "RISICOGROND": Schrappen, tenzij een document de grond als 'risicogrond' classificeert.
+- Clausule 39 "STOOKOLIETANKS": Schrappen, tenzij het dossier de aanwezigheid vermeldt.
+- Clausule 45 "ALARMINSTALLATIE": Schrappen, tenzij het dossier de aanwezigheid vermeldt.
+- Clausule 46 "ZONNEPANELEN": Schrappen, tenzij het dossier de aanwezigheid vermeldt.
+- Clausule 53 "VERWIJZING VORIGE AKTE": Schrappen, tenzij het dossier een basisakte/verkavelingsakte bevat.
+
+Categorie 1b: Juridisch Bepaalde & Optionele Clausules
+Logica: BEHOUDEN als de situatie van de partijen het relevant maakt, tenzij het juridisch onmogelijk is.
+- Clausule 8 "BEDING VAN AANWAS MET OPTIE":
+  * Schrappen indien juridisch onmogelijk/irrelevant: Er is slechts één koper OF de kopers zijn gehuwd.
+  * Anders, BEHOUDEN: (bv. bij wettelijk samenwonenden) als relevante optie voor de cliënten.
+- Clausule 9 "ONVERDEELDHEID TUSSEN KOPERS":
+  * Schrappen indien irrelevant: clausule is niet toepasbaar indien de Kopers NIET zijn gehuwd. 
+  * Anders, BEHOUDEN: als standaardregeling of te bespreken optie.
+- Clausule 10 "VERKLARING ANTICIPATIEVE INBRENG":
+  * Schrappen indien juridisch onmogelijk/irrelevant: Er is slechts één koper OF de kopers zijn reeds gehuwd.
+  * Anders, BEHOUDEN: (bv. bij wettelijk/feitelijk samenwonenden) als relevante optie.
+- Clausule 11 "VRUCHTGEBRUIK/BLOTE EIGENDOM": Schrappen indien het dossier een aankoop in volle eigendom bevestigt.
+- Clausule 13 "GEZINSWONING": Schrappen, enkel als de verkoper niet gehuwd/wettelijk samenwonend is OF als het pand expliciet niet de gezinswoning is.
+- Clausule 51 "OVEREENKOMST KOPERS" (Schuldvordering):
+  * Schrappen indien irrelevant: Er is slechts één koper.
+  * Anders, BEHOUDEN: als relevante optie om een eventuele ongelijke inbreng te regelen.
+
+Categorie 2: Essentiële Clausules (Nooit verwijderen)
+Deze clausules (1-7, 15-27, 33-36, 38, 40, 41, 44, 47-50, 52, 54-60, etc.) zijn fundamenteel en worden ALTIJD behouden."""
+
+# Number of clauses evaluated per batch applicability call
+BATCH_APPLICABILITY_CHUNK_SIZE = 12
+
+# Canonical keys for questions that different clauses ask in different words. Every key names one
+# fact, never a whole topic ("EPC score" and "datum EPC" are different answers).
+# A question maps to a key when all fragments of one of the alternatives occur in it; the first key wins.
+CANONICAL_QUESTION_KEYS = {
+    'gezinswoning': [['gezinswoning'], ['gezinsverblijf'], ['woning', 'gezin']],
+    'beding_van_aanwas': [['aanwas']],
+    'tontine': [['tontine']],
+    'elektrische_keuring_datum': [['keuring', 'elektr', 'datum'], ['keuringsdatum', 'elektr'], ['keuring', 'elektr', 'wanneer']],
+    'epc_datum': [['epc', 'datum'], ['energieprestatie', 'datum']],
+    'epc_score': [['epc', 'score'], ['epc', 'kwh'], ['energieprestatie', 'score'], ['energielabel']],
+    'epc_nummer': [['epc', 'nummer'], ['energieprestatie', 'nummer']],
+    'stookolietank_inhoud': [['stookolie', 'inhoud'], ['stookolie', 'liter'], ['mazout', 'inhoud'], ['mazout', 'liter']],
+    'stookolietank_attest': [['stookolie', 'attest'], ['mazout', 'attest'], ['tankattest']],
+    'bodemattest_datum': [['bodemattest', 'datum']],
+    'koopsom': [['koopsom'], ['verkoopprijs'], ['aankoopprijs']],
+    'kadastraal_inkomen': [['kadastra', 'inkomen']],
+    'kadastraal_perceel': [['kadast', 'perceel'], ['kadast', 'sectie']],
+    'rijksregisternummer': [['rijksregister']],
+    'burgerlijke_staat': [['burgerlijke', 'staat']],
+    'huwelijksstelsel': [['huwelijksstelsel'], ['huwelijkscontract'], ['huwelijksvermogensstelsel']],
+}
+
+# Topics whose yes/no presence question ("Is er een stookolietank?") may be answered once for all
+# clauses; any other question about them only matches a fact key above
+PRESENCE_QUESTION_TOPICS = {
+    'stookolietank': [['stookolie'], ['mazout']],
+    'zonnepanelen': [['zonnepan'], ['fotovolta']],
+    'alarminstallatie': [['alarm']],
+    'epc': [['epc'], ['energieprestatie']],
+    'bodemattest': [['bodemattest']],
+}
+PRESENCE_QUESTION_PATTERN = re.compile(r'\b(?:is|zijn) er\b|\baanwezig|\bbeschikt\b|\bheeft\b.*\b(?:een|geen)\b')
+
+# Canonical keys that are asked per party ("rijksregisternummer verkoper 2")
+PARTY_SPECIFIC_QUESTION_KEYS = {'rijksregisternummer', 'burgerlijke_staat', 'huwelijksstelsel'}
+
+# Shared limits for all LLM calls of this process (one API key)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '60'))
+
+# How parties are written in prompts: 'table' (header row plus one row per party) or 'lines' (one line per field)
+PARTY_ENCODING = os.getenv('PARTY_ENCODING', 'table')
+
+# Local SQLite store for dossiers, so a refresh or restart can resume where processing stopped
+DOSSIER_DB_PATH = os.getenv('DOSSIER_DB_PATH', 'dossiers.sqlite3')
+
+# Shared content-addressed store for large artifacts (document texts, research JSON)
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', 'blobs')
+
+# Session keys that make up a dossier; caches and widget state are rebuilt after a resume
+PERSISTED_SESSION_KEYS = [
+    'notarial_info', 'source_manifest', 'source_normalization', 'processed_clauses', 'processing_state', 'deferred_clauses',
+    'clause_fingerprints', 'csv_data', 'batch_applicability', 'llm_call_log', 'current_step',
+    'extracted_form_data'
+]
+
+# Intake fields and the prompt terms that make a clause depend on them
+INTAKE_FACT_TOPICS = {
+    'burgerlijke_staat': ['burgerlijke staat', 'gehuwd', 'huwelijk', 'samenwon', 'echtgeno', 'partner', 'gezinswoning'],
+    'aanwezig': ['aanwezig', 'volmacht', 'lasthebber', 'vertegenwoordig'],
+    'aantal': ['aanwas', 'tontine', 'meerdere', 'gezamenlijk', 'onverdeeld', 'slechts één'],
+    'videoconferentie': ['videoconferentie', 'afstand'],
+    'aankoop_wijze': ['lening', 'krediet', 'hypothe', 'eigen middelen', 'financiering'],
+    'verkoop_object': ['woning', 'grond', 'appartement', 'perceel'],
+    'historiek': ['historiek', 'oorsprong'],
+    'verkoper_type': ['vennootschap', 'rechtspersoon'],
+    'koper_type': ['vennootschap', 'rechtspersoon'],
+}
+
+# Intake fields filled into every template prompt by generate_final_clause
+TEMPLATE_INTAKE_FIELDS = {
+    'repertorium_nummer', 'notary_name', 'notary_location', 'notary_office_address', 'dossier_nummer',
+    'ondertekening_datum', 'ondertekening_dag', 'ondertekening_maand_nl', 'videoconferentie'
+}
+
+# Agents read a cached per-document digest plus retrieved excerpts instead of raw corpus slices
+USE_DOCUMENT_DIGEST = os.getenv('USE_DOCUMENT_DIGEST', '1') == '1'
+DIGEST_DOCUMENT_CHARS = 30000
+DIGEST_EXCERPT_CHARS = int(os.getenv('DIGEST_EXCERPT_CHARS', '6000'))
+DIGEST_VERSION = 1
+# Seconds a failed document digest is not retried
+DIGEST_FAILURE_TTL = int(os.getenv('DIGEST_FAILURE_TTL', '600'))
+
+# Research quotes are checked against the corpus with a word n-gram index; below this share of
+# matching n-grams a quote counts as unverified and its item is downgraded
+QUOTE_NGRAM = 4
+QUOTE_MIN_COVERAGE = 0.8
+
+# Corpus characters one research call sees when no document digest is available
+RESEARCH_SINGLE_CALL_CHARS = 10000
+# Research switches to map-reduce over chunks above this corpus size (characters, ~300 pages of
+# ~3000 characters). Below it the document digests plus retrieved excerpts are used; without a
+# digest, map-reduce still runs whenever the corpus does not fit the single-call window
+RESEARCH_MAP_REDUCE_THRESHOLD = int(os.getenv('RESEARCH_MAP_REDUCE_THRESHOLD', '900000'))
+RESEARCH_CHUNK_CHARS = RESEARCH_SINGLE_CALL_CHARS
+RESEARCH_CHUNK_OVERLAP = 500
+
+# Number of upcoming clauses whose applicability and research are prefetched in the background
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', '2'))
+PREFETCH_MAX_WORKERS = 2
+
+# ============= NOTARIAL INFO MODEL =============
+
+@dataclass(slots=True)
+class Party:
+    """A verkoper or koper of the deed, with its presence resolved from the *_aanwezig lists"""
+    role: str
+    volgnummer: int
+    fields: dict
+    aanwezig: object = None
+    
+    def get(self, key, default=None):
+        return self.fields.get(key, default)
+
+@dataclass(slots=True)
+class NotarialInfo:
+    """Read-only typed view on one revision of the notarial_info dict
+    
+    Parties are indexed by (role, volgnummer) and each prompt serialization is built once per
+    revision and shared by all agents.
+    """
+    revision: str
+    items: list
+    verkopers: object
+    kopers: object
+    user_answers: dict
+    parties_by_key: dict
+    serializations: dict = field(default_factory=dict)
+    
+    @classmethod
+    def from_dict(cls, info, revision):
+        info = copy.deepcopy(info)
+        presence = {}
+        for role, key in (('verkoper', 'verkopers_aanwezig'), ('koper', 'kopers_aanwezig')):
+            for entry in info.get(key, []):
+                presence[(role, entry['volgnummer'])] = entry['aanwezig']
+        
+        parties = {}
+        for role, key in (('verkoper', 'verkopers'), ('koper', 'kopers')):
+            if key not in info:
+                parties[key] = None
+                continue
+            parties[key] = [
+                Party(role, party['volgnummer'], party, presence.get((role, party['volgnummer'])))
+                for party in info[key]
+            ]
+        return cls(
+            revision=revision,
+            items=list(info.items()),
+            verkopers=parties['verkopers'],
+            kopers=parties['kopers'],
+            user_answers=info.get('user_answers', {}),
+            parties_by_key={(party.role, party.volgnummer): party
+                            for key in ('verkopers', 'kopers') for party in (parties[key] or [])}
+        )
+    
+    def party(self, role, volgnummer):
+        return self.parties_by_key.get((role, volgnummer))
+    
+    def general(self, key, default=None):
+        return next((value for item_key, value in self.items if item_key == key), default)
+    
+    def serialize(self, kind, encoding=None):
+        """Memoized prompt text: 'document', 'klantinfo' or 'search', with parties as 'table' or 'lines'"""
+        encoding = encoding or PARTY_ENCODING
+        text = self.serializations.get((kind, encoding))
+        if text is None:
+            text = self.serializations[(kind, encoding)] = self.build_notarial_text(kind, encoding)
+        return text
+    
+    def build_notarial_text(self, kind, encoding):
+        """Build a serialization without memoizing it"""
+        builder = {'document': self.build_document_text, 'klantinfo': self.build_klantinfo_text,
+                   'search': self.build_search_text}[kind]
+        return builder(encoding == 'table')
+    
+    def build_document_text(self, as_table):
+        info = dict(self.items)
+        text = "\n\n--- NOTARIËLE INFORMATIE ---\n\n"
+        
+        # Algemene informatie
+        text += "ALGEMENE AKTE INFORMATIE:\n"
+        if 'ondertekening_datum' in info:
+            text += f"- Datum ondertekening: {info['ondertekening_datum']}\n"
+            text += f"- Dag: {info.get('ondertekening_dag', '')}\n"
+            text += f"- Maand: {info.get('ondertekening_maand_nl', '')}\n"
+            text += f"- Jaar: {info.get('ondertekening_jaar', '')}\n"
+        
+        if 'repertorium_nummer' in info:
+            text += f"- Repertorium nummer: {info['repertorium_nummer']}\n"
+        
+        if 'videoconferentie' in info:
+            text += f"- Videoconferentie: {'Ja' if info['videoconferentie'] else 'Nee'}\n"
+        
+        if 'verkoper_type' in info:
+            text += f"\n- Verkoper type: {info['verkoper_type'].replace('_', ' ')}\n"
+        
+        if 'koper_type' in info:
+            text += f"- Koper type: {info['koper_type'].replace('_', ' ')}\n"
+        
+        if 'aankoop_wijze' in info:
+            text += f"- Wijze van aankoop: {', '.join(info['aankoop_wijze']).replace('_', ' ')}\n"
+        
+        if 'verkoop_object' in info:
+            text += f"- Verkoop object: {', '.join(info['verkoop_object']).replace('_', ' ')}\n"
+        
+        if 'historiek' in info:
+            text += f"- Historiek: {info['historiek'].replace('_', ' ')}\n"
+        
+        for title, label, parties in (('VERKOPERS', 'Verkoper', self.verkopers), ('KOPERS', 'Koper', self.kopers)):
+            if parties is None:
+                continue
+            text += f"\n{title} (aantal: {len(parties)}):\n"
+            if as_table:
+                columns = [
+                    (column, getter) for column, getter in (
+                        ('naam', lambda p: f"{p.fields['voornaam']} {p.fields['achternaam']}" if 'voornaam' in p.fields and 'achternaam' in p.fields else ''),
+                        ('rijksregisternummer', lambda p: p.get('rijksregisternummer', '')),
+                        ('adres', lambda p: p.get('adres', '')),
+                        ('burgerlijke_staat', lambda p: p.get('burgerlijke_staat', '')),
+                        ('partner', lambda p: p.get('partner_naam') or ''),
+                        ('persoonlijk_aanwezig', lambda p: '' if p.aanwezig is None else ('Ja' if p.aanwezig else 'Nee'))
+                    )
+                    if any(getter(party) for party in parties)
+                ]
+                text += format_party_table(parties, columns)
+                continue
+            for party in parties:
+                text += f"\n{label} {party.volgnummer}:\n"
+                if 'voornaam' in party.fields and 'achternaam' in party.fields:
+                    text += f"- Naam: {party.fields['voornaam']} {party.fields['achternaam']}\n"
+                if 'rijksregisternummer' in party.fields:
+                    text += f"- Rijksregisternummer: {party.fields['rijksregisternummer']}\n"
+                if 'adres' in party.fields:
+                    text += f"- Adres: {party.fields['adres']}\n"
+                if 'burgerlijke_staat' in party.fields:
+                    text += f"- Burgerlijke staat: {party.fields['burgerlijke_staat']}\n"
+                if party.get('partner_naam'):
+                    text += f"- Partner: {party.fields['partner_naam']}\n"
+                if party.aanwezig is not None:
+                    text += f"- Persoonlijk aanwezig: {'Ja' if party.aanwezig else 'Nee'}\n"
+        
+        return text
+    
+    def build_klantinfo_text(self, as_table):
+        klantinfo_text = "\n[Klantinformatie]\n"
+        
+        if self.verkopers is not None:
+            klantinfo_text += f"Aantal verkopers: {len(self.verkopers)}\n"
+        if self.kopers is not None:
+            klantinfo_text += f"Aantal kopers: {len(self.kopers)}\n"
+        
+        for role, parties in (('verkoper', self.verkopers or []), ('koper', self.kopers or [])):
+            if as_table and parties:
+                klantinfo_text += f"{role.capitalize()}s:\n" + format_party_table(parties, [
+                    ('voornaam', lambda p: p.get('voornaam', 'Onbekend')),
+                    ('achternaam', lambda p: p.get('achternaam', 'Onbekend')),
+                    ('burgerlijke_staat', lambda p: p.get('burgerlijke_staat', 'Onbekend')),
+                    ('persoonlijk_aanwezig', lambda p: '-' if p.aanwezig is None else ('ja' if p.aanwezig else 'nee'))
+                ])
+                continue
+            for party in parties:
+                num = party.volgnummer
+                klantinfo_text += f"Voornaam {role} {num}: {party.get('voornaam', 'Onbekend')}\n"
+                klantinfo_text += f"Achternaam {role} {num}: {party.get('achternaam', 'Onbekend')}\n"
+                klantinfo_text += f"Burgerlijke staat {role} {num}: {party.get('burgerlijke_staat', 'Onbekend')}\n"
+                if party.aanwezig is not None:
+                    klantinfo_text += f"Is {role} {num} persoonlijk aanwezig? (ja/nee): {'ja' if party.aanwezig else 'nee'}\n"
+        
+        videoconferentie = self.general('videoconferentie')
+        if videoconferentie is not None:
+            klantinfo_text += f"Videoconferentie: {'ja' if videoconferentie else 'nee'}\n"
+        
+        return klantinfo_text
+    
+    def build_search_text(self, as_table):
+        notarial_text = "\n\n--- NOTARIËLE INFORMATIE ---\n"
+        
+        for key, value in self.items:
+            if key in ('verkopers', 'kopers'):
+                role = key[:-1]
+                notarial_text += f"\n{key.upper()}:\n"
+                parties = getattr(self, key)
+                if as_table:
+                    fields = list(dict.fromkeys(k for party in parties for k in party.fields if k != 'volgnummer'))
+                    notarial_text += format_party_table(
+                        parties, [(k, lambda p, k=k: p.get(k, '')) for k in fields], indent="  "
+                    )
+                    continue
+                for party in parties:
+                    for k, val in party.fields.items():
+                        notarial_text += f"  {role}_{party.volgnummer}_{k}: {val}\n"
+            elif key == 'user_answers':
+                notarial_text += f"\nEERDER BEANTWOORDE VRAGEN:\n"
+                for k, val in self.user_answers.items():
+                    if isinstance(val, dict):
+                        notarial_text += f"  {val.get('missing_info', k)}: {val.get('answer', val)}\n"
+            else:
+                notarial_text += f"{key}: {value}\n"
+        
+        return notarial_text
+
+def format_party_table(parties, columns, indent=""):
+    """One header row plus one row per party, columns separated by |"""
+    def cell(value):
+        return '' if value is None else re.sub(r'\s+', ' ', str(value)).replace('|', '/').strip()
+    lines = [indent + "|".join(['nr'] + [column for column, _ in columns])]
+    for party in parties:
+        lines.append(indent + "|".join([str(party.volgnummer)] + [cell(getter(party)) for _, getter in columns]))
+    return "\n".join(lines) + "\n"
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def build_notarial_model(revision, _notarial_info):
+    return NotarialInfo.from_dict(_notarial_info, revision)
+
+def get_notarial_model(notarial_info):
+    """Typed model of the current revision of a notarial_info dict, shared by all callers"""
+    revision = compute_content_hash(json.dumps(notarial_info, ensure_ascii=False, default=str))
+    return build_notarial_model(revision, notarial_info)
+
 # ============= HELPER FUNCTIONS FROM ORIGINAL SCRIPT =============
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a PDF file"""
-    text = ""
+# PyPDF2 caches every object it parses, page contents and scanned page images included;
+# a fresh reader is opened after every batch of pages, so a bundle of any size streams in bounded memory
+PDF_READER_BATCH_PAGES = 20
+
+def iter_pdf_pages(pdf_path):
+    """Yield the text of each page of a PDF file, one page at a time"""
     try:
         with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            num_pages = len(pdf_reader.pages)
-            
-            for page_num in range(num_pages):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
+            pdf_reader_class = lazy_import('PyPDF2').PdfReader
+            pdf_reader = pdf_reader_class(file)
+            for index in range(len(pdf_reader.pages)):
+                if index and index % PDF_READER_BATCH_PAGES == 0:
+                    pdf_reader = pdf_reader_class(file)
+                yield pdf_reader.pages[index].extract_text() or ""
                 
     except Exception as e:
-        st.error(f"Error reading PDF: {str(e)}")
-        
-    return text
+        logger.error("Error reading PDF %s: %s", pdf_path, e)
+
+def find_text_page_offsets(text_path):
+    """Byte offset of every page of a text export; a form feed byte never occurs inside a UTF-8 character"""
+    offsets, position = [0], 0
+    with open(text_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(BLOB_CHUNK_BYTES), b''):
+            offsets.extend(position + match.end() for match in re.finditer(b'\f', chunk))
+            position += len(chunk)
+    return offsets
+
+def iter_text_pages(text_path):
+    """Yield the pages of a text export (separated by form feeds) without reading the whole file"""
+    with open(text_path, encoding='utf-8') as file:
+        pending = ""
+        for chunk in iter(lambda: file.read(64 * 1024), ''):
+            *pages, pending = (pending + chunk).split('\f')
+            yield from pages
+        yield pending
+
+# ============= SOURCE NORMALIZATION =============
+
+# Lines that are only a page number ("3", "- 3 -", "Pagina 3 van 12", "blz. 3/12"); only stripped at page
+# edges, and a bare number only when it equals the page index, so table cells ("250", "2025") are kept
+PAGE_NUMBER_PATTERN = re.compile(
+    r'^[-–\s]*(?P<label>pagina|page|blz\.?|p\.)?\s*(?P<number>\d{1,4})(?:\s*(?:/|van|of|op)\s*\d{1,4})?[-–\s]*$', re.IGNORECASE
+)
+# A header/footer line is boilerplate when it repeats on at least this share of the pages (and on at least 3 pages)
+BOILERPLATE_PAGE_RATIO = 0.5
+BOILERPLATE_MIN_PAGES = 3
+# Only the first and last lines of a page are header/footer candidates
+BOILERPLATE_EDGE_LINES = 4
+
+# Page counters inside header/footer lines ("Akte Peeters - blz. 3/12")
+PAGE_COUNTER_PATTERN = re.compile(r'(?:pagina|page|blz\.?|p\.)\s*\d{1,4}(?:\s*(?:/|van|of|op)\s*\d{1,4})?')
+
+def boilerplate_key(line):
+    """Compare lines ignoring case, spacing and page counters, so "Pagina 3" and "Pagina 4" headers match"""
+    return PAGE_COUNTER_PATTERN.sub('pagina #', re.sub(r'\s+', ' ', line.strip().lower()))
+
+def find_repeated_lines(pages):
+    """Keys of the lines that repeat on most pages: running headers, footers and disclaimers
+    
+    Only the edge lines of each page are counted, so a page iterator is consumed in one pass.
+    """
+    def edge_keys(page):
+        lines = [line for line in page.split('\n') if line.strip()]
+        return {boilerplate_key(line) for line in lines[:BOILERPLATE_EDGE_LINES] + lines[-BOILERPLATE_EDGE_LINES:]}
+    counts = Counter()
+    page_count = 0
+    for page in pages:
+        counts.update(edge_keys(page))
+        page_count += 1
+    if page_count < BOILERPLATE_MIN_PAGES:
+        return set()
+    threshold = max(BOILERPLATE_MIN_PAGES, int(page_count * BOILERPLATE_PAGE_RATIO + 0.5))
+    return {key for key, count in counts.items() if count >= threshold and len(key) >= 3}
+
+class PageNormalizer:
+    """Strips repeated headers/footers, page numbers, empty pages and extra whitespace, one page at a time
+    
+    The original text is the pages joined with a newline after each page; the normalized text is the
+    concatenation of what add_page returns. The offset map pairs normalized offsets with original
+    offsets at the start of every kept line and after every collapsed whitespace run, and holds the
+    [start, end, page number] range of every kept page.
+    """
+    
+    def __init__(self, repeated):
+        self.repeated = repeated
+        self.normalized_offsets = array('q')
+        self.original_offsets = array('q')
+        self.page_ranges = []
+        self.length = 0
+        self.page_start = 0
+        self.pages = self.empty_pages = self.removed_lines = 0
+    
+    def add_page(self, page):
+        """Normalize the next page and return the text to append to the normalized document"""
+        self.pages += 1
+        lines = []
+        line_start = self.page_start
+        page_body_start = self.length
+        page_lines = page.split('\n')
+        filled = [index for index, line in enumerate(page_lines) if line.strip()]
+        edges = set(filled[:BOILERPLATE_EDGE_LINES] + filled[-BOILERPLATE_EDGE_LINES:])
+        for index, line in enumerate(page_lines):
+            stripped = line.strip()
+            if stripped and ((index in edges and self.is_page_number(stripped)) or boilerplate_key(stripped) in self.repeated):
+                self.removed_lines += 1
+            elif stripped:
+                # Runs of words separated by single spaces are copied as is
+                pieces = []
+                for run in re.finditer(r'\S+(?: \S+)*', line):
+                    self.normalized_offsets.append(self.length + sum(len(piece) + 1 for piece in pieces))
+                    self.original_offsets.append(line_start + run.start())
+                    pieces.append(run.group())
+                lines.append(' '.join(pieces))
+                self.length += len(lines[-1]) + 1
+            line_start += len(line) + 1
+        self.page_start += len(page) + 1
+        if not lines:
+            self.empty_pages += 1
+            return ""
+        self.page_ranges.append([page_body_start, self.length - 1, self.pages])
+        # Keep page breaks visible as one blank line
+        lines.append('')
+        self.length += 1
+        # Lines are newline separated, so every page but the first starts with the separator
+        return ("\n" if page_body_start else "") + "\n".join(lines)
+    
+    def is_page_number(self, stripped):
+        """A labelled page number ("Pagina 3 van 12") or a bare number equal to the current page index"""
+        match = PAGE_NUMBER_PATTERN.match(stripped)
+        return bool(match) and (match.group('label') is not None or int(match.group('number')) == self.pages)
+    
+    def put_offset_map(self):
+        """Store the offset map as the same JSON put_json_blob writes, without building it as one list"""
+        writer = get_blob_store().writer()
+        for key, offsets in (('normalized', self.normalized_offsets), ('original', self.original_offsets)):
+            writer.write(f'{"{" if key == "normalized" else ", "}"{key}": [')
+            for start in range(0, len(offsets), 4096):
+                writer.write((", " if start else "") + ", ".join(map(str, offsets[start:start + 4096])))
+            writer.write("]")
+        writer.write(f', "pages": {json.dumps(self.page_ranges)}}}')
+        return writer.close()
+    
+    def stats(self):
+        return {'pages': self.pages, 'empty_pages': self.empty_pages, 'removed_lines': self.removed_lines}
+
+def map_to_original_offset(offset_map, offset):
+    """Map an offset in normalized document text back to the extracted text"""
+    index = bisect.bisect_right(offset_map['normalized'], offset) - 1
+    if index < 0:
+        return 0
+    return offset_map['original'][index] + offset - offset_map['normalized'][index]
+
+def ingest_document(name, pages, reports=None, source_path=None, source_kind='text'):
+    """Stream the pages of one document into the blob store as a normalized source part
+    
+    Pages are consumed one at a time: the first pass writes the original text blob, spools the
+    pages to a temporary file and counts header/footer candidates, the second normalizes the
+    spooled pages into the part blob. Memory use does not grow with the page text. Returns the
+    blob hash of the part, or None for a document without text. The page map (document type, page
+    ranges and the stored original file for re-extraction) is kept next to the part.
+    """
+    store = get_blob_store()
+    header = format_document_part(name, "")
+    part_writer, original_writer = store.writer(), store.writer()
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+        def spool_pages():
+            for page in pages:
+                original_writer.write(page + "\n")
+                # One JSON string per line, so page text with any separator reads back unchanged
+                spool.write(json.dumps(page, ensure_ascii=False) + "\n")
+                yield page
+        normalizer = PageNormalizer(find_repeated_lines(spool_pages()))
+        spool.seek(0)
+        part_writer.write(header)
+        prefix = []
+        prefix_chars = 0
+        for line in spool:
+            text = normalizer.add_page(json.loads(line))
+            part_writer.write(text)
+            if prefix_chars < DOCUMENT_CLASSIFY_CHARS:
+                prefix.append(text)
+                prefix_chars += len(text)
+    normalized_chars = part_writer.chars - len(header)
+    if not normalized_chars:
+        part_writer.discard()
+        original_writer.discard()
+        return None
+    part_hash = part_writer.close()
+    stats = normalizer.stats()
+    document_type = classify_document(name, "".join(prefix))
+    store.set_ref(f"pages-{part_hash}", put_json_blob({
+        'document': name,
+        'document_type': document_type,
+        'kind': source_kind,
+        'source': store.put_file(source_path) if source_path is not None else None,
+        'page_count': stats['pages'],
+        'pages': normalizer.page_ranges,
+        'page_offsets': find_text_page_offsets(source_path) if source_kind == 'text' and source_path is not None else None
+    }))
+    report = dict(
+        stats, document=name, document_type=document_type, header_chars=len(header),
+        original_chars=original_writer.chars, normalized_chars=normalized_chars,
+        original_tokens=estimate_tokens_for_chars(original_writer.chars), normalized_tokens=estimate_tokens_for_chars(normalized_chars),
+        original=original_writer.close(), offset_map=normalizer.put_offset_map()
+    )
+    logger.info("Normalized %s (%s): %d -> %d tokens (%d lines and %d empty pages removed)", name,
+                report['document_type'], report['original_tokens'], report['normalized_tokens'], stats['removed_lines'], stats['empty_pages'])
+    if reports is not None:
+        reports.append(report)
+    return part_hash
+
+def ingest_document_file(name, path, reports=None, kind=None):
+    """Ingest a PDF or text file from disk; returns the part's blob hash, or None when it is skipped
+    
+    The kind ('pdf' or 'text') follows the file name unless given.
+    """
+    if kind is None:
+        kind = 'pdf' if name.lower().endswith('.pdf') else 'text' if name.lower().endswith(('.txt', '.text')) else None
+    if kind == 'pdf':
+        return ingest_document(name, iter_pdf_pages(path), reports, path, 'pdf')
+    if kind == 'text':
+        # Form feeds separate the pages of text exports
+        return ingest_document(name, iter_text_pages(path), reports, path, 'text')
+    return None
+
+def resolve_original_offset(offset, manifest=None, reports=None):
+    """Resolve an offset in the combined source content to (document, offset in its extracted text)"""
+    manifest = st.session_state.source_manifest if manifest is None else manifest
+    reports = st.session_state.source_normalization if reports is None else reports
+    by_part = {}
+    for report in reports:
+        by_part.setdefault(report['document'], report)
+    part_start = 0
+    for blob_hash in manifest:
+        part = get_text_blob(blob_hash)
+        if offset < part_start + len(part):
+            match = DOCUMENT_HEADER_PATTERN.match(part)
+            report = by_part.get(match.group(1).strip()) if match else None
+            if report is None or offset - part_start < report['header_chars']:
+                return None
+            return report['document'], map_to_original_offset(
+                get_json_blob(report['offset_map']), offset - part_start - report['header_chars']
+            )
+        part_start += len(part)
+    return None
+
+def format_document_part(name, content):
+    """Source text of one document, with the header the document segmenter relies on"""
+    return f"\n\n--- Content from {name} ---\n\n" + content
+
+# ============= DOCUMENT CLASSIFICATION =============
 
-def load_source_documents(uploaded_files):
-    """Load content from uploaded files"""
-    combined_content = ""
+# Local keyword classifier: filename hints, title phrases near the top and keyword density
+DOCUMENT_TYPES = {
+    'kadastraal_uittreksel': {
+        'label': "Kadastraal uittreksel",
+        'filename': ['kadast', 'kadaster', 'perceel'],
+        'keywords': ['kadastrale legger', 'uittreksel uit het kadastraal', 'kadastraal inkomen', 'perceelnummer',
+                     'kadastrale percelen', 'sectie', 'afdeling', 'oppervlakte volgens kadaster']
+    },
+    'epc': {
+        'label': "EPC",
+        'filename': ['epc', 'energie'],
+        'keywords': ['energieprestatiecertificaat', 'energiescore', 'kwh/m²', 'kwh/(m²', 'energieklasse',
+                     'energiedeskundige', 'epc-label', 'certificaatnummer']
+    },
+    'elektrische_keuring': {
+        'label': "Elektrische keuring",
+        'filename': ['keuring', 'elektr', 'arei'],
+        'keywords': ['elektrische installatie', 'keuringsverslag', 'a.r.e.i', 'avrei', 'erkend organisme',
+                     'eendraadschema', 'ééndraadschema', 'situatieschema', 'inbreuken']
+    },
+    'bodemattest': {
+        'label': "Bodemattest",
+        'filename': ['bodem', 'ovam'],
+        'keywords': ['bodemattest', 'ovam', 'bodemdecreet', 'risicogrond', 'grondeninformatieregister',
+                     'bodemonderzoek', 'bodemsanering']
+    },
+    'stedenbouwkundige_inlichtingen': {
+        'label': "Stedenbouwkundige inlichtingen",
+        'filename': ['steden', 'omgeving', 'vastgoedinfo', 'vergunning'],
+        'keywords': ['stedenbouwkundige inlichtingen', 'omgevingsvergunning', 'bouwvergunning', 'gewestplan',
+                     'vergunningenregister', 'planologische', 'voorkooprecht', 'rooilijn', 'stedenbouwkundig misdrijf']
+    },
+    'vorige_akte': {
+        'label': "Vorige akte / eigendomstitel",
+        'filename': ['akte', 'titel', 'eigendom'],
+        'keywords': ['eigendomstitel', 'verleden voor notaris', 'overgeschreven op het', 'kantoor rechtszekerheid',
+                     'hypotheekkantoor', 'oorsprong van eigendom', 'heeft verkocht aan']
+    },
+    'verkoopovereenkomst': {
+        'label': "Verkoopovereenkomst",
+        'filename': ['compromis', 'overeenkomst'],
+        'keywords': ['onderhandse verkoopovereenkomst', 'compromis', 'opschortende voorwaarde', 'waarborgsom',
+                     'voorschot', 'ondergetekenden']
+    },
+    'asbestattest': {
+        'label': "Asbestattest",
+        'filename': ['asbest'],
+        'keywords': ['asbestinventaris', 'asbestattest', 'asbesthoudende', 'asbestveilig']
+    },
+    'watertoets': {
+        'label': "Watertoets",
+        'filename': ['water', 'overstroming'],
+        'keywords': ['overstromingsgevoelig', 'watertoets', 'informatieplicht water', 'p-score', 'g-score',
+                     'overstromingskaart']
+    }
+}
+DEFAULT_DOCUMENT_TYPE = 'overig'
+DOCUMENT_TITLE_CHARS = 1500
+DOCUMENT_CLASSIFY_CHARS = 20000
+
+def classify_document(name, text):
+    """Tag a document with the DOCUMENT_TYPES key that fits it best, or 'overig'"""
+    lowered_name = name.lower()
+    lowered = text[:DOCUMENT_CLASSIFY_CHARS].lower()
+    title = lowered[:DOCUMENT_TITLE_CHARS]
+    best_type, best_score = DEFAULT_DOCUMENT_TYPE, 0
+    for document_type, spec in DOCUMENT_TYPES.items():
+        score = 10 * any(hint in lowered_name for hint in spec['filename'])
+        for keyword in spec['keywords']:
+            score += lowered.count(keyword) + 5 * (keyword in title)
+        if score > best_score:
+            best_type, best_score = document_type, score
+    return best_type if best_score >= 3 else DEFAULT_DOCUMENT_TYPE
+
+def classify_source_part(part):
+    """Document name and type of one source part; parts without a document header (intake) get None"""
+    match = DOCUMENT_HEADER_PATTERN.match(part)
+    if not match:
+        return None, None
+    name = match.group(1)
+    return name, classify_document(name, part[match.end():])
+
+def parse_document_types(value):
+    """Parse the document_types column of the clause CSV; empty or 'alle' means every document"""
+    if value is None or (not isinstance(value, str) and lazy_import('pandas').isna(value)):
+        return None
+    types = {item for item in re.split(r'[\s,;|]+', str(value).strip().lower()) if item}
+    if not types or 'alle' in types or 'all' in types:
+        return None
+    unknown = types - set(DOCUMENT_TYPES) - {DEFAULT_DOCUMENT_TYPE}
+    if unknown:
+        logger.warning("Unknown document types in clause CSV: %s", ", ".join(sorted(unknown)))
+    return frozenset(types)
+
+def get_clause_document_types(row):
+    """Document types a clause needs according to the optional document_types CSV column"""
+    return parse_document_types(row.get('document_types')) if 'document_types' in row else None
+
+@st.cache_resource(show_spinner=False, max_entries=1024)
+def get_part_document_type(blob_hash):
+    """Document type of a source part by its blob hash, None for the intake part
+    
+    The type is stored in the page map at ingestion; older parts are classified from their text.
+    """
+    page_map = get_page_map(blob_hash)
+    if page_map and 'document_type' in page_map:
+        return page_map['document_type']
+    return classify_source_part(get_text_blob(blob_hash))[1]
+
+def select_document_parts(manifest, document_types):
+    """Keep the blob hashes of the parts of the requested document types plus the intake part
+    
+    Falls back to every document when the dossier has none of the requested types.
+    """
+    if not document_types:
+        return tuple(manifest)
+    types = [get_part_document_type(blob_hash) for blob_hash in manifest]
+    if not any(document_type in document_types for document_type in types):
+        return tuple(manifest)
+    return tuple(blob_hash for blob_hash, document_type in zip(manifest, types) if document_type in document_types) + \
+        tuple(blob_hash for blob_hash, document_type in zip(manifest, types) if document_type is None)
+
+def load_source_folder(folder, reports=None):
+    """Ingest the PDF and text documents of a dossier folder; returns the blob hashes of their parts"""
+    manifest = []
+    for path in sorted(Path(folder).iterdir()):
+        part_hash = ingest_document_file(path.name, path, reports)
+        if part_hash:
+            manifest.append(part_hash)
+    return manifest
+
+def load_source_documents(uploaded_files, reports=None):
+    """Ingest uploaded files as one normalized text part per document; returns the blob hashes of the parts"""
+    manifest = []
     
     for uploaded_file in uploaded_files:
-        # Save uploaded file temporarily
+        # Save uploaded file temporarily, copying in chunks instead of through getvalue()
         with tempfile.NamedTemporaryFile(delete=False, suffix=uploaded_file.name) as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, tmp_file, BLOB_CHUNK_BYTES)
             tmp_path = tmp_file.name
         
         try:
-            if uploaded_file.name.lower().endswith('.pdf'):
-                content = extract_text_from_pdf(tmp_path)
-                if content:
-                    combined_content += f"\n\n--- Content from {uploaded_file.name} ---\n\n"
-                    combined_content += content
-            elif uploaded_file.name.lower().endswith(('.txt', '.text')):
-                content = uploaded_file.getvalue().decode('utf-8')
-                combined_content += f"\n\n--- Content from {uploaded_file.name} ---\n\n"
-                combined_content += content
+            part_hash = ingest_document_file(uploaded_file.name, tmp_path, reports)
+            if part_hash:
+                manifest.append(part_hash)
         finally:
             # Clean up temp file
             os.unlink(tmp_path)
     
-    return combined_content
+    return manifest
 
 def get_dutch_month(month_num):
     """Convert month number to Dutch month name"""
@@ -124,37 +959,44 @@ def get_dutch_month(month_num):
     }
     return months.get(month_num, "")
 
-def extract_info_from_documents(source_content):
-    """Use Gemini to extract notarial information from source documents"""
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
-    
-    extraction_prompt = """
-    Analyseer de volgende documenten en extraheer alle relevante notariële informatie.
-    LET OP: Er kunnen MEERDERE verkopers en/of kopers zijn. Detecteer het exacte aantal.
-    
-    Analyseer ook:
-    - Type verkoper (alleenstaand/gehuwd koppel/samenwonend/vennootschap)
-    - Type koper (alleenstaand/gehuwd koppel/samenwonend/vennootschap)
-    - Wijze van aankoop (volle eigendom/vruchtgebruik/met aanwas/zonder aanwas)
-    - Wat wordt verkocht (alleen onroerend/met roerend/met of zonder meetplan)
-    - Historiek (zelf gekocht/via schenking/ouders aan kind)
-    
-    Geef het resultaat in JSON formaat met de volgende structuur.
-    Voor elk veld, geef ook een confidence score (0-100) die aangeeft hoe zeker je bent.
-    Als informatie niet gevonden wordt, gebruik "NOT_FOUND" als waarde en 0 als confidence.
+# Intake extraction runs as independent sections, each on the passages retrieved for its own topic
+INTAKE_SECTION_MAX_CHARS = int(os.getenv('INTAKE_SECTION_MAX_CHARS', '12000'))
 
-    {
+INTAKE_EXTRACTION_SECTIONS = {
+    'datums': {
+        'instructions': "Zoek de datum van ondertekening en of de akte via videoconferentie verleden wordt.",
+        'queries': ['ondertekening', 'datum', 'verleden', 'videoconferentie', 'afstand', 'heden'],
+        'schema': """{
         "algemene_info": {
             "ondertekening_datum": {"value": "DD-MM-JJJJ of NOT_FOUND", "confidence": 0-100},
             "videoconferentie": {"value": true/false/null, "confidence": 0-100}
-        },
+        }
+    }"""
+    },
+    'transactie': {
+        'instructions': """Analyseer:
+    - Type verkoper (alleenstaand/gehuwd koppel/samenwonend/vennootschap)
+    - Type koper (alleenstaand/gehuwd koppel/samenwonend/vennootschap)
+    - Wijze van aankoop (volle eigendom/vruchtgebruik/met aanwas/zonder aanwas)
+    - Wat wordt verkocht (alleen onroerend/met roerend/met of zonder meetplan)
+    - Historiek (zelf gekocht/via schenking/ouders aan kind)""",
+        'queries': ['gehuwd', 'samenwonend', 'vennootschap', 'eigendom', 'vruchtgebruik', 'aanwas', 'roerend',
+                    'meetplan', 'oorsprong', 'eigendomstitel', 'schenking', 'aangekocht'],
+        'schema': """{
         "transactie_info": {
             "verkoper_type": {"value": "alleenstaande/gehuwd_koppel/wettelijk_samenwonend/feitelijk_samenwonend/vennootschap/NOT_FOUND", "confidence": 0-100},
             "koper_type": {"value": "alleenstaande/gehuwd_koppel/wettelijk_samenwonend/feitelijk_samenwonend/vennootschap/NOT_FOUND", "confidence": 0-100},
             "aankoop_wijze": {"value": ["volle_eigendom", "gesplitste_aankoop", "met_aanwas", "zonder_aanwas"], "confidence": 0-100},
             "verkoop_object": {"value": ["enkel_onroerend", "met_roerend", "zonder_meetplan", "met_meetplan"], "confidence": 0-100},
             "historiek": {"value": "zelf_gekocht/via_schenking/ouders_aan_kind/NOT_FOUND", "confidence": 0-100}
-        },
+        }
+    }"""
+    },
+    'partijen': {
+        'instructions': "LET OP: Er kunnen MEERDERE verkopers en/of kopers zijn. Detecteer het exacte aantal en geef elke partij afzonderlijk.",
+        'queries': ['verkoper', 'koper', 'rijksregisternummer', 'geboren', 'wonende', 'echtgenote', 'echtgenoot',
+                    'partner', 'burgerlijke', 'ongehuwd', 'gehuwd', 'weduwe'],
+        'schema': """{
         "aantal_partijen": {
             "aantal_verkopers": {"value": number, "confidence": 0-100},
             "aantal_kopers": {"value": number, "confidence": 0-100}
@@ -174,31 +1016,76 @@ def extract_info_from_documents(source_content):
         ],
         "kopers": [
             // Zelfde structuur als verkopers
-        ],
+        ]
+    }"""
+    },
+    'onroerend_goed': {
+        'instructions': "Zoek de kadastrale gegevens, de koopsom en of het goed leeg is bij de overdracht.",
+        'queries': ['kadastraal', 'kadaster', 'perceel', 'sectie', 'koopsom', 'prijs', 'euro', 'leeg', 'bewoond',
+                    'huurder', 'ingebruikneming'],
+        'schema': """{
         "onroerend_goed_info": {
             "kadastrale_gegevens": {"value": "gegevens of NOT_FOUND", "confidence": 0-100},
             "koopsom": {"value": "bedrag of NOT_FOUND", "confidence": 0-100},
             "leeg_bij_overdracht": {"value": true/false/null, "confidence": 0-100}
         }
+    }"""
     }
+}
+
+def extract_intake_section(section, source_content, model):
+    """Run the extraction prompt of one intake section on the passages retrieved for it"""
+    spec = INTAKE_EXTRACTION_SECTIONS[section]
+    passages = []
+    if len(source_content) > INTAKE_SECTION_MAX_CHARS:
+        passages = retrieve_passages(source_content, spec['queries'], max_chars=INTAKE_SECTION_MAX_CHARS)
+    if passages:
+        page_index = get_page_index(source_content)
+        documents_text = "\n\n".join(f"{format_passage_header(p, page_index)}\n{p['text']}" for p in passages)
+    else:
+        documents_text = source_content[:INTAKE_SECTION_MAX_CHARS]
+    
+    extraction_prompt = f"""
+    Analyseer de volgende documenten en extraheer de gevraagde notariële informatie.
+    {spec['instructions']}
+    
+    Geef het resultaat in JSON formaat met de volgende structuur.
+    Voor elk veld, geef ook een confidence score (0-100) die aangeeft hoe zeker je bent.
+    Als informatie niet gevonden wordt, gebruik "NOT_FOUND" als waarde en 0 als confidence.
+
+    {spec['schema']}
 
     Documenten:
-    """ + source_content[:10000]
+    """ + documents_text
     
     try:
         response = model.generate_content(extraction_prompt)
-        
-        # Parse JSON response
         json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if json_match:
-            extracted_data = json.loads(json_match.group())
-            return extracted_data
-        else:
-            return {}
-            
+        return json.loads(json_match.group()) if json_match else {}
     except Exception as e:
-        st.warning(f"Automatische extractie gefaald: {str(e)}")
+        logger.warning("Extractie van sectie %s gefaald: %s", section, e)
         return {}
+
+def extract_info_from_documents(source_content, model=None):
+    """Use Gemini to extract notarial information from source documents, one concurrent call per section
+    
+    Without a model, the session's Gemini model is used, behind the shared rate limiter and call log.
+    """
+    model = model or InstrumentedModel(get_gemini_model(), st.session_state.llm_call_log, 'intake_extraction')
+    
+    sections = list(INTAKE_EXTRACTION_SECTIONS)
+    workers = min(len(sections), get_rate_limiter().max_concurrency)
+    extracted_data = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {section: executor.submit(extract_intake_section, section, source_content, model) for section in sections}
+        # Merge in section order so the result does not depend on completion order
+        for section in sections:
+            for key, value in futures[section].result().items():
+                if isinstance(value, dict) and isinstance(extracted_data.get(key), dict):
+                    extracted_data[key].update(value)
+                else:
+                    extracted_data.setdefault(key, value)
+    return extracted_data
         
 def parse_extracted_data_for_form(extracted_data):
     """Parse extracted data with confidence scores into simple values for form pre-filling"""
@@ -293,13 +1180,20 @@ def show_intake_form():
         st.session_state.extracted_form_data = {}
     
     # Check if we can auto-extract
-    if st.session_state.source_content:
+    if st.session_state.source_manifest:
         if st.button("🤖 Probeer informatie automatisch te extraheren", type="secondary"):
             with st.spinner("Analyseren van documenten..."):
-                extracted_data = extract_info_from_documents(st.session_state.source_content)
+                # Validated identifiers from the local extractors take precedence over the LLM
+                identifiers = get_dossier_identifiers()
+                extracted_data = extract_info_from_documents(get_source_content())
                 if extracted_data:
                     # Parse the extracted data for form use
                     form_data = parse_extracted_data_for_form(extracted_data)
+                    form_data, id_warnings = apply_local_identifiers_to_form(
+                        form_data, identifiers, get_source_content()
+                    )
+                    for warning in id_warnings:
+                        st.warning(f"⚠️ {warning}")
                     if form_data:
                         st.session_state.extracted_form_data = form_data
                         st.success("✅ Informatie geëxtraheerd! Controleer en vul aan waar nodig.")
@@ -610,7 +1504,8 @@ def show_intake_form():
                 'kopers': kopers,
                 'verkopers_aanwezig': [{'volgnummer': v['volgnummer'], 'aanwezig': v['aanwezig']} for v in verkopers],
                 'kopers_aanwezig': [{'volgnummer': k['volgnummer'], 'aanwezig': k['aanwezig']} for k in kopers],
-                'user_answers': {}
+                # Answers given during clause processing survive a correction of the intake
+                'user_answers': st.session_state.notarial_info.get('user_answers', {})
             }
             
             # Clear extracted data after saving
@@ -624,734 +1519,3667 @@ def show_intake_form():
             st.session_state.current_step = 'documents'
             st.rerun()
             
-def format_notarial_info_as_text(info):
+def format_notarial_info_as_text(info, encoding=None):
     """Format notarial information as text to append to source documents"""
-    text = "\n\n--- NOTARIËLE INFORMATIE ---\n\n"
-    
-    # Algemene informatie
-    text += "ALGEMENE AKTE INFORMATIE:\n"
-    if 'ondertekening_datum' in info:
-        text += f"- Datum ondertekening: {info['ondertekening_datum']}\n"
-        text += f"- Dag: {info.get('ondertekening_dag', '')}\n"
-        text += f"- Maand: {info.get('ondertekening_maand_nl', '')}\n"
-        text += f"- Jaar: {info.get('ondertekening_jaar', '')}\n"
-    
-    if 'repertorium_nummer' in info:
-        text += f"- Repertorium nummer: {info['repertorium_nummer']}\n"
-    
-    if 'videoconferentie' in info:
-        text += f"- Videoconferentie: {'Ja' if info['videoconferentie'] else 'Nee'}\n"
-    
-    # Add new intake questions to notarial info text
-    if 'verkoper_type' in info:
-        text += f"\n- Verkoper type: {info['verkoper_type'].replace('_', ' ')}\n"
-    
-    if 'koper_type' in info:
-        text += f"- Koper type: {info['koper_type'].replace('_', ' ')}\n"
-    
-    if 'aankoop_wijze' in info:
-        text += f"- Wijze van aankoop: {', '.join(info['aankoop_wijze']).replace('_', ' ')}\n"
-    
-    if 'verkoop_object' in info:
-        text += f"- Verkoop object: {', '.join(info['verkoop_object']).replace('_', ' ')}\n"
-    
-    if 'historiek' in info:
-        text += f"- Historiek: {info['historiek'].replace('_', ' ')}\n"
-    
-    # Verkopers
-    if 'verkopers' in info:
-        text += f"\nVERKOPERS (aantal: {len(info['verkopers'])}):\n"
-        for verkoper in info['verkopers']:
-            text += f"\nVerkoper {verkoper['volgnummer']}:\n"
-            if 'voornaam' in verkoper and 'achternaam' in verkoper:
-                text += f"- Naam: {verkoper['voornaam']} {verkoper['achternaam']}\n"
-            if 'rijksregisternummer' in verkoper:
-                text += f"- Rijksregisternummer: {verkoper['rijksregisternummer']}\n"
-            if 'adres' in verkoper:
-                text += f"- Adres: {verkoper['adres']}\n"
-            if 'burgerlijke_staat' in verkoper:
-                text += f"- Burgerlijke staat: {verkoper['burgerlijke_staat']}\n"
-            if verkoper.get('partner_naam'):
-                text += f"- Partner: {verkoper['partner_naam']}\n"
-            
-            # Aanwezigheid
-            aanwezig_info = next((v for v in info.get('verkopers_aanwezig', []) 
-                                if v['volgnummer'] == verkoper['volgnummer']), None)
-            if aanwezig_info:
-                text += f"- Persoonlijk aanwezig: {'Ja' if aanwezig_info['aanwezig'] else 'Nee'}\n"
-    
-    # Kopers
-    if 'kopers' in info:
-        text += f"\nKOPERS (aantal: {len(info['kopers'])}):\n"
-        for koper in info['kopers']:
-            text += f"\nKoper {koper['volgnummer']}:\n"
-            if 'voornaam' in koper and 'achternaam' in koper:
-                text += f"- Naam: {koper['voornaam']} {koper['achternaam']}\n"
-            if 'rijksregisternummer' in koper:
-                text += f"- Rijksregisternummer: {koper['rijksregisternummer']}\n"
-            if 'adres' in koper:
-                text += f"- Adres: {koper['adres']}\n"
-            if 'burgerlijke_staat' in koper:
-                text += f"- Burgerlijke staat: {koper['burgerlijke_staat']}\n"
-            if koper.get('partner_naam'):
-                text += f"- Partner: {koper['partner_naam']}\n"
-            
-            # Aanwezigheid
-            aanwezig_info = next((k for k in info.get('kopers_aanwezig', []) 
-                                if k['volgnummer'] == koper['volgnummer']), None)
-            if aanwezig_info:
-                text += f"- Persoonlijk aanwezig: {'Ja' if aanwezig_info['aanwezig'] else 'Nee'}\n"
-    
-    return text
+    return get_notarial_model(info).serialize('document', encoding)
 
-# ============= AGENT FUNCTIONS =============
+# ============= EVIDENCE SCANNER =============
 
-def research_agent_determine_needs(prompt, clause_type, source_content, model):
-    """Research agent that determines what information is needed"""
-    escaped_prompt = prompt.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
-    escaped_source_content = source_content.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
-    
-    research_prompt = f"""You are a legal research agent. Your task is to:
-1. Analyze what information is needed to properly answer the given prompt
-2. Search for this information in the provided documents
-3. Extract all relevant information found
-4. DETERMINE WHICH SCENARIO APPLIES based on the found information
+class EvidenceAutomaton:
+    """Aho-Corasick automaton that finds all evidence terms in a single pass over the text"""
 
-CLAUSE TYPE: {clause_type}
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
 
-PROMPT TO ANSWER:
-{escaped_prompt}
+        # Build the trie
+        for term in terms:
+            node = 0
+            for char in term:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node].append(term)
 
-SOURCE DOCUMENTS:
-{escaped_source_content[:10000]}
+        # Breadth-first pass to add failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
 
-IMPORTANT: If the prompt contains conditional blocks (like [BLOCK ALLEN_AANWEZIG] vs [BLOCK MET_VERTEGENWOORDIGING]), 
-determine which scenario applies based on the actual situation in the documents.
+    def iter_matches(self, text):
+        """Yield (start, end, term) for every term occurrence in the (lowercased) text"""
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            for term in self.output[node]:
+                yield position - len(term) + 1, position + 1, term
 
-Please:
-1. First determine ALL information needed to create a complete legal clause based on the prompt
-2. Search thoroughly through the documents for each piece of information
-3. Consider variations in terminology and indirect references
-4. Extract exact quotes or specific information when found
-5. DETERMINE THE APPLICABLE SCENARIO based on your findings
+@st.cache_resource(show_spinner=False)
+def get_evidence_automaton():
+    """Build the evidence automaton once per process for all Category 1a terms"""
+    terms = sorted({term for entry in FACTUAL_CLAUSE_EVIDENCE.values() for term in entry['terms']})
+    return EvidenceAutomaton(terms)
 
-Respond in JSON format (IN DUTCH/NEDERLANDS):
-{{
-    "applicable_scenario": "welk scenario van toepassing is (bijv. 'allen aanwezig' of 'met vertegenwoordiging')",
-    "required_information": [
-        {{
-            "item": "beschrijving van benodigde informatie",
-            "importance": "CRITICAL/HIGH/MEDIUM",
-            "typical_location": "waar dit normaal te vinden is"
-        }}
-    ],
-    "found_information": {{
-        "item_key": {{
-            "value": "gevonden waarde",
-            "source_quote": "exacte quote uit document",
-            "confidence": "HIGH/MEDIUM/LOW"
-        }}
-    }},
-    "missing_information": [
-        {{
-            "item": "ontbrekende informatie",
-            "searched_terms": ["zoektermen gebruikt"],
-            "required_for": "waarom dit nodig is"
-        }}
-    ],
-    "research_summary": "samenvatting van het onderzoek"
-}}"""
+def compute_content_hash(text):
+    """Stable hash of a text, used to cache per-dossier results"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
-    try:
-        response = model.generate_content(research_prompt)
-        result_text = response.text
-        
-        # Parse JSON
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group())
-            except json.JSONDecodeError:
-                # Try to clean common JSON issues
-                cleaned_json = json_match.group()
-                cleaned_json = re.sub(r',\s*}', '}', cleaned_json)
-                cleaned_json = re.sub(r',\s*]', ']', cleaned_json)
-                try:
-                    return json.loads(cleaned_json)
-                except:
-                    return {
-                        "applicable_scenario": "Unknown",
-                        "required_information": [],
-                        "found_information": {},
-                        "missing_information": [],
-                        "research_summary": "JSON parsing failed"
-                    }
-        else:
-            return {
-                "applicable_scenario": "Unknown",
-                "required_information": [],
-                "found_information": {},
-                "missing_information": [],
-                "research_summary": "Research parsing failed - no JSON found"
-            }
-    except Exception as e:
-        return {
-            "applicable_scenario": "Unknown",
-            "required_information": [],
-            "found_information": {},
-            "missing_information": [],
-            "research_summary": f"Research error: {str(e)}"
-        }
-
-def check_clause_applicability(prompt, clause_type, skip_conditions, source_content, notarial_info, model):
-    """Applicability Agent that checks if a clause should be skipped"""
-    clause_text = prompt
-    
-    # Format notarial info as "Klantinformatie"
-    klantinfo_text = "\n[Klantinformatie]\n"
-    
-    # Basic info
-    if 'verkopers' in notarial_info:
-        klantinfo_text += f"Aantal verkopers: {len(notarial_info['verkopers'])}\n"
-    if 'kopers' in notarial_info:
-        klantinfo_text += f"Aantal kopers: {len(notarial_info['kopers'])}\n"
-    
-    # Detailed seller info
-    for verkoper in notarial_info.get('verkopers', []):
-        num = verkoper['volgnummer']
-        klantinfo_text += f"Voornaam verkoper {num}: {verkoper.get('voornaam', 'Onbekend')}\n"
-        klantinfo_text += f"Achternaam verkoper {num}: {verkoper.get('achternaam', 'Onbekend')}\n"
-        klantinfo_text += f"Burgerlijke staat verkoper {num}: {verkoper.get('burgerlijke_staat', 'Onbekend')}\n"
-        
-        # Check aanwezigheid
-        aanwezig_info = next((v for v in notarial_info.get('verkopers_aanwezig', []) 
-                            if v['volgnummer'] == num), None)
-        if aanwezig_info:
-            klantinfo_text += f"Is verkoper {num} persoonlijk aanwezig? (ja/nee): {'ja' if aanwezig_info['aanwezig'] else 'nee'}\n"
-    
-    # Detailed buyer info
-    for koper in notarial_info.get('kopers', []):
-        num = koper['volgnummer']
-        klantinfo_text += f"Voornaam koper {num}: {koper.get('voornaam', 'Onbekend')}\n"
-        klantinfo_text += f"Achternaam koper {num}: {koper.get('achternaam', 'Onbekend')}\n"
-        klantinfo_text += f"Burgerlijke staat koper {num}: {koper.get('burgerlijke_staat', 'Onbekend')}\n"
-        
-        # Check aanwezigheid
-        aanwezig_info = next((k for k in notarial_info.get('kopers_aanwezig', []) 
-                            if k['volgnummer'] == num), None)
-        if aanwezig_info:
-            klantinfo_text += f"Is koper {num} persoonlijk aanwezig? (ja/nee): {'ja' if aanwezig_info['aanwezig'] else 'nee'}\n"
-    
-    # Other relevant info
-    if 'videoconferentie' in notarial_info:
-        klantinfo_text += f"Videoconferentie: {'ja' if notarial_info['videoconferentie'] else 'nee'}\n"
-    
-    check_prompt = f"""Je bent een gespecialiseerde AI-assistent voor notarieel werk in België. Jouw taak is om een voorgelegde clausule te analyseren en te bepalen of deze volledig verwijderd moet worden. Je redeneert als een ervaren medewerker: feitelijk onjuiste clausules worden verwijderd, maar relevante juridische opties voor de cliënten worden behouden in de ontwerpakte.
-
-GOUDEN REGEL: HET DOSSIER IS DE VOLLEDIGE EN ENIGE WAARHEID
-Je analyseert enkel en alleen de informatie in [Klantinformatie] en [Documenten]. Je hanteert het onwrikbare principe dat dit dossier 100% compleet is. De afwezigheid van informatie over een feit (bv. Bosdecreet, stookolietank) is voor jou het definitieve bewijs dat dit feit niet van toepassing is.
+def lowercase_preserving_offsets(text):
+    """Lowercase text without changing its length so match offsets stay valid"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters (e.g. 'İ') expand when lowercased, fall back to per-character mapping
+    return ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
 
-CLAUSULE KENNISBANK
-Je categoriseert elke clausule en past de bijbehorende logica strikt toe.
+def scan_factual_evidence(source_content, context_chars=200, max_passages=5):
+    """Scan the full corpus once and build an evidence map per Category 1a clause"""
+    automaton = get_evidence_automaton()
+    lowered = lowercase_preserving_offsets(source_content)
 
-Categorie 1a: Feitelijk Bepaalde Clausules
-Logica: SCHRAPPEN, tenzij er positief bewijs in het dossier is.
-- Clausule 26 "BOSDECREET": Schrappen, tenzij een document vermeldt dat het goed onder het Bosdecreet valt.
-- Clausules 28-32 "Specifieke Voorkooprechten": Schrappen, tenzij een document de toepassing bevestigt.
-- Clausule 37 "RISICOGROND": Schrappen, tenzij een document de grond als 'risicogrond' classificeert.
-- Clausule 39 "STOOKOLIETANKS": Schrappen, tenzij het dossier de aanwezigheid vermeldt.
-- Clausule 45 "ALARMINSTALLATIE": Schrappen, tenzij het dossier de aanwezigheid vermeldt.
-- Clausule 46 "ZONNEPANELEN": Schrappen, tenzij het dossier de aanwezigheid vermeldt.
-- Clausule 53 "VERWIJZING VORIGE AKTE": Schrappen, tenzij het dossier een basisakte/verkavelingsakte bevat.
+    hits_per_term = {}
+    for start, end, term in automaton.iter_matches(lowered):
+        hits_per_term.setdefault(term, []).append((start, end))
 
-Categorie 1b: Juridisch Bepaalde & Optionele Clausules
-Logica: BEHOUDEN als de situatie van de partijen het relevant maakt, tenzij het juridisch onmogelijk is.
-- Clausule 8 "BEDING VAN AANWAS MET OPTIE":
-  * Schrappen indien juridisch onmogelijk/irrelevant: Er is slechts één koper OF de kopers zijn gehuwd.
-  * Anders, BEHOUDEN: (bv. bij wettelijk samenwonenden) als relevante optie voor de cliënten.
-- Clausule 9 "ONVERDEELDHEID TUSSEN KOPERS":
-  * Schrappen indien irrelevant: clausule is niet toepasbaar indien de Kopers NIET zijn gehuwd. 
-  * Anders, BEHOUDEN: als standaardregeling of te bespreken optie.
-- Clausule 10 "VERKLARING ANTICIPATIEVE INBRENG":
-  * Schrappen indien juridisch onmogelijk/irrelevant: Er is slechts één koper OF de kopers zijn reeds gehuwd.
-  * Anders, BEHOUDEN: (bv. bij wettelijk/feitelijk samenwonenden) als relevante optie.
-- Clausule 11 "VRUCHTGEBRUIK/BLOTE EIGENDOM": Schrappen indien het dossier een aankoop in volle eigendom bevestigt.
-- Clausule 13 "GEZINSWONING": Schrappen, enkel als de verkoper niet gehuwd/wettelijk samenwonend is OF als het pand expliciet niet de gezinswoning is.
-- Clausule 51 "OVEREENKOMST KOPERS" (Schuldvordering):
-  * Schrappen indien irrelevant: Er is slechts één koper.
-  * Anders, BEHOUDEN: als relevante optie om een eventuele ongelijke inbreng te regelen.
+    evidence_map = {}
+    for clause_number, entry in FACTUAL_CLAUSE_EVIDENCE.items():
+        hits = []
+        for term in entry['terms']:
+            for start, end in hits_per_term.get(term, []):
+                hits.append({'term': term, 'start': start, 'end': end})
+        hits.sort(key=lambda hit: hit['start'])
 
-Categorie 2: Essentiële Clausules (Nooit verwijderen)
-Deze clausules (1-7, 15-27, 33-36, 38, 40, 41, 44, 47-50, 52, 54-60, etc.) zijn fundamenteel en worden ALTIJD behouden.
+        # Merge overlapping context windows into passages
+        passages = []
+        for hit in hits:
+            window_start = max(0, hit['start'] - context_chars)
+            window_end = min(len(source_content), hit['end'] + context_chars)
+            if passages and window_start <= passages[-1]['end']:
+                passages[-1]['end'] = max(passages[-1]['end'], window_end)
+                if hit['term'] not in passages[-1]['terms']:
+                    passages[-1]['terms'].append(hit['term'])
+            else:
+                passages.append({'start': window_start, 'end': window_end, 'terms': [hit['term']]})
 
-{klantinfo_text}
+        for passage in passages:
+            passage['text'] = source_content[passage['start']:passage['end']].strip()
 
-[Documenten]
-{source_content[:5000]}... [beperkt voor context]
+        evidence_map[clause_number] = {
+            'label': entry['label'],
+            'category': '1a',
+            'hits': hits,
+            'passages': passages[:max_passages]
+        }
 
-[Clausule om te beoordelen]
-{clause_text}
+    return evidence_map
 
-OUTPUT FORMAAT
+def get_clause_number(df, row_number):
+    """Clause number of a CSV row: the optional clause_number column, else its 1-based row position"""
+    if 'clause_number' in df.columns:
+        value = df.iloc[row_number - 1]['clause_number']
+        if lazy_import('pandas').notna(value):
+            return int(value)
+    return row_number
 
-ANALYSE:
+def is_essential_clause(df, row_number):
+    return get_clause_number(df, row_number) in ESSENTIAL_CLAUSES
 
-CLAUSULE: [Naam van de clausule]
-CATEGORIE: [Categorie 1a: Feitelijk / 1b: Optioneel / 2: Essentieel]
-TOEGEPASTE LOGICA: [Beschrijf de redeneerstap]
-RESULTAAT TOETSING: [Bv. "Geen bewijs gevonden." OF "Geen juridische onmogelijkheid gevonden."]
+def get_clause_evidence(evidence_map, df, row_number):
+    """Category 1a evidence of a CSV row, or None when the clause has no evidence entry"""
+    return evidence_map.get(get_clause_number(df, row_number))
 
-FINALE BESLISSING: JA (mag volledig verwijderd worden) / NEE (moet behouden blijven)
+def get_dossier_evidence_map():
+    """Return the evidence map for the current dossier, scanning only when the corpus changed"""
+    content_hash = get_source_hash()
+    cached = st.session_state.get('evidence_map')
+    if not cached or cached['content_hash'] != content_hash:
+        cached = {
+            'content_hash': content_hash,
+            'map': scan_factual_evidence(get_source_content())
+        }
+        st.session_state.evidence_map = cached
+    return cached['map']
 
-REDENERING:
-[Synthese die leidt tot de finale beslissing]
+# ============= STRUCTURED IDENTIFIER EXTRACTORS =============
 
-BEWIJS:
-[Citeer het bewijs]
+DUTCH_MONTHS = {
+    "januari": 1, "februari": 2, "maart": 3, "april": 4, "mei": 5, "juni": 6,
+    "juli": 7, "augustus": 8, "september": 9, "oktober": 10, "november": 11, "december": 12
+}
 
-IMPACT VAN DE BESLISSING:
-[Leg uit waarom de beslissing de ontwerpakte verbetert]"""
+# Compiled once, reused for every dossier
+RIJKSREGISTER_PATTERN = re.compile(r'(?<![\d.])(\d{2})\.?(\d{2})\.?(\d{2})[-. ]?(\d{3})\.?(\d{2})(?![\d])')
+NUMERIC_DATE_PATTERN = re.compile(r'(?<!\d)(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})(?!\d)')
+TEXT_DATE_PATTERN = re.compile(r'(?<!\d)(\d{1,2})\s+(' + '|'.join(DUTCH_MONTHS) + r')\s+(\d{4})(?!\d)', re.IGNORECASE)
+EURO_AMOUNT_PATTERN = re.compile(
+    r'(?:€|EUR\b|euro\b)\s*(\d{1,3}(?:[. ]\d{3})*(?:,\d{1,2})?|\d+(?:,\d{1,2})?)'
+    r'|(\d{1,3}(?:[. ]\d{3})*(?:,\d{1,2})?|\d+(?:,\d{1,2})?)\s*(?:€|EUR\b|euro\b)',
+    re.IGNORECASE
+)
+KADASTER_PATTERN = re.compile(
+    r'(?:(\d+)\s*(?:e|ste|de)?\s+afdeling|afdeling\s+(\d+|[A-Z][\w-]*))?[\s,]*'
+    r'sectie\s+([A-Z])[\s,]*(?:perceelnummer|perceel|nummer|nr\.?)\s*'
+    # Letter suffixes are uppercase only ("123A", "45/02B"), so a following "en"/"of" is not taken as one
+    r'(\d{1,4}(?:/\d{2})?(?-i:\s?[A-Z]?\s?\d{0,3}[A-Z]?\d{0,3}))(?!\w)',
+    re.IGNORECASE
+)
+KEURING_KEYWORDS = re.compile(r'keuring|gekeurd|proces-verbaal|controleorganisme|\bBTV\b|vinçotte|vincotte|\bAIB\b|\bACEG\b', re.IGNORECASE)
+AMOUNT_CONTEXT_KEYWORDS = re.compile(r'koopsom|prijs|verkoopprijs|aankoopprijs', re.IGNORECASE)
 
-    try:
-        response = model.generate_content(check_prompt)
-        result_text = response.text
-        
-        # Extract decision
-        decision_match = re.search(r'\*\*FINALE BESLISSING:\*\*\s*JA', result_text, re.IGNORECASE)
-        if not decision_match:
-            decision_match = re.search(r'FINALE BESLISSING:\s*JA', result_text, re.IGNORECASE)
-        
-        may_skip = decision_match is not None
-        
-        return may_skip, result_text
-            
-    except Exception as e:
-        return False, f"Error tijdens analyse: {str(e)}"
+def validate_rijksregisternummer(value):
+    """Validate a Belgian national register number with its mod-97 checksum"""
+    digits = re.sub(r'\D', '', str(value))
+    if len(digits) != 11:
+        return False
+    base, check = int(digits[:9]), int(digits[9:])
+    # Born before 2000: checksum over the 9 digits, from 2000 onwards a '2' is prefixed
+    return 97 - (base % 97) == check or 97 - ((2000000000 + base) % 97) == check
 
-def review_agent_check(prompt, research_data, clause_type, model):
-    """Review agent that analyzes what's missing based on research"""
-    review_prompt = f"""You are a legal review agent. Based on the research findings, determine what additional information is TRULY needed.
+def format_rijksregisternummer(value):
+    """Format 11 digits as YY.MM.DD-XXX.XX"""
+    digits = re.sub(r'\D', '', str(value))
+    return f"{digits[0:2]}.{digits[2:4]}.{digits[4:6]}-{digits[6:9]}.{digits[9:11]}"
 
-IMPORTANT: The research agent has already found information. Only mark something as missing if it was NOT found or had a None/null value.
+def parse_euro_amount(raw):
+    """Convert a Belgian formatted amount ('250.000,00') to a float"""
+    return float(raw.replace(' ', '').replace('.', '').replace(',', '.'))
 
-CLAUSE TYPE: {clause_type}
+def extract_structured_identifiers(text):
+    """Find and validate structured Belgian identifiers in the corpus, with source offsets"""
+    identifiers = {
+        'rijksregisternummers': [],
+        'datums': [],
+        'bedragen': [],
+        'kadastrale_percelen': [],
+        'keuring_datums': []
+    }
+    
+    for match in RIJKSREGISTER_PATTERN.finditer(text):
+        digits = ''.join(match.groups())
+        if validate_rijksregisternummer(digits):
+            identifiers['rijksregisternummers'].append({
+                'value': format_rijksregisternummer(digits),
+                'raw': match.group(),
+                'start': match.start(),
+                'end': match.end()
+            })
+    
+    for pattern, textual in ((NUMERIC_DATE_PATTERN, False), (TEXT_DATE_PATTERN, True)):
+        for match in pattern.finditer(text):
+            day, month, year = match.groups()
+            month_number = DUTCH_MONTHS[month.lower()] if textual else int(month)
+            try:
+                date_obj = datetime(int(year), month_number, int(day))
+            except ValueError:
+                continue
+            identifiers['datums'].append({
+                'value': date_obj.strftime("%d-%m-%Y"),
+                'raw': match.group(),
+                'start': match.start(),
+                'end': match.end()
+            })
+    identifiers['datums'].sort(key=lambda item: item['start'])
+    
+    # Keuring dates: dates preceded closely by an inspection keyword
+    for date_item in identifiers['datums']:
+        window = text[max(0, date_item['start'] - 150):date_item['start']]
+        if KEURING_KEYWORDS.search(window):
+            lowered = window.lower()
+            kind = 'elektrisch' if 'elektr' in lowered else 'stookolie' if ('stookolie' in lowered or 'tank' in lowered) else 'onbekend'
+            identifiers['keuring_datums'].append(dict(date_item, soort=kind))
+    
+    for match in EURO_AMOUNT_PATTERN.finditer(text):
+        raw_amount = match.group(1) or match.group(2)
+        try:
+            amount = parse_euro_amount(raw_amount)
+        except ValueError:
+            continue
+        # Only look for a keyword within the same sentence before the amount
+        context = text[max(0, match.start() - 80):match.start()]
+        sentence_break = max(context.rfind('\n'), context.rfind('. '))
+        if sentence_break >= 0:
+            context = context[sentence_break + 1:]
+        context_match = AMOUNT_CONTEXT_KEYWORDS.search(context)
+        identifiers['bedragen'].append({
+            'value': amount,
+            'formatted': f"€ {amount:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.'),
+            'raw': match.group(),
+            'start': match.start(),
+            'end': match.end(),
+            'context_keyword': context_match.group().lower() if context_match else None
+        })
+    
+    for match in KADASTER_PATTERN.finditer(text):
+        afdeling = match.group(1) or match.group(2)
+        identifiers['kadastrale_percelen'].append({
+            'value': {
+                'afdeling': afdeling,
+                'sectie': match.group(3).upper(),
+                'nummer': re.sub(r'\s+', '', match.group(4)).upper()
+            },
+            'raw': match.group().strip(' ,'),
+            'start': match.start(),
+            'end': match.end()
+        })
+    
+    return identifiers
 
-ORIGINAL PROMPT:
-{prompt}
+def format_perceel(perceel):
+    """Human readable form of a kadastraal perceel"""
+    parts = []
+    if perceel.get('afdeling'):
+        parts.append(f"afdeling {perceel['afdeling']}")
+    parts.append(f"sectie {perceel['sectie']}")
+    parts.append(f"nummer {perceel['nummer']}")
+    return ", ".join(parts)
 
-RESEARCH AGENT FINDINGS:
-- Research Summary: {research_data.get('research_summary', 'N/A')}
-- Found Information: {json.dumps(research_data.get('found_information', {}), ensure_ascii=False)}
-- Missing Information: {json.dumps(research_data.get('missing_information', []), ensure_ascii=False)}
+def find_nearest_rijksregisternummer(name, identifiers, source_content, max_distance=400):
+    """Find the validated rijksregisternummer closest to an occurrence of a party name"""
+    if not name or len(name) < 2:
+        return None
+    name_pattern = r'\s+'.join(re.escape(word) for word in name.split())
+    best, best_distance = None, max_distance + 1
+    for name_match in re.finditer(name_pattern, source_content, re.IGNORECASE):
+        for rrn in identifiers['rijksregisternummers']:
+            distance = min(abs(rrn['start'] - name_match.end()), abs(name_match.start() - rrn['end']))
+            if distance < best_distance:
+                best, best_distance = rrn, distance
+    return best
 
-CRITICAL INSTRUCTIONS:
-1. If research found "repertorium_number: 224455", then repertorium IS NOT MISSING
-2. If research found something with value "None" or "null", then it IS missing
-3. Check exact values - don't just look at the missing list
-4. Only list items that are truly needed and not already found
+def party_search_name(party, parties):
+    """Voornaam + achternaam to locate a party in the corpus, or None when another party has the same surname"""
+    surname = (party.get('achternaam') or '').strip()
+    if not surname:
+        return None
+    if sum(1 for other in parties if (other.get('achternaam') or '').strip().lower() == surname.lower()) > 1:
+        return None
+    return " ".join(filter(None, [(party.get('voornaam') or '').strip(), surname]))
 
-Respond in JSON format (ALL IN DUTCH):
-{{
-    "analysis": "korte analyse van wat nodig is",
-    "applicable_scenario": "welk scenario van toepassing is",
-    "already_found": ["items that research already found with valid values"],
-    "critical_missing": ["ONLY items that are truly missing - had None/null values or weren't found"],
-    "questions_for_user": [
-        {{
-            "missing_info": "wat ontbreekt",
-            "question": "de vraag aan gebruiker",
-            "options": ["optie 1", "optie 2", "optie 3", "optie 4", "Anders"],
-            "importance": "CRITICAL/HIGH/MEDIUM"
-        }}
-    ],
-    "can_proceed_without": ["lijst van info die wenselijk maar niet kritiek is"],
-    "not_applicable_info": ["lijst van informatie die NIET nodig is"]
-}}"""
+def apply_local_identifiers_to_form(form_data, identifiers, source_content):
+    """Fill missing or invalid party rijksregisternummers in the intake pre-fill using the local extractor
     
-    try:
-        response = model.generate_content(review_prompt)
-        result_text = response.text
-        
-        # Parse JSON
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        else:
-            return {
-                "analysis": "Review parsing failed",
-                "applicable_scenario": "Unknown",
-                "already_found": [],
-                "critical_missing": [],
-                "questions_for_user": [],
-                "can_proceed_without": [],
-                "not_applicable_info": []
-            }
-    except Exception as e:
-        return {
-            "analysis": f"Review error: {str(e)}",
-            "applicable_scenario": "Unknown",
-            "already_found": [],
-            "critical_missing": [],
-            "questions_for_user": [],
-            "can_proceed_without": [],
-            "not_applicable_info": []
+    A valid number is never replaced. Returns the updated form data and a list of warnings for values
+    that failed validation and could not be filled.
+    """
+    warnings = []
+    parties = form_data.get('verkopers', []) + form_data.get('kopers', [])
+    for role in ('verkopers', 'kopers'):
+        for index, party in enumerate(form_data.get(role, []), 1):
+            current = party.get('rijksregisternummer')
+            if current and validate_rijksregisternummer(current):
+                continue
+            local = find_nearest_rijksregisternummer(party_search_name(party, parties), identifiers, source_content)
+            if local:
+                party['rijksregisternummer'] = local['value']
+            elif current:
+                warnings.append(f"Rijksregisternummer {current} van {role[:-1]} {index} is ongeldig (mod-97) en werd niet ingevuld")
+                del party['rijksregisternummer']
+    return form_data, warnings
+
+def get_dossier_identifiers():
+    """Return the structured identifiers for the current dossier, extracting only when the corpus changed"""
+    content_hash = get_source_hash()
+    cached = st.session_state.get('dossier_identifiers')
+    if not cached or cached['content_hash'] != content_hash:
+        cached = {
+            'content_hash': content_hash,
+            'identifiers': extract_structured_identifiers(get_source_content())
         }
+        st.session_state.dossier_identifiers = cached
+    return cached['identifiers']
 
-def focused_search_for_missing_info(missing_info, source_content, notarial_info, model):
-    """Perform a focused search for specific missing information"""
+def find_referenced_party(text, notarial_info):
+    """The one party a text names: an explicit "koper 2" / "tweede koper", or "de verkoper" when there is only one; else None"""
+    reference = parse_party_reference(text)
+    if reference:
+        role, volgnummer = reference
+        return next((p for p in notarial_info.get(role + 's', []) if p.get('volgnummer') == volgnummer), None)
+    match = PARTY_REFERENCE_PATTERN.search(text.lower())
+    if match and not match.group(3):
+        parties = notarial_info.get(match.group(2) + 's', [])
+        return parties[0] if len(parties) == 1 else None
+    return None
+
+def local_search_for_missing_info(missing_info, identifiers, source_content, notarial_info):
+    """Resolve a missing item with the local extractors; returns a focused search result or None
     
-    # Format notarial info as searchable text
-    notarial_text = "\n\n--- NOTARIËLE INFORMATIE ---\n"
+    Only answers when the corpus yields exactly one unambiguous value, otherwise the LLM search
+    is used as fallback.
+    """
+    lowered = missing_info.lower()
+    candidates = []
     
-    # Add all fields from notarial info
-    for key, value in notarial_info.items():
-        if key == 'verkopers':
-            notarial_text += f"\nVERKOPERS:\n"
-            for v in value:
-                for k, val in v.items():
-                    notarial_text += f"  verkoper_{v['volgnummer']}_{k}: {val}\n"
-        elif key == 'kopers':
-            notarial_text += f"\nKOPERS:\n"
-            for koper in value:
-                for k, val in koper.items():
-                    notarial_text += f"  koper_{koper['volgnummer']}_{k}: {val}\n"
-        elif key == 'user_answers':
-            notarial_text += f"\nEERDER BEANTWOORDE VRAGEN:\n"
-            for k, val in value.items():
-                if isinstance(val, dict):
-                    notarial_text += f"  {val.get('missing_info', k)}: {val.get('answer', val)}\n"
+    if 'rijksregister' in lowered:
+        role_match = PARTY_REFERENCE_PATTERN.search(lowered)
+        if role_match:
+            party = find_referenced_party(lowered, notarial_info)
+            if not party:
+                # "de kopers" or an unknown party: one party's number must not answer it
+                return None
+            parties = notarial_info.get('verkopers', []) + notarial_info.get('kopers', [])
+            nearest = find_nearest_rijksregisternummer(party_search_name(party, parties), identifiers, source_content)
+            if nearest:
+                candidates = [nearest]
         else:
-            notarial_text += f"{key}: {value}\n"
+            candidates = identifiers['rijksregisternummers']
+    elif 'keuring' in lowered and 'datum' in lowered:
+        candidates = identifiers['keuring_datums']
+        if 'elektr' in lowered:
+            candidates = [item for item in candidates if item['soort'] == 'elektrisch']
+    elif 'kadast' in lowered or 'perceel' in lowered:
+        candidates = identifiers['kadastrale_percelen']
+    elif 'koopsom' in lowered or 'prijs' in lowered:
+        candidates = [item for item in identifiers['bedragen'] if item['context_keyword']]
+    else:
+        return None
     
-    search_prompt = f"""You are a specialized legal document search agent. Your task is to find VERY SPECIFIC information.
+    def display_value(item):
+        if isinstance(item['value'], dict):
+            return format_perceel(item['value'])
+        return item.get('formatted', item['value'])
+    
+    distinct_values = {str(display_value(item)) for item in candidates}
+    if len(distinct_values) != 1:
+        return None
+    
+    item = candidates[0]
+    context = source_content[max(0, item['start'] - 100):item['end'] + 100].strip()
+    return {
+        "search_performed": True,
+        "found_in": "source_docs",
+        "found_items": {
+            missing_info: {
+                "found": True,
+                "value": display_value(item),
+                "location": f"{get_page_index(source_content).label(item['start']) or 'notariële informatie'}, tekens {item['start']}-{item['end']}",
+                "context": context,
+                "confidence": "HIGH"
+            }
+        },
+        "search_notes": f"Gevonden door lokale extractor ({len(candidates)} gevalideerde treffer(s)), geen LLM call nodig",
+        "local_extractor": True
+    }
 
-MISSING INFORMATION TO FIND:
-{missing_info}
+# ============= PASSAGE RETRIEVAL =============
 
-SEARCH IN TWO PLACES:
-1. First check the NOTARIAL INFORMATION (already collected data)
-2. Then check the SOURCE DOCUMENTS
+# Common Dutch/English words that carry no search signal
+RETRIEVAL_STOPWORDS = {
+    'de', 'het', 'een', 'van', 'voor', 'met', 'aan', 'bij', 'die', 'dat', 'wat', 'welke', 'zijn',
+    'wordt', 'worden', 'niet', 'geen', 'door', 'over', 'naar', 'the', 'and', 'for', 'with', 'information',
+    'informatie', 'gegevens', 'nodig', 'ontbrekende'
+}
 
---- NOTARIAL INFORMATION TO SEARCH ---
-{notarial_text}
+def extract_query_terms(queries):
+    """Turn free-text queries into a set of lowercase search terms"""
+    terms = set()
+    for query in queries:
+        for token in re.findall(r'[a-zà-ÿ0-9]+', str(query).lower()):
+            if len(token) >= 4 and token not in RETRIEVAL_STOPWORDS:
+                terms.add(token)
+    return terms
 
---- SOURCE DOCUMENTS TO SEARCH ---
-{source_content[:45000]}
+def retrieve_passages(source_content, queries, max_chars=15000, window=800, overlap=200):
+    """Select the corpus windows that best match the query terms, in document order"""
+    terms = extract_query_terms(queries)
+    if not terms or not source_content:
+        return [{'start': 0, 'end': min(len(source_content), max_chars), 'text': source_content[:max_chars]}]
+    
+    lowered = lowercase_preserving_offsets(source_content)
+    scored = []
+    step = window - overlap
+    for start in range(0, len(lowered), step):
+        chunk = lowered[start:start + window]
+        score = sum(chunk.count(term) for term in terms)
+        if score:
+            scored.append((score, start))
+    
+    # Highest scoring windows first until the budget is used, then restore document order
+    selected = []
+    budget = max_chars
+    for score, start in sorted(scored, key=lambda item: (-item[0], item[1])):
+        end = min(len(source_content), start + window)
+        if any(start < sel_end and end > sel_start for sel_start, sel_end in selected):
+            continue
+        if end - start > budget:
+            break
+        selected.append((start, end))
+        budget -= end - start
+    
+    return [{'start': start, 'end': end, 'text': source_content[start:end]} for start, end in sorted(selected)]
 
-CRITICAL CONTEXT FOR NOTARIAL TERMS:
-- "day_and_month" or "dag en maand" = the day and month from the ondertekening_datum (signing date)
-- "aktedag" = the date of signing the deed = ondertekening_datum
-- If looking for day/month and you find ondertekening_datum like "30-10-1990", extract day=30, month=oktober
-- Dutch months: januari, februari, maart, april, mei, juni, juli, augustus, september, oktober, november, december
-- "repertorium_nummer" = repertory number for the deed
-- "Rijksregisternummer" = Belgian national register number (format: YY.MM.DD-XXX.XX)
+# ============= LLM CALL INSTRUMENTATION =============
 
-For electrical installations:
-- "Nieuwe installatie" = had complete inspection BEFORE use
-- "Oude installatie" = did NOT have inspection before use
-- Look for dates in formats: "1 april 2015", "01/04/2015"
-- Inspection organizations: BTV, Vinçotte, AIB, ACEG, etc.
+def estimate_tokens(text):
+    """Rough token estimate (about 4 characters per token) for prompt size comparisons"""
+    return estimate_tokens_for_chars(len(text)) if text else 0
 
-INSTRUCTIONS:
-1. FIRST check if this information already exists in the notarial information section
-2. If not found there, search the source documents
-3. Look for variations in spelling, formatting, and phrasing
-4. Consider that the same information might be stored under different keys
+def estimate_tokens_for_chars(chars):
+    return chars // 4
 
-Return JSON format:
-{{
-    "search_performed": true,
-    "found_in": "notarial_info/source_docs/not_found",
-    "found_items": {{
-        "{missing_info}": {{
-            "found": true/false,
-            "value": "exact value found or null",
-            "location": "where it was found (notarial info field or document section)",
-            "context": "surrounding text or field name where found",
-            "confidence": "HIGH/MEDIUM/LOW"
-        }}
-    }},
-    "search_notes": "explanation of search process and any important observations"
-}}"""
+class RateLimiter:
+    """Bounds concurrent LLM calls and keeps them under a requests-per-minute quota (sliding window)"""
 
-    try:
-        response = model.generate_content(search_prompt)
-        result_text = response.text
-        
-        # Parse JSON
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        else:
-            return None
-    except Exception as e:
-        return None
+    def __init__(self, max_concurrency, requests_per_minute):
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.lock = threading.Lock()
+        self.recent_calls = deque()
 
-def create_complete_information_set(research_data, user_answers, model):
-    """Agent that creates a complete information set from research and user input"""
-    
-    # Extract key user decisions from answers
-    user_decisions = {}
-    for key, answer_data in user_answers.items():
-        if isinstance(answer_data, dict):
-            # Check for negative confirmations
-            answer_text = answer_data.get('answer', '').lower()
-            question_text = answer_data.get('question', '').lower()
-            
-            # Detect boolean decisions
-            if 'nee' in answer_text or 'geen' in answer_text:
-                # Extract what was negated
-                if 'beding van aanwas' in question_text:
-                    user_decisions['beding_van_aanwas_aanwezig'] = False
-                elif 'tontine' in question_text:
-                    user_decisions['tontine_aanwezig'] = False
-    
-    compile_prompt = f"""You are a legal information compiler. Create a complete information set by combining:
+    def __enter__(self):
+        self.semaphore.acquire()
+        while self.requests_per_minute:
+            with self.lock:
+                now = time.monotonic()
+                while self.recent_calls and now - self.recent_calls[0] >= 60:
+                    self.recent_calls.popleft()
+                if len(self.recent_calls) < self.requests_per_minute:
+                    self.recent_calls.append(now)
+                    break
+                wait = 60 - (now - self.recent_calls[0])
+            time.sleep(wait)
+        return self
 
-RESEARCH FINDINGS:
-{json.dumps(research_data.get('found_information', {}), ensure_ascii=False, indent=2)}
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.semaphore.release()
+        return False
 
-USER PROVIDED INFORMATION:
-{json.dumps(user_answers, ensure_ascii=False, indent=2)}
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter():
+    """Process-wide rate limiter shared by every session and worker thread"""
+    return RateLimiter(LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE)
 
-USER DECISIONS (extracted):
-{json.dumps(user_decisions, ensure_ascii=False, indent=2)}
+class InstrumentedModel:
+    """Wraps a generative model and records latency and token usage of every call"""
 
-CRITICAL INSTRUCTION:
-- When the user explicitly confirms something is NOT present (e.g., "Nee, geen beding van aanwas"), this OVERRIDES any other information
-- Include explicit negative confirmations in the complete_information set
-- Flag conditions that should NOT be included in the final clause
+    def __init__(self, model, call_log, agent=None, clause=None, rate_limiter=None):
+        self.model = model
+        self.call_log = call_log
+        self.agent = agent
+        self.clause = clause
+        self.rate_limiter = rate_limiter
 
-Create a comprehensive information set that includes all necessary details for generating a complete legal clause.
-Merge research findings with user input, prioritizing user input when there are conflicts.
+    def for_agent(self, agent, clause=None):
+        """Return a view on the same model and log that tags calls with an agent name"""
+        return InstrumentedModel(
+            self.model, self.call_log, agent, clause if clause is not None else self.clause, self.rate_limiter
+        )
 
-Respond in JSON format (IN DUTCH):
-{{
-    "complete_information": {{
-        "key": {{
-            "value": "waarde",
-            "source": "research/user/combined",
-            "confidence": "HIGH/MEDIUM/LOW"
-        }}
-    }},
-    "excluded_conditions": ["lijst van condities die NIET toegepast moeten worden"],
-    "compilation_notes": "notities over de samenstelling",
-    "ready_for_generation": true/false
-}}"""
+    def generate_content(self, prompt, **kwargs):
+        start_time = time.time()
+        response = None
+        try:
+            with self.rate_limiter or get_rate_limiter():
+                response = self.model.generate_content(prompt, **kwargs)
+            return response
+        finally:
+            prompt_tokens, output_tokens, estimated = None, None, False
+            usage = getattr(response, 'usage_metadata', None)
+            if usage is not None:
+                prompt_tokens = getattr(usage, 'prompt_token_count', None)
+                output_tokens = getattr(usage, 'candidates_token_count', None)
+            if prompt_tokens is None:
+                prompt_tokens = estimate_tokens(prompt if isinstance(prompt, str) else str(prompt))
+                estimated = True
+            if output_tokens is None:
+                try:
+                    output_tokens = estimate_tokens(response.text) if response is not None else 0
+                except Exception:
+                    output_tokens = 0
+            self.call_log.append({
+                'agent': self.agent or 'unknown',
+                'clause': self.clause,
+                'seconds': time.time() - start_time,
+                'prompt_tokens': prompt_tokens,
+                'output_tokens': output_tokens,
+                'estimated': estimated,
+                'ok': response is not None,
+                'time': datetime.now().strftime('%H:%M:%S')
+            })
 
-    try:
-        response = model.generate_content(compile_prompt)
-        result_text = response.text
-        
-        # Parse JSON
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-        if json_match:
-            return json.loads(json_match.group())
-        else:
-            return {
-                "complete_information": {},
-                "excluded_conditions": [],
-                "compilation_notes": "Compilation failed",
-                "ready_for_generation": False
-            }
-    except Exception as e:
-        return {
-            "complete_information": {},
-            "excluded_conditions": [],
-            "compilation_notes": f"Error: {str(e)}",
-            "ready_for_generation": False
-        }
+def summarize_llm_calls(call_log, agent=None):
+    """Aggregate call count, latency and tokens from an LLM call log"""
+    entries = [e for e in call_log if agent is None or e['agent'] == agent]
+    return {
+        'calls': len(entries),
+        'seconds': sum(e['seconds'] for e in entries),
+        'prompt_tokens': sum(e['prompt_tokens'] or 0 for e in entries),
+        'output_tokens': sum(e['output_tokens'] or 0 for e in entries)
+    }
 
-def generate_final_clause(prompt, complete_info, research_data, source_content, model):
-    """Generate the final clause with complete information"""
-    
-    # First, check if the prompt contains template markers
-    has_template = '{{' in prompt and '}}' in prompt
+# ============= AGENT FUNCTIONS =============
+
+def escape_prompt_text(text):
+    return text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\r', '\\r')
+
+def build_research_prompt(prompt, clause_type, documents_text, chunk_label=None):
+    """Build the research prompt for the whole corpus or, in map-reduce mode, one chunk of it"""
+    documents_header = f"SOURCE DOCUMENTS ({chunk_label}; other parts are researched separately):" if chunk_label else "SOURCE DOCUMENTS:"
     
-    if has_template:
-        # This is a template-based prompt, we need to fill in the placeholders
-        
-        # Extract all required placeholders from the prompt
-        placeholders = re.findall(r'\{\{([^}]+)\}\}', prompt)
-        
-        # Build a mapping of placeholder values from all available information
-        placeholder_values = {}
+    return f"""You are a legal research agent. Your task is to:
+1. Analyze what information is needed to properly answer the given prompt
+2. Search for this information in the provided documents
+3. Extract all relevant information found
+4. DETERMINE WHICH SCENARIO APPLIES based on the found information
+
+CLAUSE TYPE: {clause_type}
+
+PROMPT TO ANSWER:
+{escape_prompt_text(prompt)}
+
+{documents_header}
+{documents_text}
+
+IMPORTANT: If the prompt contains conditional blocks (like [BLOCK ALLEN_AANWEZIG] vs [BLOCK MET_VERTEGENWOORDIGING]), 
+determine which scenario applies based on the actual situation in the documents.
+
+Please:
+1. First determine ALL information needed to create a complete legal clause based on the prompt
+2. Search thoroughly through the documents for each piece of information
+3. Consider variations in terminology and indirect references
+4. Extract exact quotes or specific information when found
+5. DETERMINE THE APPLICABLE SCENARIO based on your findings
+
+Respond in JSON format (IN DUTCH/NEDERLANDS):
+{{
+    "applicable_scenario": "welk scenario van toepassing is (bijv. 'allen aanwezig' of 'met vertegenwoordiging')",
+    "required_information": [
+        {{
+            "item": "beschrijving van benodigde informatie",
+            "importance": "CRITICAL/HIGH/MEDIUM",
+            "typical_location": "waar dit normaal te vinden is"
+        }}
+    ],
+    "found_information": {{
+        "item_key": {{
+            "value": "gevonden waarde",
+            "source_quote": "exacte quote uit document",
+            "confidence": "HIGH/MEDIUM/LOW"
+        }}
+    }},
+    "missing_information": [
+        {{
+            "item": "ontbrekende informatie",
+            "searched_terms": ["zoektermen gebruikt"],
+            "required_for": "waarom dit nodig is"
+        }}
+    ],
+    "research_summary": "samenvatting van het onderzoek"
+}}"""
+
+def research_fallback(summary):
+    """Empty research result used when the agent fails"""
+    return {
+        "applicable_scenario": "Unknown",
+        "required_information": [],
+        "found_information": {},
+        "missing_information": [],
+        "research_summary": summary
+    }
+
+def parse_research_response(result_text):
+    """Parse the JSON answer of the research agent, with a fallback structure on failure"""
+    json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+    if not json_match:
+        return research_fallback("Research parsing failed - no JSON found")
+    try:
+        return json.loads(json_match.group())
+    except json.JSONDecodeError:
+        # Try to clean common JSON issues
+        cleaned_json = json_match.group()
+        cleaned_json = re.sub(r',\s*}', '}', cleaned_json)
+        cleaned_json = re.sub(r',\s*]', ']', cleaned_json)
+        try:
+            return json.loads(cleaned_json)
+        except:
+            return research_fallback("JSON parsing failed")
+
+def run_research_prompt(research_prompt, model):
+    try:
+        return parse_research_response(model.generate_content(research_prompt).text)
+    except Exception as e:
+        return research_fallback(f"Research error: {str(e)}")
+
+def research_agent_determine_needs(prompt, clause_type, source_content, model):
+    """Research agent that determines what information is needed
+    
+    Corpora above RESEARCH_MAP_REDUCE_THRESHOLD, or without a digest above RESEARCH_SINGLE_CALL_CHARS,
+    are researched chunk by chunk (see research_map_reduce), so no part of the corpus is cut off.
+    """
+    if len(source_content) > RESEARCH_MAP_REDUCE_THRESHOLD:
+        return research_map_reduce(prompt, clause_type, source_content, model)
+    documents_text = build_document_context(source_content, [prompt, clause_type], model)
+    if documents_text is None and len(escape_prompt_text(source_content)) > RESEARCH_SINGLE_CALL_CHARS:
+        return research_map_reduce(prompt, clause_type, source_content, model)
+    research_prompt = build_research_prompt(
+        prompt, clause_type, escape_prompt_text(documents_text) if documents_text else escape_prompt_text(source_content)
+    )
+    return verify_research_quotes(run_research_prompt(research_prompt, model), source_content)
+
+# ============= MAP-REDUCE RESEARCH =============
+
+CONFIDENCE_RANK = {'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
+
+def split_research_chunks(source_content, chunk_chars=RESEARCH_CHUNK_CHARS, overlap=RESEARCH_CHUNK_OVERLAP):
+    """Split the corpus into overlapping (start, end) chunks, breaking at line ends where possible"""
+    chunks = []
+    start = 0
+    while start < len(source_content):
+        end = min(len(source_content), start + chunk_chars)
+        if end < len(source_content):
+            newline = source_content.rfind('\n', start + chunk_chars // 2, end)
+            if newline != -1:
+                end = newline + 1
+        chunks.append((start, end))
+        if end == len(source_content):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+def research_item_key(text):
+    return re.sub(r'[^a-z0-9à-ÿ]+', '_', str(text).lower()).strip('_')
+
+def merge_research_results(results):
+    """Reduce the per-chunk research results into one result
+    
+    For every found item the most confident value wins (earliest chunk on a tie); differing values
+    are kept as conflicts. Items found in any chunk are no longer reported missing.
+    """
+    found, conflicts = {}, {}
+    for chunk_number, result in enumerate(results, 1):
+        for key, item in (result.get('found_information') or {}).items():
+            if not isinstance(item, dict) or item.get('value') in (None, '', 'NOT_FOUND'):
+                continue
+            item = dict(item, source_chunk=chunk_number)
+            current = found.get(key)
+            if current is None:
+                found[key] = item
+                continue
+            if normalize_whitespace(current['value']) != normalize_whitespace(item['value']):
+                conflicts.setdefault(key, [current]).append(item)
+            if CONFIDENCE_RANK.get(str(item.get('confidence', '')).upper(), 0) > CONFIDENCE_RANK.get(str(current.get('confidence', '')).upper(), 0):
+                found[key] = item
+    
+    found_keys = {research_item_key(key) for key in found}
+    required, missing = {}, {}
+    for result in results:
+        for item in result.get('required_information') or []:
+            required.setdefault(research_item_key(item.get('item', '') if isinstance(item, dict) else item), item)
+        for item in result.get('missing_information') or []:
+            key = research_item_key(item.get('item', '') if isinstance(item, dict) else item)
+            if key not in found_keys:
+                missing.setdefault(key, item)
+    
+    # The scenario most chunks agreed on, ignoring chunks that could not tell
+    scenarios = Counter(
+        result.get('applicable_scenario') for result in results
+        if result.get('applicable_scenario') not in (None, '', 'Unknown')
+    )
+    summaries = [
+        f"[Deel {number}] {result['research_summary']}" for number, result in enumerate(results, 1)
+        if result.get('research_summary')
+    ]
+    if conflicts:
+        summaries.append("Tegenstrijdige waarden (hoogste confidence gekozen): " + ", ".join(sorted(conflicts)))
+    
+    return {
+        "applicable_scenario": scenarios.most_common(1)[0][0] if scenarios else "Unknown",
+        "required_information": list(required.values()),
+        "found_information": found,
+        "missing_information": list(missing.values()),
+        "research_summary": "\n".join(summaries),
+        "map_reduce": {
+            "chunks": len(results),
+            "conflicts": {
+                key: [{'value': item['value'], 'confidence': item.get('confidence'), 'source_chunk': item['source_chunk']} for item in items]
+                for key, items in conflicts.items()
+            }
+        }
+    }
+
+def research_map_reduce(prompt, clause_type, source_content, model):
+    """Run the research prompt over every chunk of a large corpus in parallel and merge the results"""
+    chunks = split_research_chunks(source_content)
+    workers = min(len(chunks), get_rate_limiter().max_concurrency)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                run_research_prompt,
+                build_research_prompt(
+                    prompt, clause_type, escape_prompt_text(source_content[start:end]),
+                    f"deel {number} van {len(chunks)}, tekens {start}-{end}"
+                ),
+                model
+            )
+            for number, (start, end) in enumerate(chunks, 1)
+        ]
+        results = [future.result() for future in futures]
+    logger.info("Map-reduce research for %s over %d chunks", clause_type, len(chunks))
+    return verify_research_quotes(merge_research_results(results), source_content)
+
+# ============= QUOTE VERIFICATION =============
+
+QUOTE_TOKEN_PATTERN = re.compile(r'[0-9a-zà-ÿ]+')
+
+class QuoteIndex:
+    """Word n-gram index over one corpus; verifies a quote in microseconds and returns its location"""
+    
+    def __init__(self, source_content):
+        self.tokens, self.starts, self.ends = [], [], []
+        for match in QUOTE_TOKEN_PATTERN.finditer(lowercase_preserving_offsets(source_content)):
+            self.tokens.append(match.group())
+            self.starts.append(match.start())
+            self.ends.append(match.end())
+        self.ngrams = {}
+        for position in range(len(self.tokens) - QUOTE_NGRAM + 1):
+            self.ngrams.setdefault(tuple(self.tokens[position:position + QUOTE_NGRAM]), []).append(position)
+        self.unigrams = {}
+        for position, token in enumerate(self.tokens):
+            self.unigrams.setdefault(token, []).append(position)
+        documents, _ = split_source_documents(source_content)
+        self.documents = documents
+        self.document_starts = [start for _, start, _ in documents]
+    
+    @staticmethod
+    def quote_tokens(quote):
+        # Research prompts escape the corpus, so quotes may contain literal \n and \"
+        quote = str(quote).replace('\\n', ' ').replace('\\r', ' ').replace('\\"', '"')
+        return QUOTE_TOKEN_PATTERN.findall(quote.lower())
+    
+    def document_at(self, offset):
+        """Name of the document containing a corpus offset; None for the intake block"""
+        index = bisect.bisect_right(self.document_starts, offset) - 1
+        if index < 0 or offset >= self.documents[index][2]:
+            return None
+        return self.documents[index][0]
+    
+    def location(self, status, coverage, first, last):
+        start, end = self.starts[first], self.ends[last]
+        return {'status': status, 'coverage': round(coverage, 2), 'start': start, 'end': end,
+                'document': self.document_at(start)}
+    
+    def verify(self, quote):
+        """Return {'status': 'exact'|'partial'|'unverified', 'coverage', and for matches 'start', 'end', 'document'}"""
+        tokens = self.quote_tokens(quote)
+        if not tokens:
+            return {'status': 'unverified', 'coverage': 0.0}
         
-        # Get values from research data
-        for key, data in research_data.get('found_information', {}).items():
-            if isinstance(data, dict) and 'value' in data:
-                placeholder_values[key] = data['value']
+        if len(tokens) < QUOTE_NGRAM:
+            for position in self.unigrams.get(tokens[0], []):
+                if self.tokens[position:position + len(tokens)] == tokens:
+                    return self.location('exact', 1.0, position, position + len(tokens) - 1)
+            return {'status': 'unverified', 'coverage': 0.0}
         
-        # Get values from complete_info
-        for key, data in complete_info.get('complete_information', {}).items():
-            if isinstance(data, dict) and 'value' in data:
-                placeholder_values[key] = data['value']
+        for position in self.ngrams.get(tuple(tokens[:QUOTE_NGRAM]), []):
+            if self.tokens[position:position + len(tokens)] == tokens:
+                return self.location('exact', 1.0, position, position + len(tokens) - 1)
         
-        # Get values from notarial_info (for standard fields)
-        if 'notarial_info' in st.session_state:
-            notarial = st.session_state.notarial_info
-            
-            # Map notarial fields to placeholder names
-            field_mapping = {
-                'repertorium_number': notarial.get('repertorium_nummer', ''),
-                'day_and_month': '',  # Will be calculated below
-                'NOTARY_NAME': notarial.get('notary_name', ''),
-                'NOTARY_LOCATION': notarial.get('notary_location', ''),
-                'NOTARY_OFFICE_ADDRESS': notarial.get('notary_office_address', ''),
-                'DOSSIER_NUMBER': notarial.get('dossier_nummer', notarial.get('repertorium_nummer', '')),
-            }
-            
-            # Calculate day_and_month from ondertekening_datum
-            if notarial.get('ondertekening_datum'):
-                try:
-                    date_str = notarial['ondertekening_datum']
-                    # Convert to Dutch format
-                    day = notarial.get('ondertekening_dag', '')
-                    month_nl = notarial.get('ondertekening_maand_nl', '')
-                    if day and month_nl:
-                        # Convert day number to Dutch words
-                        dutch_days = {
-                            1: "één", 2: "twee", 3: "drie", 4: "vier", 5: "vijf",
-                            6: "zes", 7: "zeven", 8: "acht", 9: "negen", 10: "tien",
-                            11: "elf", 12: "twaalf", 13: "dertien", 14: "veertien", 15: "vijftien",
-                            16: "zestien", 17: "zeventien", 18: "achttien", 19: "negentien", 20: "twintig",
-                            21: "eenentwintig", 22: "tweeëntwintig", 23: "drieëntwintig", 24: "vierentwintig",
-                            25: "vijfentwintig", 26: "zesentwintig", 27: "zevenentwintig", 28: "achtentwintig",
-                            29: "negenentwintig", 30: "dertig", 31: "eenendertig"
-                        }
-                        day_text = dutch_days.get(int(day), str(day))
-                        field_mapping['day_and_month'] = f"{day_text} {month_nl}"
-                except:
-                    pass
-            
-            # Add mapped values to placeholder_values
-            for placeholder, value in field_mapping.items():
-                if value and placeholder not in placeholder_values:
-                    placeholder_values[placeholder] = value
+        # Partial match: the corpus alignment that most quote n-grams agree on
+        alignments = Counter()
+        total = len(tokens) - QUOTE_NGRAM + 1
+        for offset in range(total):
+            for position in self.ngrams.get(tuple(tokens[offset:offset + QUOTE_NGRAM]), []):
+                alignments[position - offset] += 1
+        if alignments:
+            position, hits = alignments.most_common(1)[0]
+            coverage = hits / total
+            if coverage >= QUOTE_MIN_COVERAGE:
+                first = max(position, 0)
+                last = min(position + len(tokens), len(self.tokens)) - 1
+                return self.location('partial', coverage, first, last)
+            return {'status': 'unverified', 'coverage': round(coverage, 2)}
+        return {'status': 'unverified', 'coverage': 0.0}
+    
+    @staticmethod
+    def comparable_token(token):
+        # "01" and "1", "januari" and "1" compare equal, so dates match in either notation
+        if token in DUTCH_MONTHS:
+            return str(DUTCH_MONTHS[token])
+        return (token.lstrip('0') or '0') if token.isdigit() else token
+    
+    def value_in_range(self, value, start, end):
+        """Whether every number in an extracted value occurs within a matched corpus range
         
-        # Now use the model to process the template with the found information
-        template_prompt = f"""You are processing a notarial clause template. Your task is to:
+        Word values are often paraphrased and are not checked; numbers (amounts, dates, surfaces)
+        must be literal. Digit groups may be split differently ("250000" vs "250.000,00").
+        """
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            return True
+        first = bisect.bisect_left(self.starts, start)
+        last = bisect.bisect_right(self.starts, end - 1)
+        range_tokens = [self.comparable_token(token) for token in self.tokens[first:last]]
+        groups = set(range_tokens)
+        for begin in range(len(range_tokens)):
+            joined = self.tokens[first + begin]
+            for token in self.tokens[first + begin + 1:min(last, first + begin + 4)]:
+                if not (joined.isdigit() and token.isdigit()):
+                    break
+                joined += token
+                groups.add(self.comparable_token(joined))
+        return all(self.comparable_token(token) in groups for token in self.quote_tokens(value) if token.isdigit())
 
-1. Take the template with placeholders and conditional blocks
-2. Fill in the placeholders with the provided information
-3. Process conditional blocks based on the conditions
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_quote_index(corpus_hash, _source_content):
+    return QuoteIndex(_source_content)
 
-TEMPLATE TO PROCESS:
+def get_quote_index(source_content):
+    """Quote index of a corpus, built once per dossier (cached by corpus hash)"""
+    return build_quote_index(compute_content_hash(source_content), source_content)
+
+# ============= PAGE INDEX =============
+
+def get_page_map(document_id):
+    """Page map stored at ingestion for a source part (by its blob hash), or None for older parts"""
+    if document_id is None:
+        return None
+    blob_hash = get_blob_store().get_ref(f"pages-{document_id}")
+    return get_json_blob(blob_hash) if blob_hash else None
+
+class PageIndex:
+    """Sorted page ranges of a corpus; resolves a character offset to (document, page) by bisection
+    
+    Documents are linked to their page maps through the (start offset, blob hash) of the manifest
+    parts the corpus was assembled from; without parts no document has pages.
+    """
+    
+    def __init__(self, source_content, parts=()):
+        self.starts, self.entries = [], []
+        part_starts = [part_start for part_start, _ in parts]
+        documents, _ = split_source_documents(source_content)
+        for name, start, end in documents:
+            part_index = bisect.bisect_right(part_starts, start) - 1
+            document_id = parts[part_index][1] if part_index >= 0 else None
+            page_map = get_page_map(document_id)
+            ranges = page_map['pages'] if page_map else [[0, end - start, None]]
+            for range_start, range_end, page_number in ranges:
+                self.starts.append(start + range_start)
+                self.entries.append({
+                    'document': name, 'document_id': document_id, 'page': page_number,
+                    'start': start + range_start, 'end': start + range_end, 'document_end': end
+                })
+    
+    def resolve(self, offset):
+        """Page entry containing the offset (separators count for the preceding page); None outside documents"""
+        index = bisect.bisect_right(self.starts, offset) - 1
+        if index < 0 or offset >= self.entries[index]['document_end']:
+            return None
+        return self.entries[index]
+    
+    def label(self, offset):
+        entry = self.resolve(offset)
+        if entry is None:
+            return None
+        return f"{entry['document']}, p. {entry['page']}" if entry['page'] else entry['document']
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_page_index(corpus_hash, _source_content):
+    return PageIndex(_source_content, get_corpus_parts(corpus_hash))
+
+def get_page_index(source_content):
+    """Page index of a corpus, built once per dossier (cached by corpus hash)"""
+    return build_page_index(compute_content_hash(source_content), source_content)
+
+def format_passage_header(passage, page_index):
+    """Header of a retrieved passage with its document and page"""
+    label = page_index.label(passage['start'])
+    return f"[Passage {label + ', ' if label else ''}tekens {passage['start']}-{passage['end']}]"
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def reextract_page(document_id, page_number):
+    """Extract one page again from the original file stored at ingestion; None when it is not available"""
+    page_map = get_page_map(document_id)
+    if not page_map or not page_map.get('source') or not 1 <= page_number <= page_map['page_count']:
+        return None
+    path = get_blob_store().path(page_map['source'])
+    if page_map['kind'] == 'pdf':
+        # A reader on an open file only parses the objects of the requested page
+        try:
+            with open(path, 'rb') as file:
+                return lazy_import('PyPDF2').PdfReader(file).pages[page_number - 1].extract_text() or ""
+        except Exception as e:
+            logger.error("Error re-extracting page %d of %s: %s", page_number, page_map['document'], e)
+            return None
+    # Page maps stored before the byte offsets were kept are scanned without reading the file into memory
+    offsets = page_map.get('page_offsets') or find_text_page_offsets(path)
+    with open(path, 'rb') as file:
+        file.seek(offsets[page_number - 1])
+        if page_number < len(offsets):
+            return file.read(offsets[page_number] - 1 - offsets[page_number - 1]).decode('utf-8')
+        return file.read().decode('utf-8')
+
+def verify_research_quotes(research_data, source_content):
+    """Check the source_quote of every found item against the corpus before compilation
+    
+    Only an exact quote that contains the numbers of the item's value counts as verified. Items
+    with a missing or partially matching quote, or whose value is not in the quote, are downgraded
+    to LOW confidence and marked, so they are not used as facts without confirmation.
+    """
+    found_information = research_data.get('found_information')
+    if not found_information or not source_content:
+        return research_data
+    index = get_quote_index(source_content)
+    page_index = get_page_index(source_content)
+    unverified = []
+    for key, item in found_information.items():
+        if not isinstance(item, dict):
+            continue
+        verification = index.verify(item['source_quote']) if item.get('source_quote') else {'status': 'missing'}
+        if 'start' in verification:
+            page = page_index.resolve(verification['start'])
+            verification['page'] = page['page'] if page else None
+            verification['value_found'] = index.value_in_range(item.get('value'), verification['start'], verification['end'])
+        item['quote_verification'] = verification
+        if verification['status'] != 'exact' or not verification.get('value_found'):
+            item['original_confidence'] = item.get('confidence')
+            item['confidence'] = 'LOW'
+            unverified.append(key)
+    if unverified:
+        logger.info("Unverified research quotes downgraded: %s", ", ".join(unverified))
+        research_data['unverified_quotes'] = unverified
+    return research_data
+
+def split_found_information(research_data):
+    """(confirmed, unconfirmed) research findings; LOW confidence items are not facts until the user confirms them"""
+    confirmed, unconfirmed = {}, {}
+    for key, item in research_data.get('found_information', {}).items():
+        if not isinstance(item, dict):
+            continue
+        target = unconfirmed if str(item.get('confidence', '')).upper() == 'LOW' else confirmed
+        target[key] = item
+    return confirmed, unconfirmed
+
+def format_unconfirmed_information(unconfirmed):
+    """Prompt line for research values that must be confirmed by the user before they are used"""
+    if not unconfirmed:
+        return ""
+    values = {key: item.get('value') for key, item in unconfirmed.items()}
+    return ("- Unconfirmed Information (LOW confidence or quote not found in the documents; treat as MISSING and "
+            f"ask the user to confirm, offering the value as an option): {json.dumps(values, ensure_ascii=False)}\n")
+
+# ============= DOCUMENT DIGEST =============
+
+DIGEST_PROMPT = """Maak een beknopte, feitelijke digest van het volgende document uit een notarieel dossier.
+Deze digest vervangt de volledige tekst voor de andere agents, dus neem alle feiten op die voor een verkoopakte
+relevant kunnen zijn (partijen, goed, kadaster, prijs, keuringen, attesten, vergunningen, lasten, datums).
+
+Antwoord UITSLUITEND in JSON:
+{{
+    "samenvatting": "2-3 zinnen over wat dit document is en zegt",
+    "feiten": [{{"feit": "kort feit", "citaat": "letterlijke korte quote uit het document"}}],
+    "datums": [{{"waarde": "DD-MM-JJJJ", "betekenis": "waarvoor deze datum staat", "citaat": "letterlijke quote"}}],
+    "bedragen": [{{"waarde": "bedrag", "betekenis": "waarvoor dit bedrag staat", "citaat": "letterlijke quote"}}],
+    "partijen": [{{"naam": "naam", "rol": "rol in het document", "citaat": "letterlijke quote"}}]
+}}
+Maximaal 15 feiten. Citaten moeten letterlijk in het document voorkomen.
+
+Document: {name}{part_label}
+{text}"""
+
+DIGEST_LIST_KEYS = ('feiten', 'datums', 'bedragen', 'partijen')
+
+def locate_quote(text, quote):
+    """(start, end) of a quote in the text, tolerant to whitespace differences, or None"""
+    quote = str(quote or '').strip()
+    if not quote:
+        return None
+    start = text.find(quote)
+    if start != -1:
+        return start, start + len(quote)
+    words = quote.split()[:12]
+    match = re.search(r'\s+'.join(re.escape(word) for word in words), text)
+    return (match.start(), match.end()) if match else None
+
+def digest_document_text(name, text, model):
+    """Digest one document with one LLM call per DIGEST_DOCUMENT_CHARS chunk; None when the model fails"""
+    chunks = split_research_chunks(text, DIGEST_DOCUMENT_CHARS, 0)
+    digest = {'document': name, 'samenvatting': [], **{key: [] for key in DIGEST_LIST_KEYS}}
+    for number, (start, end) in enumerate(chunks, 1):
+        part_label = f" (deel {number} van {len(chunks)})" if len(chunks) > 1 else ""
+        try:
+            response = model.generate_content(DIGEST_PROMPT.format(name=name, part_label=part_label, text=text[start:end]))
+            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
+            result = json.loads(json_match.group()) if json_match else {}
+        except Exception as e:
+            logger.warning("Digest of %s failed: %s", name, e)
+            return None
+        if 'samenvatting' not in result:
+            return None
+        digest['samenvatting'].append(str(result['samenvatting']))
+        for key in DIGEST_LIST_KEYS:
+            for item in result.get(key) or []:
+                if not isinstance(item, dict):
+                    continue
+                location = locate_quote(text[start:end], item.get('citaat'))
+                if location:
+                    item = dict(item, start=start + location[0], end=start + location[1])
+                digest[key].append(item)
+    digest['samenvatting'] = " ".join(digest['samenvatting'])
+    return digest
+
+@st.cache_resource(show_spinner=False)
+def get_digest_registry():
+    """Per-document digest locks and recent failures, one process-wide instance that is never evicted
+    
+    A plain module-level dict would be reset on every Streamlit rerun, which re-executes this module.
+    """
+    return {'lock': threading.Lock(), 'locks': {}, 'failures': {}}
+
+def get_document_digest(name, text, model, build=True):
+    """Digest of one document, computed once and cached in the blob store by the document text hash
+    
+    With build=False only the cached digest is returned (None when there is none). A failed digest is
+    remembered for DIGEST_FAILURE_TTL seconds, so a retry does not repeat every chunk call.
+    """
+    document_hash = compute_content_hash(text)
+    # Digests of the offline stub must never be served to real runs
+    backend = type(getattr(model, 'model', model)).__name__
+    ref = f"digest-v{DIGEST_VERSION}-{backend}-{document_hash}"
+    if not build:
+        blob_hash = get_blob_store().get_ref(ref)
+        return get_json_blob(blob_hash) if blob_hash else None
+    registry = get_digest_registry()
+    with registry['lock']:
+        lock = registry['locks'].setdefault(ref, threading.Lock())
+    with lock:
+        blob_hash = get_blob_store().get_ref(ref)
+        if blob_hash:
+            return get_json_blob(blob_hash)
+        failed_at = registry['failures'].get(ref)
+        if failed_at is not None and time.time() - failed_at < DIGEST_FAILURE_TTL:
+            return None
+        digest = digest_document_text(name, text, model)
+        if digest is None:
+            registry['failures'][ref] = time.time()
+            return None
+        registry['failures'].pop(ref, None)
+        get_blob_store().set_ref(ref, put_json_blob(digest))
+        return digest
+
+def split_source_documents(source_content):
+    """(name, start, end) of every document body in the combined source content, plus the text of the intake blocks"""
+    headers = list(DOCUMENT_HEADER_PATTERN.finditer(source_content))
+    documents, intake = [], []
+    for index, header in enumerate(headers):
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(source_content)
+        # The intake block is appended after the last document
+        intake_start = source_content.find("\n\n--- NOTARIËLE INFORMATIE ---\n", header.end(), end)
+        if intake_start != -1:
+            intake.append(source_content[intake_start:end])
+            end = intake_start
+        documents.append((header.group(1), header.end(), end))
+    if not headers:
+        intake.append(source_content)
+    return documents, "".join(intake)
+
+def get_dossier_digest(source_content, model):
+    """Cached digests of the documents with offsets into this source content; never calls the model"""
+    documents, _ = split_source_documents(source_content)
+    digests = []
+    for name, start, end in documents:
+        digest = get_document_digest(name, source_content[start:end], model, build=False)
+        if digest is not None:
+            digests.append({'offset': start, 'end': end, 'digest': digest})
+    return digests
+
+def prepare_dossier_digest(source_content, model):
+    """Digest every document of a dossier once, before any agent runs; returns the number of digested documents
+    
+    This is the only place digests are built. Agents read them through build_document_context and fall
+    back to the raw text for a document that has no digest.
+    """
+    if not USE_DOCUMENT_DIGEST:
+        return 0
+    documents, _ = split_source_documents(source_content)
+    if hasattr(model, 'for_agent'):
+        model = model.for_agent('digest')
+    workers = max(1, min(len(documents), get_rate_limiter().max_concurrency))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(get_document_digest, name, source_content[start:end], model)
+            for name, start, end in documents
+        ]
+        return sum(1 for future in futures if future.result() is not None)
+
+def format_digest_text(digests):
+    """Compact text of the dossier digest, with corpus offsets for every located quote"""
+    lines = []
+    for entry in digests:
+        digest, offset = entry['digest'], entry['offset']
+        lines.append(f"[Document: {digest['document']}, tekens {offset}-{entry['end']}]")
+        lines.append(f"Samenvatting: {digest['samenvatting']}")
+        for key, label, field in (('feiten', 'Feit', 'feit'), ('datums', 'Datum', 'waarde'),
+                                  ('bedragen', 'Bedrag', 'waarde'), ('partijen', 'Partij', 'naam')):
+            for item in digest[key]:
+                detail = item.get('betekenis') or item.get('rol')
+                location = f" (tekens {offset + item['start']}-{offset + item['end']})" if 'start' in item else ""
+                lines.append(f"- {label}: {item.get(field, '')}{f' — {detail}' if detail else ''}{location}")
+        lines.append("")
+    return "\n".join(lines)
+
+def build_document_context(source_content, queries, model, max_excerpt_chars=None):
+    """Digest of every document plus the excerpts retrieved for the queries, in place of a raw corpus slice
+    
+    Only reads the digests built by prepare_dossier_digest. Returns None when the digest is disabled
+    or missing for a document, so callers fall back to the raw text.
+    """
+    if not USE_DOCUMENT_DIGEST or model is None:
+        return None
+    digests = get_dossier_digest(source_content, model)
+    documents, intake_text = split_source_documents(source_content)
+    if not digests or len(digests) < len(documents):
+        return None
+    excerpts = retrieve_passages(source_content, queries, max_chars=max_excerpt_chars or DIGEST_EXCERPT_CHARS)
+    page_index = get_page_index(source_content)
+    excerpts_text = "\n\n".join(f"{format_passage_header(p, page_index)}\n{p['text']}" for p in excerpts)
+    return f"""[Dossieroverzicht per document]
+{format_digest_text(digests)}
+[Relevante passages]
+{excerpts_text}
+{intake_text}"""
+
+def format_klantinfo_text(notarial_info, encoding=None):
+    """Format notarial information as the "Klantinformatie" block used by the applicability agent"""
+    return get_notarial_model(notarial_info).serialize('klantinfo', encoding)
+
+def format_evidence_text(evidence):
+    """Format the passages found by the local evidence scanner for a prompt"""
+    evidence_text = ""
+    if evidence and evidence.get('passages'):
+        evidence_text = "\n[Bewijsfragmenten]\nDe volgende passages uit het VOLLEDIGE dossier bevatten mogelijk bewijs voor deze clausule:\n"
+        for passage in evidence['passages']:
+            evidence_text += f"- (trefwoorden: {', '.join(passage['terms'])}) \"{passage['text']}\"\n"
+    return evidence_text
+
+def build_applicability_prompt(prompt, source_content, notarial_info, evidence=None, documents_text=None):
+    """Build the per-clause applicability prompt; documents_text replaces the raw corpus slice when given"""
+    klantinfo_text = format_klantinfo_text(notarial_info)
+    
+    # Passages found by the local evidence scanner anywhere in the dossier
+    evidence_text = format_evidence_text(evidence)
+    
+    return f"""Je bent een gespecialiseerde AI-assistent voor notarieel werk in België. Jouw taak is om een voorgelegde clausule te analyseren en te bepalen of deze volledig verwijderd moet worden. Je redeneert als een ervaren medewerker: feitelijk onjuiste clausules worden verwijderd, maar relevante juridische opties voor de cliënten worden behouden in de ontwerpakte.
+
+{CLAUSE_KNOWLEDGE_BASE}
+
+{klantinfo_text}
+
+[Documenten]
+{documents_text or source_content[:5000] + '... [beperkt voor context]'}
+{evidence_text}
+[Clausule om te beoordelen]
 {prompt}
 
-AVAILABLE INFORMATION:
-{json.dumps(placeholder_values, ensure_ascii=False, indent=2)}
+OUTPUT FORMAAT
 
-ADDITIONAL CONTEXT:
-- Videoconferentie: {'Ja' if st.session_state.notarial_info.get('videoconferentie', False) else 'Nee'}
-- Research Summary: {research_data.get('research_summary', '')}
+ANALYSE:
 
-CRITICAL INSTRUCTIONS:
-1. Replace ALL {{{{placeholder}}}} with the corresponding values from the available information
-2. For [BLOCK] sections:
-   - [NOTARY_HEADER] ... [/NOTARY_HEADER]: ALWAYS include this block with filled values
-   - [IF_REMOTE_NOTARY] ... [/IF_REMOTE_NOTARY]: Include ONLY if videoconferentie is 'Ja', otherwise remove entirely
-3. If a placeholder value is not found, leave it as {{{{placeholder}}}} for manual filling
-4. Do NOT add any extra text or explanations
-5. Preserve all original formatting and line breaks
-6. Remove the [BLOCK] tags but keep the content when including a block
-7. When removing a conditional block, remove it entirely including tags
+CLAUSULE: [Naam van de clausule]
+CATEGORIE: [Categorie 1a: Feitelijk / 1b: Optioneel / 2: Essentieel]
+TOEGEPASTE LOGICA: [Beschrijf de redeneerstap]
+RESULTAAT TOETSING: [Bv. "Geen bewijs gevonden." OF "Geen juridische onmogelijkheid gevonden."]
 
-OUTPUT: The processed template with all placeholders filled and conditional blocks processed."""
+FINALE BESLISSING: JA (mag volledig verwijderd worden) / NEE (moet behouden blijven)
 
-        response = model.generate_content(template_prompt)
+REDENERING:
+[Synthese die leidt tot de finale beslissing]
+
+BEWIJS:
+[Citeer het bewijs]
+
+IMPACT VAN DE BESLISSING:
+[Leg uit waarom de beslissing de ontwerpakte verbetert]"""
+
+def check_clause_applicability(prompt, clause_type, skip_conditions, source_content, notarial_info, model, evidence=None):
+    """Applicability Agent that checks if a clause should be skipped"""
+    documents_text = build_document_context(source_content, [prompt, clause_type], model)
+    check_prompt = build_applicability_prompt(prompt, source_content, notarial_info, evidence, documents_text)
+
+    try:
+        response = model.generate_content(check_prompt)
+        result_text = response.text
         
-        # Clean up the response
-        cleaned_text = response.text.strip()
+        # Extract decision
+        decision_match = re.search(r'\*\*FINALE BESLISSING:\*\*\s*JA', result_text, re.IGNORECASE)
+        if not decision_match:
+            decision_match = re.search(r'FINALE BESLISSING:\s*JA', result_text, re.IGNORECASE)
         
-        # Additional cleanup to ensure no block markers remain when they should be removed
-        if not st.session_state.notarial_info.get('videoconferentie', False):
-            # Remove any remaining IF_REMOTE_NOTARY blocks
+        may_skip = decision_match is not None
+        
+        return may_skip, result_text
+            
+    except Exception as e:
+        return False, f"Error tijdens analyse: {str(e)}"
+
+def check_clauses_applicability_batch(clauses, source_content, notarial_info, model, evidence_map=None, chunk_size=None):
+    """Applicability Agent that evaluates many clauses in one structured call per chunk
+    
+    `clauses` is a list of dicts with 'row_number', 'clause_type' and 'prompt'.
+    Returns a dict keyed by row number with 'may_skip', 'analysis' and 'reasoning'. Clauses without
+    a decision (missing from the response or a failed call) are left out, so the per-clause agent runs.
+    """
+    chunk_size = chunk_size or BATCH_APPLICABILITY_CHUNK_SIZE
+    klantinfo_text = format_klantinfo_text(notarial_info)
+    decisions = {}
+    
+    for chunk_start in range(0, len(clauses), chunk_size):
+        chunk = clauses[chunk_start:chunk_start + chunk_size]
+        
+        clauses_text = ""
+        for clause in chunk:
+            clauses_text += f"\n[Clausule {clause['row_number']}: {clause['clause_type']}]\n{clause['prompt']}\n"
+            if evidence_map and clause.get('clause_number', clause['row_number']) in evidence_map:
+                clauses_text += format_evidence_text(evidence_map[clause.get('clause_number', clause['row_number'])])
+        
+        documents_text = build_document_context(source_content, [clause['prompt'] for clause in chunk], model)
+        
+        batch_prompt = f"""Je bent een gespecialiseerde AI-assistent voor notarieel werk in België. Jouw taak is om ELK van de voorgelegde clausules te analyseren en per clausule te bepalen of deze volledig verwijderd moet worden. Je redeneert als een ervaren medewerker: feitelijk onjuiste clausules worden verwijderd, maar relevante juridische opties voor de cliënten worden behouden in de ontwerpakte.
+
+{CLAUSE_KNOWLEDGE_BASE}
+
+{klantinfo_text}
+
+[Documenten]
+{documents_text or source_content[:5000] + '... [beperkt voor context]'}
+
+[Clausules om te beoordelen]
+{clauses_text}
+
+OUTPUT FORMAAT
+Antwoord UITSLUITEND in JSON, met exact één beslissing per clausule:
+{{
+    "decisions": [
+        {{
+            "clause_number": nummer van de clausule,
+            "clausule": "naam van de clausule",
+            "categorie": "1a/1b/2",
+            "toegepaste_logica": "beschrijf de redeneerstap",
+            "finale_beslissing": "JA (mag volledig verwijderd worden) / NEE (moet behouden blijven)",
+            "redenering": "synthese die leidt tot de finale beslissing",
+            "bewijs": "citeer het bewijs"
+        }}
+    ]
+}}"""
+        
+        try:
+            response = model.generate_content(batch_prompt)
+            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
+            parsed = json.loads(json_match.group()) if json_match else {}
+        except Exception as e:
+            parsed = {"error": str(e)}
+        
+        returned = {}
+        for decision in parsed.get('decisions', []):
+            try:
+                returned[int(decision.get('clause_number'))] = decision
+            except (TypeError, ValueError):
+                continue
+        
+        for clause in chunk:
+            decision = returned.get(clause['row_number'])
+            if not decision:
+                # No decision is recorded, so the per-clause agent decides this clause later
+                logger.warning("No batch applicability decision for clause %s (%s)",
+                               clause['row_number'], parsed.get('error', 'missing from response'))
+                continue
+            
+            beslissing = str(decision.get('finale_beslissing', '')).strip()
+            may_skip = beslissing.upper().startswith('JA')
+            # Render in the same layout as the per-clause agent so the UI can parse it
+            analysis = f"""ANALYSE:
+
+CLAUSULE: {decision.get('clausule', clause['clause_type'])}
+CATEGORIE: {decision.get('categorie', '')}
+TOEGEPASTE LOGICA: {decision.get('toegepaste_logica', '')}
+
+FINALE BESLISSING: {'JA' if may_skip else 'NEE'}
+
+REDENERING:
+{decision.get('redenering', '')}
+
+BEWIJS:
+{decision.get('bewijs', '')}"""
+            decisions[clause['row_number']] = {
+                'may_skip': may_skip,
+                'analysis': analysis,
+                'reasoning': decision.get('redenering', '')
+            }
+    
+    return decisions
+
+def review_agent_check(prompt, research_data, clause_type, model):
+    """Review agent that analyzes what's missing based on research"""
+    confirmed, unconfirmed = split_found_information(research_data)
+    review_prompt = f"""You are a legal review agent. Based on the research findings, determine what additional information is TRULY needed.
+
+IMPORTANT: The research agent has already found information. Only mark something as missing if it was NOT found or had a None/null value.
+
+CLAUSE TYPE: {clause_type}
+
+ORIGINAL PROMPT:
+{prompt}
+
+RESEARCH AGENT FINDINGS:
+- Research Summary: {research_data.get('research_summary', 'N/A')}
+- Found Information: {json.dumps(confirmed, ensure_ascii=False)}
+{format_unconfirmed_information(unconfirmed)}- Missing Information: {json.dumps(research_data.get('missing_information', []), ensure_ascii=False)}
+
+CRITICAL INSTRUCTIONS:
+1. If research found "repertorium_number: 224455", then repertorium IS NOT MISSING
+2. If research found something with value "None" or "null", then it IS missing
+3. Check exact values - don't just look at the missing list
+4. Only list items that are truly needed and not already found
+
+Respond in JSON format (ALL IN DUTCH):
+{{
+    "analysis": "korte analyse van wat nodig is",
+    "applicable_scenario": "welk scenario van toepassing is",
+    "already_found": ["items that research already found with valid values"],
+    "critical_missing": ["ONLY items that are truly missing - had None/null values or weren't found"],
+    "questions_for_user": [
+        {{
+            "missing_info": "wat ontbreekt",
+            "question": "de vraag aan gebruiker",
+            "options": ["optie 1", "optie 2", "optie 3", "optie 4", "Anders"],
+            "importance": "CRITICAL/HIGH/MEDIUM"
+        }}
+    ],
+    "can_proceed_without": ["lijst van info die wenselijk maar niet kritiek is"],
+    "not_applicable_info": ["lijst van informatie die NIET nodig is"]
+}}"""
+    
+    try:
+        response = model.generate_content(review_prompt)
+        result_text = response.text
+        
+        # Parse JSON
+        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group())
+        else:
+            return {
+                "analysis": "Review parsing failed",
+                "applicable_scenario": "Unknown",
+                "already_found": [],
+                "critical_missing": [],
+                "questions_for_user": [],
+                "can_proceed_without": [],
+                "not_applicable_info": []
+            }
+    except Exception as e:
+        return {
+            "analysis": f"Review error: {str(e)}",
+            "applicable_scenario": "Unknown",
+            "already_found": [],
+            "critical_missing": [],
+            "questions_for_user": [],
+            "can_proceed_without": [],
+            "not_applicable_info": []
+        }
+
+def format_notarial_info_for_search(notarial_info, encoding=None):
+    """Format all notarial info fields as searchable key/value text for the search agents"""
+    return get_notarial_model(notarial_info).serialize('search', encoding)
+
+def focused_search_for_missing_info(missing_info, source_content, notarial_info, model):
+    """Perform a focused search for specific missing information"""
+    
+    # Format notarial info as searchable text
+    notarial_text = format_notarial_info_for_search(notarial_info)
+    documents_text = build_document_context(source_content, [missing_info], model, max_excerpt_chars=15000)
+    
+    search_prompt = f"""You are a specialized legal document search agent. Your task is to find VERY SPECIFIC information.
+
+MISSING INFORMATION TO FIND:
+{missing_info}
+
+SEARCH IN TWO PLACES:
+1. First check the NOTARIAL INFORMATION (already collected data)
+2. Then check the SOURCE DOCUMENTS
+
+--- NOTARIAL INFORMATION TO SEARCH ---
+{notarial_text}
+
+--- SOURCE DOCUMENTS TO SEARCH ---
+{documents_text or source_content[:45000]}
+
+CRITICAL CONTEXT FOR NOTARIAL TERMS:
+- "day_and_month" or "dag en maand" = the day and month from the ondertekening_datum (signing date)
+- "aktedag" = the date of signing the deed = ondertekening_datum
+- If looking for day/month and you find ondertekening_datum like "30-10-1990", extract day=30, month=oktober
+- Dutch months: januari, februari, maart, april, mei, juni, juli, augustus, september, oktober, november, december
+- "repertorium_nummer" = repertory number for the deed
+- "Rijksregisternummer" = Belgian national register number (format: YY.MM.DD-XXX.XX)
+
+For electrical installations:
+- "Nieuwe installatie" = had complete inspection BEFORE use
+- "Oude installatie" = did NOT have inspection before use
+- Look for dates in formats: "1 april 2015", "01/04/2015"
+- Inspection organizations: BTV, Vinçotte, AIB, ACEG, etc.
+
+INSTRUCTIONS:
+1. FIRST check if this information already exists in the notarial information section
+2. If not found there, search the source documents
+3. Look for variations in spelling, formatting, and phrasing
+4. Consider that the same information might be stored under different keys
+
+Return JSON format:
+{{
+    "search_performed": true,
+    "found_in": "notarial_info/source_docs/not_found",
+    "found_items": {{
+        "{missing_info}": {{
+            "found": true/false,
+            "value": "exact value found or null",
+            "location": "where it was found (notarial info field or document section)",
+            "context": "surrounding text or field name where found",
+            "confidence": "HIGH/MEDIUM/LOW"
+        }}
+    }},
+    "search_notes": "explanation of search process and any important observations"
+}}"""
+
+    try:
+        response = model.generate_content(search_prompt)
+        result_text = response.text
+        
+        # Parse JSON
+        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group())
+        else:
+            return None
+    except Exception as e:
+        return None
+
+def search_missing_items_parallel(missing_items, source_content, notarial_info, identifiers, model, max_workers=None):
+    """Search all missing items of a clause concurrently: local extractors first, LLM searches fanned out"""
+    results = {}
+    llm_items = []
+    for missing_info in missing_items:
+        local_result = local_search_for_missing_info(missing_info, identifiers, source_content, notarial_info)
+        if local_result:
+            results[missing_info] = local_result
+        else:
+            llm_items.append(missing_info)
+    
+    if llm_items:
+        # The pool is bounded by the shared rate limiter, extra threads would only wait
+        workers = min(len(llm_items), max_workers or get_rate_limiter().max_concurrency)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                missing_info: executor.submit(focused_search_for_missing_info, missing_info, source_content, notarial_info, model)
+                for missing_info in llm_items
+            }
+            for missing_info, future in futures.items():
+                try:
+                    results[missing_info] = future.result()
+                except Exception:
+                    results[missing_info] = None
+    
+    return results
+
+def get_found_item(search_result):
+    """Return the first found item of a focused search result, or None"""
+    if search_result and search_result.get('found_items'):
+        for item_data in search_result['found_items'].values():
+            if isinstance(item_data, dict) and item_data.get('found') and item_data.get('value'):
+                return item_data
+    return None
+
+def review_and_search_agent(prompt, research_data, clause_type, source_content, notarial_info, model):
+    """Fused agent that reviews the research output and resolves all missing items in one call"""
+    confirmed, unconfirmed = split_found_information(research_data)
+    # Retrieve the passages relevant to everything the research agent could not find or could not confirm
+    queries = list(unconfirmed)
+    for item in research_data.get('missing_information', []):
+        if isinstance(item, dict):
+            queries.append(item.get('item', ''))
+            queries.extend(item.get('searched_terms', []))
+        else:
+            queries.append(str(item))
+    for item in research_data.get('required_information', []):
+        if isinstance(item, dict):
+            queries.append(item.get('item', ''))
+    passages = retrieve_passages(source_content, queries)
+    page_index = get_page_index(source_content)
+    passages_text = "\n\n".join(
+        f"{format_passage_header(p, page_index)}\n{p['text']}" for p in passages
+    )
+    
+    fused_prompt = f"""You are a legal review and search agent. In ONE pass you must:
+1. Review the research findings and determine what information is TRULY still needed
+2. Resolve every missing item yourself by searching the NOTARIAL INFORMATION and the RELEVANT PASSAGES below
+3. Only ask the user about items that cannot be answered from these sources
+
+IMPORTANT: The research agent has already found information. Only treat something as missing if it was NOT found or had a None/null value.
+
+CLAUSE TYPE: {clause_type}
+
+ORIGINAL PROMPT:
+{prompt}
+
+RESEARCH AGENT FINDINGS:
+- Research Summary: {research_data.get('research_summary', 'N/A')}
+- Found Information: {json.dumps(confirmed, ensure_ascii=False)}
+{format_unconfirmed_information(unconfirmed)}- Missing Information: {json.dumps(research_data.get('missing_information', []), ensure_ascii=False)}
+
+--- NOTARIAL INFORMATION TO SEARCH ---
+{format_notarial_info_for_search(notarial_info)}
+
+--- RELEVANT PASSAGES FROM THE SOURCE DOCUMENTS ---
+{passages_text}
+
+CRITICAL CONTEXT FOR NOTARIAL TERMS:
+- "day_and_month" or "dag en maand" = the day and month from the ondertekening_datum (signing date)
+- "aktedag" = the date of signing the deed = ondertekening_datum
+- "Rijksregisternummer" = Belgian national register number (format: YY.MM.DD-XXX.XX)
+- "Nieuwe installatie" = had complete inspection BEFORE use, "Oude installatie" = did NOT
+
+Respond in JSON format (ALL IN DUTCH):
+{{
+    "analysis": "korte analyse van wat nodig is",
+    "applicable_scenario": "welk scenario van toepassing is",
+    "already_found": ["items die het onderzoek al vond met geldige waarden"],
+    "resolved_items": {{
+        "ontbrekende informatie": {{
+            "found": true,
+            "value": "gevonden waarde",
+            "location": "notarial info veld of passage",
+            "context": "omliggende tekst",
+            "confidence": "HIGH/MEDIUM/LOW"
+        }}
+    }},
+    "critical_missing": ["ENKEL items die na het zoeken echt onbeantwoord blijven"],
+    "questions_for_user": [
+        {{
+            "missing_info": "wat ontbreekt",
+            "question": "de vraag aan gebruiker",
+            "options": ["optie 1", "optie 2", "optie 3", "optie 4", "Anders"],
+            "importance": "CRITICAL/HIGH/MEDIUM"
+        }}
+    ],
+    "can_proceed_without": ["lijst van info die wenselijk maar niet kritiek is"],
+    "not_applicable_info": ["lijst van informatie die NIET nodig is"]
+}}"""
+    
+    try:
+        response = model.generate_content(fused_prompt)
+        result_text = response.text
+        
+        # Parse JSON
+        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
+        if json_match:
+            result = json.loads(json_match.group())
+            result.setdefault('resolved_items', {})
+            return result
+        else:
+            return {
+                "analysis": "Review parsing failed",
+                "applicable_scenario": "Unknown",
+                "already_found": [],
+                "resolved_items": {},
+                "critical_missing": [],
+                "questions_for_user": [],
+                "can_proceed_without": [],
+                "not_applicable_info": []
+            }
+    except Exception as e:
+        return {
+            "analysis": f"Review error: {str(e)}",
+            "applicable_scenario": "Unknown",
+            "already_found": [],
+            "resolved_items": {},
+            "critical_missing": [],
+            "questions_for_user": [],
+            "can_proceed_without": [],
+            "not_applicable_info": []
+        }
+
+def store_user_answer(notarial_info, clause_type, missing_info, question, answer, source, **extra):
+    """Store an answer for a clause in notarial_info['user_answers']"""
+    if 'user_answers' not in notarial_info:
+        notarial_info['user_answers'] = {}
+    
+    answer_key = f"{clause_type}_{missing_info}"
+    notarial_info['user_answers'][answer_key] = {
+        "question": question,
+        "answer": answer,
+        "missing_info": missing_info,
+        "clause_type": clause_type,
+        "source": source,
+        "canonical_key": canonicalize_question(f"{missing_info} {question}"),
+        **extra
+    }
+    return answer_key
+
+def matches_fragments(normalized, alternatives):
+    return any(all(fragment in normalized for fragment in fragments) for fragments in alternatives)
+
+def canonicalize_question(text):
+    """Map a question or missing_info text to the canonical key of one fact, or None when it is not a known fact"""
+    normalized = normalize_info_key(text).replace('_', ' ')
+    for key, alternatives in CANONICAL_QUESTION_KEYS.items():
+        if matches_fragments(normalized, alternatives):
+            if key in PARTY_SPECIFIC_QUESTION_KEYS:
+                # Without an explicit party ("de koper", "de kopers") the answer must not be reused
+                party = parse_party_reference(normalized)
+                return f"{key}:{party[0]}_{party[1]}" if party else None
+            return key
+    if PRESENCE_QUESTION_PATTERN.search(normalized):
+        for topic, alternatives in PRESENCE_QUESTION_TOPICS.items():
+            if matches_fragments(normalized, alternatives):
+                return f"{topic}_aanwezig"
+    return None
+
+PARTY_ORDINALS = {
+    'eerste': 1, 'tweede': 2, 'derde': 3, 'vierde': 4, 'vijfde': 5,
+    'zesde': 6, 'zevende': 7, 'achtste': 8, 'negende': 9, 'tiende': 10
+}
+PARTY_REFERENCE_PATTERN = re.compile(
+    r'\b(?:(' + '|'.join(PARTY_ORDINALS) + r')\s+)?(verkoper|koper)(s?)\b(?:\s*(?:nr|nummer)?\s*(\d+)\b)?'
+)
+
+def parse_party_reference(text):
+    """(role, volgnummer) of the party a text refers to ("tweede koper", "koper 2"), or None without an explicit index"""
+    for match in PARTY_REFERENCE_PATTERN.finditer(text.lower()):
+        ordinal, role, plural, number = match.groups()
+        if number and not plural:
+            return role, int(number)
+        if ordinal:
+            return role, PARTY_ORDINALS[ordinal]
+    return None
+
+def question_tokens(text):
+    """Content tokens of a question, used for lexical similarity"""
+    return {token for token in normalize_info_key(text).split('_')
+            if len(token) >= 3 and token not in RETRIEVAL_STOPWORDS}
+
+def build_answer_index(user_answers):
+    """Index stored answers by normalized text, canonical key and tokens, each with the party they are about"""
+    index = {'exact': {}, 'canonical': {}, 'entries': []}
+    for entry in user_answers.values():
+        if not isinstance(entry, dict) or not str(entry.get('answer', '')).strip():
+            continue
+        text = f"{entry.get('missing_info', '')} {entry.get('question', '')}"
+        party = parse_party_reference(text)
+        for key in {normalize_info_key(entry.get('missing_info', '')), normalize_info_key(entry.get('question', ''))}:
+            if key:
+                index['exact'].setdefault(key, []).append((party, entry))
+        canonical_key = canonicalize_question(text)
+        if canonical_key:
+            index['canonical'].setdefault(canonical_key, []).append((party, entry))
+        index['entries'].append((
+            question_tokens(entry.get('missing_info', '')), normalize_info_key(entry.get('missing_info', '')),
+            canonical_key, party, entry
+        ))
+    return index
+
+def find_existing_answer(missing_info, question, user_answers, index=None, min_jaccard=0.75, min_ratio=0.88):
+    """Return (answer entry, match type) for a previously answered equivalent question, or (None, None)
+    
+    Matching goes from exact normalized text, over canonical topic keys, to lexical similarity
+    of the missing_info text. Answers about another party ("verkoper 1" vs "verkoper 2") never match.
+    """
+    index = index or build_answer_index(user_answers)
+    party = parse_party_reference(f"{missing_info} {question}")
+    
+    def same_party(candidates):
+        return next((entry for entry_party, entry in candidates if entry_party == party), None)
+    
+    for text in (missing_info, question):
+        entry = same_party(index['exact'].get(normalize_info_key(text), []))
+        if entry:
+            return entry, 'exact'
+    
+    canonical_key = canonicalize_question(f"{missing_info} {question}")
+    entry = same_party(index['canonical'].get(canonical_key, [])) if canonical_key else None
+    if entry:
+        return entry, 'canonical'
+    
+    tokens = question_tokens(missing_info)
+    normalized = normalize_info_key(missing_info)
+    for entry_tokens, entry_normalized, entry_canonical, entry_party, entry in index['entries']:
+        # Short party numbers fall out of the tokens and barely move the ratio, so compare them explicitly
+        if entry_party != party:
+            continue
+        # Different canonical topics never match lexically
+        if canonical_key and entry_canonical and canonical_key != entry_canonical:
+            continue
+        if tokens and entry_tokens and len(tokens & entry_tokens) / len(tokens | entry_tokens) >= min_jaccard:
+            return entry, 'lexical'
+        if SequenceMatcher(None, normalized, entry_normalized).ratio() >= min_ratio:
+            return entry, 'lexical'
+    return None, None
+
+def dedupe_questions(questions, clause_type, notarial_info):
+    """Drop questions that were asked twice or already answered, reusing the stored answers
+    
+    Returns the outstanding questions and a list of (question, reused answer) pairs.
+    """
+    outstanding, reused, seen = [], [], set()
+    index = build_answer_index(notarial_info.get('user_answers', {}))
+    for q in questions:
+        key = canonicalize_question(f"{q['missing_info']} {q.get('question', '')}") or normalize_info_key(q['missing_info'])
+        if key in seen:
+            continue
+        seen.add(key)
+        existing, match_type = find_existing_answer(
+            q['missing_info'], q.get('question', ''), notarial_info.get('user_answers', {}), index
+        )
+        if existing:
+            store_user_answer(
+                notarial_info, clause_type, q['missing_info'], q.get('question', ''),
+                existing['answer'], "reused_answer",
+                reused_from=existing.get('clause_type'), match_type=match_type
+            )
+            reused.append((q, existing))
+        else:
+            outstanding.append(q)
+    return outstanding, reused
+
+def normalize_info_key(text):
+    """Normalize an information label to a comparable snake_case key"""
+    text = str(text).lower()
+    for accented, plain in (('ë', 'e'), ('é', 'e'), ('è', 'e'), ('ï', 'i'), ('ö', 'o'), ('ü', 'u')):
+        text = text.replace(accented, plain)
+    return re.sub(r'[^a-z0-9]+', '_', text).strip('_')
+
+def keys_refer_to_same_item(key_a, key_b):
+    """Check whether two normalized keys describe the same piece of information: same key or same canonical topic"""
+    if key_a == key_b:
+        return True
+    canonical_key = canonicalize_question(key_a)
+    return canonical_key is not None and canonical_key == canonicalize_question(key_b)
+
+# Explicit confirmations must start the answer; a substring like "geen" elsewhere is not enough,
+# and "geen idee" is not a confirmation at all
+NEGATIVE_ANSWER_PATTERN = re.compile(r'^\s*(nee|neen|geen(?!\s+idee\b))\b|^\s*(niet van toepassing|n\.?v\.?t\.?)\s*$', re.IGNORECASE)
+YES_NO_OPTION_PATTERN = re.compile(r'^\s*(ja|nee|neen|yes|no)\b', re.IGNORECASE)
+POSITIVE_ANSWER_PATTERN = re.compile(r'^\s*(ja|yes)\b', re.IGNORECASE)
+
+# Conditions whose presence is decided by the user, mapped to their decision key
+USER_DECISION_CONDITIONS = {
+    'beding van aanwas': 'beding_van_aanwas_aanwezig',
+    'tontine': 'tontine_aanwezig',
+}
+
+def is_presence_question(answer_data):
+    """Whether an answer replies to a yes/no question about the presence of a condition
+    
+    Only such answers exclude their condition; a "nee" to any other question says nothing about it.
+    """
+    options = [str(option) for option in answer_data.get('options') or [] if 'anders' not in str(option).lower()]
+    if options and all(YES_NO_OPTION_PATTERN.match(option) for option in options):
+        return True
+    text = normalize_info_key(f"{answer_data.get('missing_info', '')} {answer_data.get('question', '')}").replace('_', ' ')
+    return bool(PRESENCE_QUESTION_PATTERN.search(text))
+
+def parse_typed_value(raw):
+    """Interpret an answer or research value as boolean, date, amount, number or text"""
+    if isinstance(raw, bool):
+        return raw, 'boolean'
+    if isinstance(raw, (int, float)):
+        return raw, 'number'
+    text = str(raw).strip()
+    if NEGATIVE_ANSWER_PATTERN.match(text):
+        return False, 'boolean'
+    if POSITIVE_ANSWER_PATTERN.match(text):
+        return True, 'boolean'
+    for pattern, textual in ((NUMERIC_DATE_PATTERN, False), (TEXT_DATE_PATTERN, True)):
+        match = pattern.fullmatch(text)
+        if match:
+            day, month, year = match.groups()
+            try:
+                return datetime(int(year), DUTCH_MONTHS[month.lower()] if textual else int(month), int(day)).strftime("%d-%m-%Y"), 'date'
+            except ValueError:
+                break
+    match = EURO_AMOUNT_PATTERN.fullmatch(text)
+    if match:
+        try:
+            return parse_euro_amount(match.group(1) or match.group(2)), 'amount'
+        except ValueError:
+            pass
+    if re.fullmatch(r'-?\d+', text):
+        return int(text), 'number'
+    return text, 'text'
+
+def create_complete_information_set(research_data, user_answers):
+    """Merge research findings and user answers into a complete information set
+    
+    Deterministic replacement of the former compilation LLM call: user answers win on conflict,
+    every value carries its type and provenance, and explicit negative confirmations become
+    excluded conditions. Unconfirmed (LOW confidence) research values are left out.
+    """
+    complete_information = {}
+    excluded_conditions = []
+    notes = []
+    
+    # Confirmed research findings form the base layer
+    confirmed, unconfirmed = split_found_information(research_data)
+    for key, data in confirmed.items():
+        if 'value' not in data:
+            continue
+        typed_value, value_type = parse_typed_value(data['value'])
+        complete_information[key] = {
+            "value": data['value'],
+            "source": "research",
+            "confidence": data.get('confidence', 'HIGH'),
+            "type": value_type,
+            "typed_value": typed_value,
+            "provenance": {"source_quote": data.get('source_quote', ''), "quote_verification": data.get('quote_verification')}
+        }
+    
+    # User answers override research when they refer to the same item
+    for answer_key, answer_data in user_answers.items():
+        if not isinstance(answer_data, dict):
+            continue
+        answer_text = str(answer_data.get('answer', '')).strip()
+        missing_info = answer_data.get('missing_info', answer_key)
+        question_text = answer_data.get('question', '').lower()
+        typed_value, value_type = parse_typed_value(answer_text)
+        normalized = normalize_info_key(missing_info)
+        
+        target_key = next(
+            (key for key in complete_information
+             if complete_information[key]['source'] == 'research'
+             and keys_refer_to_same_item(normalize_info_key(key), normalized)),
+            normalized
+        )
+        
+        provenance = {
+            "question": answer_data.get('question', ''),
+            "answer_key": answer_key,
+            "answered_by": answer_data.get('source', 'manual_input')
+        }
+        if target_key in complete_information:
+            overridden = complete_information[target_key]
+            provenance["overrides"] = {"value": overridden['value'], "source": overridden['source']}
+            if str(overridden['value']).strip().lower() != answer_text.lower():
+                notes.append(f"'{target_key}': gebruikersantwoord '{answer_text}' vervangt onderzoekswaarde '{overridden['value']}'")
+        
+        complete_information[target_key] = {
+            "value": answer_text,
+            "source": "user",
+            "confidence": answer_data.get('confidence', 'HIGH'),
+            "type": value_type,
+            "typed_value": typed_value,
+            "provenance": provenance
+        }
+        
+        # Explicit negative confirmation of a presence question: the condition must not be generated
+        if value_type == 'boolean' and typed_value is False and is_presence_question(answer_data):
+            if missing_info.lower() not in [c.lower() for c in excluded_conditions]:
+                excluded_conditions.append(missing_info)
+        
+        # Known user decisions (e.g. beding van aanwas) are recorded explicitly
+        if value_type == 'boolean':
+            for condition, decision_key in USER_DECISION_CONDITIONS.items():
+                if condition in question_text or condition in missing_info.lower():
+                    complete_information[decision_key] = {
+                        "value": typed_value,
+                        "source": "user",
+                        "confidence": "HIGH",
+                        "type": "boolean",
+                        "typed_value": typed_value,
+                        "provenance": provenance
+                    }
+                    if typed_value is False and condition not in [c.lower() for c in excluded_conditions]:
+                        excluded_conditions.append(condition)
+    
+    empty_answers = [key for key, data in user_answers.items()
+                     if isinstance(data, dict) and not str(data.get('answer', '')).strip()]
+    if not user_answers:
+        notes.insert(0, "All info from research")
+    else:
+        notes.insert(0, f"{len(complete_information)} items samengevoegd ({len(user_answers)} gebruikersantwoorden, lokaal zonder LLM)")
+    if empty_answers:
+        notes.append(f"Lege antwoorden: {', '.join(empty_answers)}")
+    skipped = [key for key in unconfirmed if key not in complete_information]
+    if skipped:
+        notes.append(f"Niet bevestigde onderzoekswaarden weggelaten: {', '.join(skipped)}")
+    
+    return {
+        "complete_information": complete_information,
+        "excluded_conditions": excluded_conditions,
+        "compilation_notes": "; ".join(notes),
+        "ready_for_generation": not empty_answers
+    }
+
+def generate_final_clause(prompt, complete_info, research_data, source_content, model, notarial_info):
+    """Generate the final clause with complete information"""
+    
+    # First, check if the prompt contains template markers
+    has_template = '{{' in prompt and '}}' in prompt
+    
+    if has_template:
+        # This is a template-based prompt, we need to fill in the placeholders
+        
+        # Extract all required placeholders from the prompt
+        placeholders = re.findall(r'\{\{([^}]+)\}\}', prompt)
+        
+        # Build a mapping of placeholder values from all available information
+        placeholder_values = {}
+        
+        # Get confirmed values from research data
+        for key, data in split_found_information(research_data)[0].items():
+            if 'value' in data:
+                placeholder_values[key] = data['value']
+        
+        # Get values from complete_info
+        for key, data in complete_info.get('complete_information', {}).items():
+            if isinstance(data, dict) and 'value' in data:
+                placeholder_values[key] = data['value']
+        
+        # Get values from notarial_info (for standard fields)
+        if notarial_info:
+            notarial = notarial_info
+            
+            # Map notarial fields to placeholder names
+            field_mapping = {
+                'repertorium_number': notarial.get('repertorium_nummer', ''),
+                'day_and_month': '',  # Will be calculated below
+                'NOTARY_NAME': notarial.get('notary_name', ''),
+                'NOTARY_LOCATION': notarial.get('notary_location', ''),
+                'NOTARY_OFFICE_ADDRESS': notarial.get('notary_office_address', ''),
+                'DOSSIER_NUMBER': notarial.get('dossier_nummer', notarial.get('repertorium_nummer', '')),
+            }
+            
+            # Calculate day_and_month from ondertekening_datum
+            if notarial.get('ondertekening_datum'):
+                try:
+                    date_str = notarial['ondertekening_datum']
+                    # Convert to Dutch format
+                    day = notarial.get('ondertekening_dag', '')
+                    month_nl = notarial.get('ondertekening_maand_nl', '')
+                    if day and month_nl:
+                        # Convert day number to Dutch words
+                        dutch_days = {
+                            1: "één", 2: "twee", 3: "drie", 4: "vier", 5: "vijf",
+                            6: "zes", 7: "zeven", 8: "acht", 9: "negen", 10: "tien",
+                            11: "elf", 12: "twaalf", 13: "dertien", 14: "veertien", 15: "vijftien",
+                            16: "zestien", 17: "zeventien", 18: "achttien", 19: "negentien", 20: "twintig",
+                            21: "eenentwintig", 22: "tweeëntwintig", 23: "drieëntwintig", 24: "vierentwintig",
+                            25: "vijfentwintig", 26: "zesentwintig", 27: "zevenentwintig", 28: "achtentwintig",
+                            29: "negenentwintig", 30: "dertig", 31: "eenendertig"
+                        }
+                        day_text = dutch_days.get(int(day), str(day))
+                        field_mapping['day_and_month'] = f"{day_text} {month_nl}"
+                except:
+                    pass
+            
+            # Add mapped values to placeholder_values
+            for placeholder, value in field_mapping.items():
+                if value and placeholder not in placeholder_values:
+                    placeholder_values[placeholder] = value
+        
+        # Now use the model to process the template with the found information
+        template_prompt = f"""You are processing a notarial clause template. Your task is to:
+
+1. Take the template with placeholders and conditional blocks
+2. Fill in the placeholders with the provided information
+3. Process conditional blocks based on the conditions
+
+TEMPLATE TO PROCESS:
+{prompt}
+
+AVAILABLE INFORMATION:
+{json.dumps(placeholder_values, ensure_ascii=False, indent=2)}
+
+ADDITIONAL CONTEXT:
+- Videoconferentie: {'Ja' if notarial_info.get('videoconferentie', False) else 'Nee'}
+- Research Summary: {research_data.get('research_summary', '')}
+
+CRITICAL INSTRUCTIONS:
+1. Replace ALL {{{{placeholder}}}} with the corresponding values from the available information
+2. For [BLOCK] sections:
+   - [NOTARY_HEADER] ... [/NOTARY_HEADER]: ALWAYS include this block with filled values
+   - [IF_REMOTE_NOTARY] ... [/IF_REMOTE_NOTARY]: Include ONLY if videoconferentie is 'Ja', otherwise remove entirely
+3. If a placeholder value is not found, leave it as {{{{placeholder}}}} for manual filling
+4. Do NOT add any extra text or explanations
+5. Preserve all original formatting and line breaks
+6. Remove the [BLOCK] tags but keep the content when including a block
+7. When removing a conditional block, remove it entirely including tags
+
+OUTPUT: The processed template with all placeholders filled and conditional blocks processed."""
+
+        response = model.generate_content(template_prompt)
+        
+        # Clean up the response
+        cleaned_text = response.text.strip()
+        
+        # Additional cleanup to ensure no block markers remain when they should be removed
+        if not notarial_info.get('videoconferentie', False):
+            # Remove any remaining IF_REMOTE_NOTARY blocks
             cleaned_text = re.sub(r'\[IF_REMOTE_NOTARY\].*?\[/IF_REMOTE_NOTARY\]', '', cleaned_text, flags=re.DOTALL)
         
-        # Remove any remaining block tags (but keep content for included blocks)
-        cleaned_text = re.sub(r'\[NOTARY_HEADER\]', '', cleaned_text)
-        cleaned_text = re.sub(r'\[/NOTARY_HEADER\]', '', cleaned_text)
-        cleaned_text = re.sub(r'\[IF_REMOTE_NOTARY\]', '', cleaned_text)
-        cleaned_text = re.sub(r'\[/IF_REMOTE_NOTARY\]', '', cleaned_text)
+        # Remove any remaining block tags (but keep content for included blocks)
+        cleaned_text = re.sub(r'\[NOTARY_HEADER\]', '', cleaned_text)
+        cleaned_text = re.sub(r'\[/NOTARY_HEADER\]', '', cleaned_text)
+        cleaned_text = re.sub(r'\[IF_REMOTE_NOTARY\]', '', cleaned_text)
+        cleaned_text = re.sub(r'\[/IF_REMOTE_NOTARY\]', '', cleaned_text)
+        
+        # Clean up extra whitespace
+        cleaned_text = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned_text)
+        
+        return cleaned_text
+        
+    else:
+        # This is a non-template prompt, use the original generation logic
+        info_context = "\n\nCOMPLETE INFORMATION SET:\n"
+        
+        # Include confirmed research findings
+        info_context += "\nFROM RESEARCH:\n"
+        for key, data in split_found_information(research_data)[0].items():
+            info_context += f"- {key}: {data.get('value')}\n"
+        
+        # Include compiled information
+        info_context += "\nFROM COMPILATION:\n"
+        for key, data in complete_info.get('complete_information', {}).items():
+            info_context += f"- {key}: {data['value']} (bron: {data['source']})\n"
+        
+        # Include excluded conditions
+        excluded_conditions = complete_info.get('excluded_conditions', [])
+        if excluded_conditions:
+            info_context += "\nEXCLUDED CONDITIONS (DO NOT GENERATE):\n"
+            for condition in excluded_conditions:
+                info_context += f"- {condition}\n"
+        
+        # Get applicable scenario from research or review
+        applicable_scenario = research_data.get('applicable_scenario', '')
+        research_summary = research_data.get('research_summary', '')
+        
+        documents_text = build_document_context(
+            source_content,
+            [prompt] + [f"{key} {data.get('value', '')}" for key, data in research_data.get('found_information', {}).items() if isinstance(data, dict)],
+            model, max_excerpt_chars=15000
+        )
+        
+        final_prompt = f"""Generate a complete legal clause based on the following:
+
+ORIGINAL PROMPT:
+{prompt}
+
+RESEARCH SUMMARY:
+{research_summary}
+
+APPLICABLE SCENARIO:
+{applicable_scenario}
+
+{info_context}
+
+SOURCE DOCUMENTS:
+{documents_text or source_content}
+
+CRITICAL INSTRUCTIONS:
+1. Pay careful attention to the RESEARCH SUMMARY and APPLICABLE SCENARIO
+2. ABSOLUTELY DO NOT generate any text related to conditions listed under "EXCLUDED CONDITIONS"
+3. Respect conditional logic: if research or user confirms conditions are NOT met, do NOT generate those sections
+4. Only generate clause text that matches the actual situation found in the documents
+5. Do NOT include block indicators like [BLOCK ...] or [/BLOCK] in the output
+6. If a condition is explicitly excluded or false, omit ANY text related to that condition
+
+CONDITIONAL LOGIC RULES:
+- When information indicates a condition is "false", "not present", "nee", or listed in EXCLUDED CONDITIONS, exclude ALL related text
+- When user explicitly confirms something is NOT present, this overrides any template suggestions
+- Generate ONLY text for conditions that are confirmed as true or applicable
+
+Create a legally sound clause using ONLY the applicable information based on the actual conditions found.
+If the entire clause depends on an excluded condition, return an appropriate message explaining why the clause cannot be generated.
+Ensure the clause is complete, clear, and professionally written in Dutch."""
+
+        response = model.generate_content(final_prompt)
+        
+        # Clean up the response
+        cleaned_text = response.text
+        
+        # Remove block indicators using regex
+        cleaned_text = re.sub(r'\[BLOCK\s+[^\]]+\]', '', cleaned_text)
+        cleaned_text = re.sub(r'\[/BLOCK\]', '', cleaned_text)
         
-        # Clean up extra whitespace
-        cleaned_text = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned_text)
+        # Clean up any extra whitespace
+        cleaned_text = re.sub(r'\n\s*\n', '\n\n', cleaned_text)
+        cleaned_text = cleaned_text.strip()
         
         return cleaned_text
-        
+
+# ============= CLAUSE DEPENDENCY FINGERPRINTS =============
+
+DOCUMENT_HEADER_PATTERN = re.compile(r'\n\n--- Content from (.+?) ---\n\n')
+
+def split_document_segments(source_content):
+    """Split the combined source content into {document name: text} using the load_source_documents headers"""
+    parts = DOCUMENT_HEADER_PATTERN.split(source_content)
+    return {parts[i]: parts[i + 1] for i in range(1, len(parts) - 1, 2)}
+
+def normalize_whitespace(text):
+    return re.sub(r'\s+', ' ', str(text)).strip().lower()
+
+def flatten_intake_facts(notarial_info):
+    """Flatten the intake data (without user answers) into {fact path: value string}"""
+    facts = {}
+    for key, value in notarial_info.items():
+        if key in ('user_answers', 'verkopers_aanwezig', 'kopers_aanwezig'):
+            continue
+        if key in ('verkopers', 'kopers'):
+            facts[f"{key}.aantal"] = str(len(value))
+            for party in value:
+                for field, field_value in party.items():
+                    if field != 'volgnummer':
+                        facts[f"{key}.{party.get('volgnummer')}.{field}"] = str(field_value)
+        else:
+            facts[key] = json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (list, dict)) else str(value)
+    return facts
+
+def select_used_facts(facts, prompt, clause_text):
+    """Return the fact paths a clause depends on: topics its prompt talks about, template fields and values in its text"""
+    prompt_lower = prompt.lower()
+    clause_lower = clause_text.lower()
+    has_template = '{{' in prompt and '}}' in prompt
+    used = set()
+    for path, value in facts.items():
+        field = path.rsplit('.', 1)[-1]
+        terms = INTAKE_FACT_TOPICS.get(field, [])
+        if has_template and field in TEMPLATE_INTAKE_FIELDS:
+            used.add(path)
+        elif any(term in prompt_lower for term in terms):
+            used.add(path)
+        elif len(value) >= 3 and value.lower() in clause_lower:
+            used.add(path)
+    return used
+
+def find_quoted_documents(research_data, segments):
+    """Return the documents that contain the source quotes of the research findings, or None if a quote cannot be placed"""
+    normalized_segments = {name: normalize_whitespace(text) for name, text in segments.items()}
+    used = set()
+    for info in research_data.get('found_information', {}).values():
+        quote = normalize_whitespace(info.get('source_quote', '')) if isinstance(info, dict) else ''
+        if not quote:
+            continue
+        matches = [name for name, text in normalized_segments.items() if quote[:80] in text]
+        if not matches:
+            return None
+        used.update(matches)
+    return used
+
+def compute_clause_fingerprint(prompt, clause_type, clause_text, research_data, notarial_info, source_content):
+    """Record the inputs a generated clause depended on
+    
+    Documents are the ones its research quotes came from (all documents when a quote cannot be placed).
+    Clauses that still had missing information also depend on the set of documents, since a new
+    document may supply it.
+    """
+    facts = flatten_intake_facts(notarial_info)
+    segments = split_document_segments(source_content)
+    used_documents = find_quoted_documents(research_data, segments)
+    if used_documents is None:
+        used_documents = set(segments)
+    clause_answers = {
+        key: compute_content_hash(str(entry.get('answer', '')))
+        for key, entry in notarial_info.get('user_answers', {}).items()
+        if key.startswith(f"{clause_type}_")
+    }
+    return {
+        'prompt_hash': compute_content_hash(prompt),
+        'facts': {path: compute_content_hash(facts[path]) for path in select_used_facts(facts, prompt, clause_text)},
+        'answers': clause_answers,
+        'documents': {name: compute_content_hash(segments[name]) for name in used_documents},
+        'document_names': sorted(segments),
+        'open_items': bool(research_data.get('missing_information')),
+        'source_hash': compute_content_hash(source_content) if not segments else None
+    }
+
+def find_changed_inputs(fingerprint, prompt, clause_type, notarial_info, source_content):
+    """Compare a stored fingerprint with the current inputs; returns a list of (kind, description)"""
+    changes = []
+    if compute_content_hash(prompt) != fingerprint['prompt_hash']:
+        changes.append(('prompt', "prompt gewijzigd"))
+    
+    facts = flatten_intake_facts(notarial_info)
+    for path, value_hash in fingerprint['facts'].items():
+        if path not in facts:
+            changes.append(('fact', f"{path} verwijderd"))
+        elif compute_content_hash(facts[path]) != value_hash:
+            changes.append(('fact', f"{path} gewijzigd"))
+    
+    answers = notarial_info.get('user_answers', {})
+    for key, value_hash in fingerprint['answers'].items():
+        if key not in answers or compute_content_hash(str(answers[key].get('answer', ''))) != value_hash:
+            changes.append(('fact', f"antwoord {key} gewijzigd"))
+    
+    segments = split_document_segments(source_content)
+    if fingerprint.get('source_hash') and compute_content_hash(source_content) != fingerprint['source_hash']:
+        changes.append(('document', "brondocumenten gewijzigd"))
+    for name, segment_hash in fingerprint['documents'].items():
+        if name not in segments:
+            changes.append(('document', f"{name} verwijderd"))
+        elif compute_content_hash(segments[name]) != segment_hash:
+            changes.append(('document', f"{name} gewijzigd"))
+    new_documents = sorted(set(segments) - set(fingerprint['document_names']))
+    if new_documents and fingerprint['open_items']:
+        changes.append(('document', f"nieuwe documenten voor ontbrekende info: {', '.join(new_documents)}"))
+    return changes
+
+# ============= CLAUSE PREFETCHING =============
+
+@st.cache_resource(show_spinner=False)
+def get_prefetch_executor():
+    """Process-wide pool for background prefetches; LLM calls still go through the shared rate limiter"""
+    return ThreadPoolExecutor(max_workers=PREFETCH_MAX_WORKERS, thread_name_prefix="prefetch")
+
+def get_clause_inputs(row):
+    """Return (clause_type, prompt, skip_conditions) of a CSV row"""
+    skip_conditions = ""
+    if len(row) > 3:
+        skip_conditions = row.iloc[3] if lazy_import('pandas').notna(row.iloc[3]) else ""
+    elif 'skip_conditions' in row:
+        skip_conditions = row.get('skip_conditions', '')
+    return row.get('clause', ''), row['optimized_prompt'], skip_conditions
+
+def prefetch_clause(row_number, essential, clause_type, prompt, skip_conditions, source_content, notarial_info,
+                    evidence, batch_decision, model):
+    """Run applicability and research for a clause without touching the Streamlit session
+    
+    Research is only prefetched for clauses that will probably be applied.
+    """
+    start_time = time.time()
+    result = {'may_skip': False, 'analysis': None, 'research_data': None}
+    
+    if not essential:
+        if evidence is not None and not evidence['hits']:
+            result['may_skip'] = True
+        elif batch_decision:
+            result['may_skip'], result['analysis'] = batch_decision['may_skip'], batch_decision['analysis']
+        else:
+            result['may_skip'], result['analysis'] = check_clause_applicability(
+                prompt, clause_type, skip_conditions, source_content, notarial_info,
+                model.for_agent('prefetch_applicability'), evidence=evidence
+            )
+    
+    if not result['may_skip']:
+        result['research_data'] = research_agent_determine_needs(
+            prompt, clause_type, source_content, model.for_agent('prefetch_research')
+        )
+    
+    result['seconds'] = time.time() - start_time
+    return result
+
+def get_upcoming_clauses(current_row, depth):
+    """Row numbers of the next clauses to process: the user's queue if set, otherwise CSV order"""
+    df = st.session_state.csv_data
+    queue = [option[0] for option in st.session_state.get('clause_queue', [])]
+    if queue:
+        candidates = queue[queue.index(current_row) + 1:] if current_row in queue else queue
     else:
-        # This is a non-template prompt, use the original generation logic
-        info_context = "\n\nCOMPLETE INFORMATION SET:\n"
+        candidates = range(current_row + 1, len(df) + 1)
+    
+    processed_names = set(st.session_state.processed_clauses)
+    upcoming = []
+    for row_number in candidates:
+        if len(upcoming) >= depth:
+            break
+        if row_number in st.session_state.deferred_clauses or row_number == current_row:
+            continue
+        clause_name = df.iloc[row_number - 1].get('clause', '').replace('_CLAUSULE', '').replace('_', ' ').title()
+        if any(name.startswith(clause_name) for name in processed_names):
+            continue
+        upcoming.append(row_number)
+    return upcoming
+
+def schedule_prefetch(current_row):
+    """Start background prefetches for the upcoming clauses while the current clause waits for input"""
+    depth = st.session_state.get('prefetch_depth', PREFETCH_DEPTH)
+    if not depth or st.session_state.csv_data is None:
+        return
+    
+    context_hash = get_applicability_context_hash()
+    cache = st.session_state.prefetch_cache
+    evidence_map = get_dossier_evidence_map()
+    
+    for row_number in get_upcoming_clauses(current_row, depth):
+        cached = cache.get(row_number)
+        if cached and cached['context_hash'] == context_hash:
+            continue
+        clause_type, prompt, skip_conditions = get_clause_inputs(st.session_state.csv_data.iloc[row_number - 1])
+        model = InstrumentedModel(
+            get_gemini_model(),
+            st.session_state.llm_call_log,
+            clause=row_number
+        )
+        cache[row_number] = {
+            'context_hash': context_hash,
+            'started_at': time.time(),
+            'future': get_prefetch_executor().submit(
+                prefetch_clause, row_number, is_essential_clause(st.session_state.csv_data, row_number),
+                clause_type, prompt, skip_conditions,
+                get_clause_source_content(st.session_state.csv_data.iloc[row_number - 1]),
+                copy.deepcopy(st.session_state.notarial_info),
+                get_clause_evidence(evidence_map, st.session_state.csv_data, row_number),
+                get_batch_applicability_decision(row_number), model
+            )
+        }
+        st.session_state.prefetch_stats['started'] += 1
+
+def take_prefetched_clause(row_number):
+    """Return the prefetched result of a clause if it is still valid, recording a hit or miss"""
+    stats = st.session_state.prefetch_stats
+    cached = st.session_state.prefetch_cache.pop(row_number, None)
+    if not cached:
+        stats['misses'] += 1
+        return None
+    if cached['context_hash'] != get_applicability_context_hash():
+        stats['stale'] += 1
+        return None
+    
+    future = cached['future']
+    if future.done():
+        stats['hits'] += 1
+    else:
+        # Already running: waiting for it is never slower than starting over
+        stats['late_hits'] += 1
+        with st.spinner("⏩ Prefetch voor deze clausule wordt afgerond..."):
+            wait([future])
+    
+    try:
+        return future.result()
+    except Exception as e:
+        logger.warning("Prefetch for clause %s failed: %s", row_number, e)
+        return None
+
+def show_prefetch_stats():
+    """Sidebar summary of the prefetcher"""
+    stats = st.session_state.prefetch_stats
+    if not stats['started']:
+        return
+    requested = stats['hits'] + stats['late_hits'] + stats['misses'] + stats['stale']
+    hit_rate = (stats['hits'] + stats['late_hits']) / requested if requested else 0
+    in_flight = sum(1 for cached in st.session_state.prefetch_cache.values() if not cached['future'].done())
+    st.subheader("⏩ Prefetch")
+    st.caption(f"Hit rate {hit_rate:.0%} • {stats['hits']} hits • {stats['late_hits']} te laat • "
+               f"{stats['misses']} misses • {stats['stale']} verouderd • {in_flight} bezig")
+
+# ============= BLOB STORE =============
+
+BLOB_HASH_TEXT_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+class BlobStore:
+    """Content-addressed files on local disk, shared by all sessions and dossiers of this server"""
+    
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+    
+    def path(self, blob_hash):
+        if not BLOB_HASH_TEXT_PATTERN.fullmatch(blob_hash):
+            raise ValueError(f"Invalid blob hash: {blob_hash!r}")
+        return self.root / blob_hash[:2] / blob_hash
+    
+    def put(self, data):
+        """Store bytes once and return their sha256; storing existing bytes again marks them as recently used"""
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(blob_hash)
+        if path.exists():
+            os.utime(path)
+        else:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        return blob_hash
+    
+    def put_file(self, file_path):
+        """Store a file once without reading it into memory and return its sha256"""
+        writer = BlobWriter(self)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(BLOB_CHUNK_BYTES), b''):
+                writer.write_bytes(chunk)
+        return writer.close()
+    
+    def writer(self):
+        """Streaming writer for a blob whose content is produced piece by piece"""
+        return BlobWriter(self)
+    
+    def set_ref(self, name, blob_hash):
+        """Point a name (e.g. a derived cache key) at a blob"""
+        path = self.root / 'refs' / name
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{name}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_text(blob_hash)
+        os.replace(tmp_path, path)
+    
+    def get_ref(self, name):
+        """Blob hash a name points at; reading a ref marks it as recently used for garbage collection"""
+        path = self.root / 'refs' / name
+        if not path.exists():
+            return None
+        os.utime(path)
+        return path.read_text()
+    
+    def get(self, blob_hash):
+        """Bytes of a blob, read into memory"""
+        return self.path(blob_hash).read_bytes()
+    
+    def iter_blobs(self):
+        for directory in self.root.iterdir():
+            if directory.is_dir() and len(directory.name) == 2:
+                yield from (path for path in directory.iterdir() if len(path.name) == 64)
+    
+    def iter_refs(self):
+        refs = self.root / 'refs'
+        return list(refs.iterdir()) if refs.exists() else []
+
+BLOB_CHUNK_BYTES = 1024 * 1024
+
+class BlobWriter:
+    """Writes a blob to a temporary file while hashing it; close() moves it into place and returns the hash"""
+    
+    def __init__(self, store):
+        self.store = store
+        self.hasher = hashlib.sha256()
+        self.chars = 0
+        self.tmp_path = store.root / f"incoming.{uuid.uuid4().hex}.tmp"
+        self.file = open(self.tmp_path, 'wb')
+    
+    def write_bytes(self, data):
+        self.hasher.update(data)
+        self.file.write(data)
+    
+    def write(self, text):
+        self.write_bytes(text.encode('utf-8'))
+        self.chars += len(text)
+    
+    def close(self):
+        self.file.close()
+        blob_hash = self.hasher.hexdigest()
+        path = self.store.path(blob_hash)
+        if path.exists():
+            os.unlink(self.tmp_path)
+            os.utime(path)
+        else:
+            path.parent.mkdir(exist_ok=True)
+            os.replace(self.tmp_path, path)
+        return blob_hash
+    
+    def discard(self):
+        self.file.close()
+        os.unlink(self.tmp_path)
+
+@st.cache_resource(show_spinner=False)
+def get_blob_store():
+    return BlobStore(BLOB_STORE_DIR)
+
+def put_text_blob(text):
+    return get_blob_store().put(text.encode('utf-8'))
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def get_text_blob(blob_hash):
+    """Decoded text of a blob; the cache is process-wide (bounded by entry count, not size), so sessions share one copy"""
+    return get_blob_store().get(blob_hash).decode('utf-8')
+
+def put_json_blob(value):
+    return put_text_blob(json.dumps(value, ensure_ascii=False, sort_keys=True))
+
+def get_json_blob(blob_hash):
+    return json.loads(get_text_blob(blob_hash))
+
+# Assembled corpora whose manifest parts are remembered for page lookups
+CORPUS_PARTS_MAX_ENTRIES = 1024
+
+@st.cache_resource(show_spinner=False)
+def get_corpus_registry():
+    """Manifest parts of every assembled corpus by its content hash, one process-wide instance that is never evicted"""
+    return {'lock': threading.Lock(), 'parts': {}}
+
+def get_corpus_parts(corpus_hash):
+    """(start offset, blob hash) of the manifest parts of an assembled corpus; empty for any other text"""
+    return get_corpus_registry()['parts'].get(corpus_hash, ())
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def assemble_source_content(manifest):
+    texts = [get_text_blob(blob_hash) for blob_hash in manifest]
+    source_content = "".join(texts)
+    parts, start = [], 0
+    for blob_hash, text in zip(manifest, texts):
+        parts.append((start, blob_hash))
+        start += len(text)
+    registry = get_corpus_registry()
+    with registry['lock']:
+        registry['parts'][compute_content_hash(source_content)] = tuple(parts)
+        while len(registry['parts']) > CORPUS_PARTS_MAX_ENTRIES:
+            registry['parts'].pop(next(iter(registry['parts'])))
+    return source_content
+
+def set_source_content_parts(parts):
+    """Store the source text parts (one per document) as blobs; the session only keeps their hashes"""
+    st.session_state.source_manifest = tuple(put_text_blob(part) for part in parts)
+
+def get_source_content():
+    """The combined source content of the current dossier"""
+    return assemble_source_content(st.session_state.source_manifest)
+
+def get_clause_source_content(row):
+    """Source content restricted to the document types the clause needs"""
+    document_types = get_clause_document_types(row)
+    if not document_types:
+        return get_source_content()
+    return assemble_source_content(select_document_parts(st.session_state.source_manifest, document_types))
+
+def get_source_hash():
+    """Hash of the current source content, derived from the manifest without reading the text"""
+    return compute_content_hash("|".join(st.session_state.source_manifest))
+
+# ============= DOSSIER STORE =============
+
+def encode_artifact(value):
+    """JSON-compatible form of a session value; tuples, sets, dicts with non-string keys and DataFrames are tagged"""
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: encode_artifact(item) for key, item in value.items()}
+        return {'__items__': [[encode_artifact(key), encode_artifact(item)] for key, item in value.items()]}
+    if isinstance(value, list):
+        return [encode_artifact(item) for item in value]
+    if isinstance(value, tuple):
+        return {'__tuple__': [encode_artifact(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': [encode_artifact(item) for item in sorted(value, key=repr)]}
+    # A DataFrame only exists once pandas was imported, so encoding never imports it
+    pandas = sys.modules.get('pandas')
+    if pandas is not None and isinstance(value, pandas.DataFrame):
+        return {'__dataframe__': json.loads(value.to_json(orient='split'))}
+    return value
+
+def decode_artifact(value):
+    """Inverse of encode_artifact"""
+    if isinstance(value, list):
+        return [decode_artifact(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        tag, payload = next(iter(value.items()))
+        if tag == '__tuple__':
+            return tuple(decode_artifact(item) for item in payload)
+        if tag == '__set__':
+            return {decode_artifact(item) for item in payload}
+        if tag == '__items__':
+            return {decode_artifact(key): decode_artifact(item) for key, item in payload}
+        if tag == '__dataframe__':
+            return lazy_import('pandas').DataFrame(payload['data'], columns=payload['columns'], index=payload['index'])
+    return {key: decode_artifact(item) for key, item in value.items()}
+
+class DossierStore:
+    """SQLite store with one zlib-compressed JSON document per session key, written only when it changed
+    
+    Values are plain JSON (see encode_artifact), so loading a dossier never executes stored code.
+    """
+    
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dossiers (
+                id TEXT PRIMARY KEY, name TEXT, stage TEXT, created REAL, updated REAL
+            );
+            CREATE TABLE IF NOT EXISTS artifacts (
+                dossier_id TEXT, key TEXT, hash TEXT, data BLOB,
+                PRIMARY KEY (dossier_id, key)
+            );
+        """)
+        self.conn.commit()
+    
+    def save(self, dossier_id, name, stage, values):
+        """Write the changed values of a dossier; returns the number of artifacts written"""
+        written = 0
+        with self.lock:
+            stored_hashes = dict(self.conn.execute(
+                "SELECT key, hash FROM artifacts WHERE dossier_id = ?", (dossier_id,)
+            ).fetchall())
+            for key, value in values.items():
+                blob = json.dumps(encode_artifact(value), ensure_ascii=False).encode('utf-8')
+                blob_hash = hashlib.sha256(blob).hexdigest()
+                if stored_hashes.get(key) == blob_hash:
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO artifacts (dossier_id, key, hash, data) VALUES (?, ?, ?, ?)",
+                    (dossier_id, key, blob_hash, zlib.compress(blob, 6))
+                )
+                written += 1
+            now = time.time()
+            self.conn.execute(
+                "INSERT INTO dossiers (id, name, stage, created, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, stage = excluded.stage, updated = excluded.updated",
+                (dossier_id, name, stage, now, now)
+            )
+            self.conn.commit()
+        return written
+    
+    def load(self, dossier_id):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, data FROM artifacts WHERE dossier_id = ?", (dossier_id,)
+            ).fetchall()
+        values = {}
+        for key, data in rows:
+            try:
+                values[key] = decode_artifact(json.loads(zlib.decompress(data)))
+            except ValueError:
+                # Dossiers written by older versions stored pickles, which are not loaded
+                logger.warning("Skipping artifact %s of dossier %s: not stored as JSON", key, dossier_id)
+        return values
+    
+    def list_dossiers(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, name, stage, updated FROM dossiers ORDER BY updated DESC"
+            ).fetchall()
+        return [{'id': row[0], 'name': row[1], 'stage': row[2], 'updated': row[3]} for row in rows]
+    
+    def delete(self, dossier_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM artifacts WHERE dossier_id = ?", (dossier_id,))
+            self.conn.execute("DELETE FROM dossiers WHERE id = ?", (dossier_id,))
+            self.conn.commit()
+    
+    def iter_artifact_data(self):
+        """Serialized bytes of every stored artifact, for scanning blob references"""
+        with self.lock:
+            rows = self.conn.execute("SELECT data FROM artifacts").fetchall()
+        for (data,) in rows:
+            yield zlib.decompress(data)
+
+@st.cache_resource(show_spinner=False)
+def get_dossier_store():
+    return DossierStore(DOSSIER_DB_PATH)
+
+BLOB_HASH_PATTERN = re.compile(rb'(?<![0-9a-f])[0-9a-f]{64}(?![0-9a-f])')
+
+def collect_blob_garbage(store, dossier_store, min_age_seconds, dry_run=False):
+    """Delete blobs no saved dossier or recently used ref points at (mark and sweep)
+    
+    Roots are the blob hashes in stored dossier artifacts and the refs used within min_age_seconds;
+    JSON blobs (research data, page maps) are followed to the blobs they name. Page-map refs only
+    live as long as their part. Nothing younger than min_age_seconds is deleted, so uploads and
+    jobs in flight are never collected.
+    """
+    cutoff = time.time() - min_age_seconds
+    roots = set()
+    for data in dossier_store.iter_artifact_data():
+        roots.update(match.decode() for match in BLOB_HASH_PATTERN.findall(data))
+    refs = {path.name: path for path in store.iter_refs() if not path.name.endswith('.tmp')}
+    page_refs = {}
+    for name, path in refs.items():
+        if name.startswith('pages-'):
+            page_refs[name[len('pages-'):]] = path.read_text()
+        elif path.stat().st_mtime >= cutoff:
+            roots.add(path.read_text())
+    
+    live, pending = set(), list(roots)
+    while pending:
+        blob_hash = pending.pop()
+        if blob_hash in live or not store.path(blob_hash).exists():
+            continue
+        live.add(blob_hash)
+        if blob_hash in page_refs:
+            pending.append(page_refs[blob_hash])
+        data = store.get(blob_hash)
+        if data[:1] in (b'[', b'{'):
+            pending.extend(match.decode() for match in BLOB_HASH_PATTERN.findall(data))
+    
+    stats = {'live': len(live), 'blobs': 0, 'refs': 0, 'bytes': 0}
+    for path in store.iter_blobs():
+        stat = path.stat()
+        if path.name in live or stat.st_mtime >= cutoff:
+            continue
+        stats['blobs'] += 1
+        stats['bytes'] += stat.st_size
+        if not dry_run:
+            path.unlink(missing_ok=True)
+    for name, path in refs.items():
+        if name.startswith('pages-') and name[len('pages-'):] in live:
+            continue
+        if path.stat().st_mtime < cutoff:
+            stats['refs'] += 1
+            if not dry_run:
+                path.unlink(missing_ok=True)
+    for path in list(store.root.glob('*.tmp')) + list(store.root.glob('*/*.tmp')):
+        if path.stat().st_mtime < cutoff and not dry_run:
+            path.unlink(missing_ok=True)
+    return stats
+
+def get_dossier_name():
+    """Human readable dossier name from the intake data"""
+    info = st.session_state.notarial_info
+    parties = [f"{p.get('voornaam', '')} {p.get('achternaam', '')}".strip() for p in info.get('verkopers', [])]
+    name = info.get('repertorium_nummer') or "Nieuw dossier"
+    return f"{name} — {', '.join(p for p in parties if p)}" if any(parties) else name
+
+def get_checkpoint_marker():
+    """Cheap summary of the dossier progress: the step, the clause stage, the finished clauses and the answers
+    
+    Reruns that only redraw the page leave it unchanged, so they write nothing.
+    """
+    state = st.session_state.processing_state
+    csv_data = st.session_state.csv_data
+    return (
+        st.session_state.get('dossier_id'),
+        st.session_state.current_step,
+        (state.get('row_number'), state.get('stage')) if state else None,
+        tuple(st.session_state.processed_clauses),
+        tuple(name for name, fingerprint in st.session_state.clause_fingerprints.items() if fingerprint.get('edited')),
+        tuple(st.session_state.get('deferred_clauses') or {}),
+        compute_content_hash(json.dumps(st.session_state.notarial_info, sort_keys=True, default=str)),
+        tuple(st.session_state.source_manifest),
+        None if csv_data is None else (id(csv_data), len(csv_data)),
+        st.session_state.get('batch_applicability', {}).get('context_hash')
+    )
+
+def checkpoint_dossier():
+    """Persist the dossier part of the session after a stage transition or an answer change
+    
+    Nothing is written before any data was entered, nor when the progress marker is unchanged.
+    """
+    if not (st.session_state.notarial_info or st.session_state.source_manifest):
+        return
+    if 'dossier_id' not in st.session_state:
+        st.session_state.dossier_id = uuid.uuid4().hex
+    marker = get_checkpoint_marker()
+    if st.session_state.get('checkpoint_marker') == marker:
+        return
+    state = st.session_state.processing_state
+    stage = f"{state['clause_name']}: {state['stage']}" if state else st.session_state.current_step
+    try:
+        get_dossier_store().save(
+            st.session_state.dossier_id, get_dossier_name(), stage,
+            {key: st.session_state[key] for key in PERSISTED_SESSION_KEYS if key in st.session_state}
+        )
+        st.session_state.checkpoint_marker = marker
+    except Exception as e:
+        logger.warning("Dossier checkpoint failed: %s", e)
+
+def resume_dossier(dossier_id):
+    """Load a stored dossier into the session; it continues at the stage where it stopped"""
+    # Dossiers stored before source normalization have no report
+    st.session_state.source_normalization = []
+    for key, value in get_dossier_store().load(dossier_id).items():
+        if key == 'source_content':
+            # Dossiers stored before the blob store kept the full text
+            set_source_content_parts([value] if value else [])
+        else:
+            st.session_state[key] = value
+    st.session_state.dossier_id = dossier_id
+    # Caches and prefetches belonged to the previous dossier
+    for key in ('evidence_map', 'dossier_identifiers', 'last_recompute_report'):
+        st.session_state.pop(key, None)
+    st.session_state.prefetch_cache = {}
+
+def show_dossier_store():
+    """Sidebar list of stored dossiers with resume buttons"""
+    st.subheader("💾 Dossiers")
+    dossiers = get_dossier_store().list_dossiers()
+    current_id = st.session_state.get('dossier_id')
+    
+    if st.button("🆕 Nieuw dossier", key="new_dossier"):
+        checkpoint_dossier()
+        for key in PERSISTED_SESSION_KEYS + ['dossier_id', 'evidence_map', 'dossier_identifiers', 'last_recompute_report']:
+            st.session_state.pop(key, None)
+        st.rerun()
+    
+    for dossier in dossiers[:10]:
+        label = f"{dossier['name']} ({dossier['stage']}, {datetime.fromtimestamp(dossier['updated']).strftime('%d-%m %H:%M')})"
+        if dossier['id'] == current_id:
+            st.caption(f"📂 Actief: {label}")
+        elif st.button(f"▶️ {label}", key=f"resume_dossier_{dossier['id']}"):
+            checkpoint_dossier()
+            resume_dossier(dossier['id'])
+            st.rerun()
+
+# ============= HEADLESS BATCH RUNNER =============
+
+class StubModel:
+    """Offline stand-in for the Gemini model, for dry runs and throughput tests of the chain"""
+    
+    def __init__(self, latency=0.0):
+        self.latency = latency
+    
+    def generate_content(self, prompt):
+        time.sleep(self.latency)
+        if "[Clausules om te beoordelen]" in prompt:
+            text = json.dumps({'decisions': [
+                {'clause_number': int(number), 'categorie': '3', 'finale_beslissing': 'NEE', 'redenering': 'Stub backend behoudt elke clausule.'}
+                for number in re.findall(r'^\[Clausule (\d+):', prompt, re.MULTILINE)
+            ]})
+        elif "FINALE BESLISSING" in prompt and "legal research agent" not in prompt:
+            text = "CLAUSULE: stub\nCATEGORIE: 3\nFINALE BESLISSING: NEE\n\nREDENERING:\nStub backend behoudt elke clausule."
+        elif "digest van het volgende document" in prompt:
+            text = json.dumps({'samenvatting': 'Stub digest', 'feiten': [], 'datums': [], 'bedragen': [], 'partijen': []})
+        elif "Generate a complete legal clause" in prompt or "notarial clause template" in prompt:
+            text = "[Stub] Gegenereerde clausule."
+        else:
+            text = json.dumps({
+                'applicable_scenario': 'stub', 'required_information': [], 'found_information': {},
+                'missing_information': [], 'research_summary': 'Stub backend',
+                'analysis': 'Stub backend', 'critical_missing': [], 'questions_for_user': [],
+                'resolved_items': {}, 'found': False, 'decisions': []
+            })
+        return type('StubResponse', (), {'text': text, 'usage_metadata': None})()
+
+def get_clause_display_name(clause_type):
+    return clause_type.replace('_CLAUSULE', '').replace('_', ' ').title()
+
+def load_answers_file(path, notarial_info):
+    """Store the answers of a filled-in open_questions.json"""
+    return store_answer_entries(json.loads(Path(path).read_text(encoding='utf-8')), notarial_info)
+
+def store_answer_entries(entries, notarial_info):
+    """Store answers in the open_questions.json format; entries without an answer are ignored"""
+    answered = 0
+    for item in entries:
+        if str(item.get('answer', '')).strip():
+            store_user_answer(
+                notarial_info, item['clause_type'], item['missing_info'],
+                item.get('question', ''), str(item['answer']), "answers_file", options=item.get('options', [])
+            )
+            answered += 1
+    return answered
+
+def run_clause_headless(job, model):
+    """Run the full agent chain for one clause without user interaction
+    
+    The applicability advice is followed. Missing items are searched in the documents; what stays
+    unanswered is returned as open questions and the clause is not generated.
+    """
+    dossier, row_number = job['dossier'], job['row_number']
+    row = dossier['df'].iloc[row_number - 1]
+    clause_type, prompt, skip_conditions = get_clause_inputs(row)
+    document_types = get_clause_document_types(row)
+    source_content = assemble_source_content(select_document_parts(dossier['manifest'], document_types)) if document_types else dossier['source_content']
+    result = {'row_number': row_number, 'clause': get_clause_display_name(clause_type), 'clause_type': clause_type,
+              'status': None, 'text': None, 'skip_reason': None, 'open_questions': []}
+    start_time = time.time()
+    
+    try:
+        if not is_essential_clause(dossier['df'], row_number):
+            evidence = get_clause_evidence(dossier['evidence_map'], dossier['df'], row_number)
+            decision = dossier['applicability'].get(row_number)
+            if decision:
+                may_skip, analysis = decision['may_skip'], decision['analysis']
+            else:
+                with dossier['lock']:
+                    notarial_info = copy.deepcopy(dossier['notarial_info'])
+                may_skip, analysis = check_clause_applicability(
+                    prompt, clause_type, skip_conditions, source_content, notarial_info,
+                    model.for_agent('applicability'), evidence=evidence
+                )
+            if may_skip:
+                result.update(status='skipped', skip_reason=analysis)
+                return result
         
-        # Include original research findings
-        info_context += "\nFROM RESEARCH:\n"
-        for key, data in research_data.get('found_information', {}).items():
-            info_context += f"- {key}: {data['value']}\n"
+        research_data = research_agent_determine_needs(prompt, clause_type, source_content, model.for_agent('research'))
+        review_result = review_agent_check(prompt, research_data, clause_type, model.for_agent('review'))
+        questions = review_result.get('questions_for_user', []) if review_result.get('critical_missing') else []
         
-        # Include compiled information
-        info_context += "\nFROM COMPILATION:\n"
-        for key, data in complete_info.get('complete_information', {}).items():
-            info_context += f"- {key}: {data['value']} (bron: {data['source']})\n"
+        # Answers are shared by all clauses of the dossier, which run concurrently
+        with dossier['lock']:
+            questions, _ = dedupe_questions(questions, clause_type, dossier['notarial_info'])
+            notarial_info = copy.deepcopy(dossier['notarial_info'])
         
-        # Include excluded conditions
-        excluded_conditions = complete_info.get('excluded_conditions', [])
-        if excluded_conditions:
-            info_context += "\nEXCLUDED CONDITIONS (DO NOT GENERATE):\n"
-            for condition in excluded_conditions:
-                info_context += f"- {condition}\n"
+        if questions:
+            search_results = search_missing_items_parallel(
+                [q['missing_info'] for q in questions], source_content, notarial_info,
+                dossier['identifiers'], model.for_agent('focused_search')
+            )
+            open_questions = []
+            with dossier['lock']:
+                for q in questions:
+                    item_data = get_found_item(search_results.get(q['missing_info']))
+                    if item_data:
+                        store_user_answer(
+                            dossier['notarial_info'], clause_type, q['missing_info'], q['question'],
+                            str(item_data['value']), "focused_search", confidence=item_data.get('confidence', 'HIGH')
+                        )
+                    else:
+                        open_questions.append(q)
+                notarial_info = copy.deepcopy(dossier['notarial_info'])
+            if open_questions:
+                result.update(status='needs_answers', open_questions=open_questions)
+                return result
         
-        # Get applicable scenario from research or review
-        applicable_scenario = research_data.get('applicable_scenario', '')
-        research_summary = research_data.get('research_summary', '')
+        clause_user_answers = {
+            key: value for key, value in notarial_info.get('user_answers', {}).items()
+            if key.startswith(f"{clause_type}_")
+        }
+        complete_info = create_complete_information_set(research_data, clause_user_answers)
+        result['text'] = generate_final_clause(
+            prompt, complete_info, research_data, source_content, model.for_agent('generation'), notarial_info
+        )
+        result['status'] = 'generated'
+    except Exception as e:
+        logger.exception("Clause %s of %s failed", row_number, dossier['name'])
+        result.update(status='error', skip_reason=str(e))
+    finally:
+        result['seconds'] = round(time.time() - start_time, 2)
+    return result
+
+def prepare_dossier_headless(folder, df, rows, model, intake_path=None, answers_path=None):
+    """Load a dossier folder and decide applicability of its clauses in one batch call"""
+    folder = Path(folder)
+    notarial_info = json.loads(Path(intake_path or folder / 'intake.json').read_text(encoding='utf-8'))
+    notarial_info.setdefault('user_answers', {})
+    answers_path = Path(answers_path) if answers_path else folder / 'answers.json'
+    if answers_path.exists():
+        load_answers_file(answers_path, notarial_info)
+    return build_headless_dossier(folder.name, notarial_info, load_source_folder(folder), df, rows, model)
+
+def build_headless_dossier(name, notarial_info, manifest, df, rows, model):
+    """Scan the dossier locally and decide applicability of its clauses in one batch call"""
+    manifest = tuple(manifest) + (put_text_blob(format_notarial_info_as_text(notarial_info)),)
+    source_content = assemble_source_content(manifest)
+    evidence_map = scan_factual_evidence(source_content)
+    prepare_dossier_digest(source_content, model)
+    
+    # Category 1a clauses without evidence are decided locally, the rest in one batch call
+    applicability = {}
+    batch_clauses = []
+    for row_number in rows:
+        if is_essential_clause(df, row_number):
+            continue
+        evidence = get_clause_evidence(evidence_map, df, row_number)
+        if evidence and not evidence['hits']:
+            applicability[row_number] = {
+                'may_skip': True,
+                'analysis': f"Geen bewijs voor {evidence['label']} gevonden in het dossier (Categorie 1a)"
+            }
+            continue
+        clause_type, prompt, _ = get_clause_inputs(df.iloc[row_number - 1])
+        batch_clauses.append({'row_number': row_number, 'clause_number': get_clause_number(df, row_number),
+                              'clause_type': clause_type, 'prompt': prompt})
+    if batch_clauses:
+        applicability.update(check_clauses_applicability_batch(
+            batch_clauses, source_content, notarial_info, model.for_agent('applicability_batch'),
+            evidence_map=evidence_map
+        ))
+    
+    return {
+        'name': name,
+        'df': df,
+        'notarial_info': notarial_info,
+        'manifest': manifest,
+        'source_content': source_content,
+        'evidence_map': evidence_map,
+        'identifiers': extract_structured_identifiers(source_content),
+        'applicability': applicability,
+        'lock': threading.Lock()
+    }
+
+def write_dossier_outputs(out_dir, dossier, results):
+    """Write the deed text, per-clause results and the open questions of one dossier"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    results = sorted(results, key=lambda r: r['row_number'])
+    
+    (out_dir / 'result.json').write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    akte = "\n\n".join(
+        f"=== {r['row_number']}. {r['clause']} ===\n{r['text']}" for r in results if r['status'] == 'generated'
+    )
+    (out_dir / 'akte.txt').write_text(akte, encoding='utf-8')
+    
+    # Same format as the answers file, so it can be filled in and passed back with --answers
+    open_questions = [
+        {'row_number': r['row_number'], 'clause_type': r['clause_type'], 'missing_info': q['missing_info'],
+         'question': q.get('question', ''), 'options': q.get('options', []), 'answer': ''}
+        for r in results for q in r['open_questions']
+    ]
+    (out_dir / 'open_questions.json').write_text(json.dumps(open_questions, ensure_ascii=False, indent=2), encoding='utf-8')
+    return len(open_questions)
+
+def parse_row_selection(selection, total_rows):
+    """Parse a clause selection like "1-10,15" into row numbers"""
+    if not selection:
+        return list(range(1, total_rows + 1))
+    rows = set()
+    for part in selection.split(','):
+        if '-' in part:
+            first, last = part.split('-', 1)
+            rows.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            rows.add(int(part))
+    return sorted(row for row in rows if 1 <= row <= total_rows)
+
+def run_batch(dossier_folders, clauses_csv, out_root, workers=None, rows=None, intake_path=None,
+              answers_path=None, stub=False, stub_latency=0.0):
+    """Process dossiers headlessly; all clauses of all dossiers share one worker pool"""
+    df = lazy_import('pandas').read_csv(clauses_csv)
+    row_numbers = parse_row_selection(rows, len(df))
+    call_log = []
+    backend = StubModel(stub_latency) if stub else get_gemini_model()
+    workers = workers or LLM_MAX_CONCURRENCY
+    # The stub has no API quota; only bound its concurrency
+    rate_limiter = RateLimiter(workers, 0) if stub else None
+    summary = {'dossiers': [], 'clauses': 0}
+    start_time = time.time()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Start clause jobs of a dossier as soon as it is prepared, so the pool never waits for the slowest intake
+        prepare_futures = {
+            executor.submit(
+                prepare_dossier_headless, folder, df, row_numbers,
+                InstrumentedModel(backend, call_log, rate_limiter=rate_limiter),
+                intake_path, answers_path
+            ): folder
+            for folder in dossier_folders
+        }
+        clause_futures = {}
+        for future in as_completed(prepare_futures):
+            folder = prepare_futures[future]
+            try:
+                dossier = future.result()
+            except Exception as e:
+                logger.error("Dossier %s could not be prepared: %s", folder, e)
+                summary['dossiers'].append({'name': Path(folder).name, 'error': str(e)})
+                continue
+            for row_number in row_numbers:
+                job = {'dossier': dossier, 'row_number': row_number}
+                model = InstrumentedModel(backend, call_log, clause=row_number, rate_limiter=rate_limiter)
+                clause_futures[executor.submit(run_clause_headless, job, model)] = dossier
         
-        final_prompt = f"""Generate a complete legal clause based on the following:
+        results_per_dossier = {}
+        for future in as_completed(clause_futures):
+            dossier = clause_futures[future]
+            results_per_dossier.setdefault(dossier['name'], (dossier, []))[1].append(future.result())
+    
+    for name, (dossier, results) in results_per_dossier.items():
+        open_count = write_dossier_outputs(Path(out_root) / name, dossier, results)
+        statuses = [r['status'] for r in results]
+        summary['dossiers'].append({
+            'name': name,
+            'generated': statuses.count('generated'),
+            'skipped': statuses.count('skipped'),
+            'needs_answers': statuses.count('needs_answers'),
+            'errors': statuses.count('error'),
+            'open_questions': open_count
+        })
+        summary['clauses'] += len(results)
+    
+    elapsed = time.time() - start_time
+    usage = summarize_llm_calls(call_log)
+    summary.update({
+        'seconds': round(elapsed, 2),
+        'clauses_per_minute': round(summary['clauses'] / elapsed * 60, 1) if elapsed else 0,
+        'dossiers_per_hour': round(len(results_per_dossier) / elapsed * 3600, 1) if elapsed else 0,
+        'llm_calls': usage['calls'],
+        'prompt_tokens': usage['prompt_tokens'],
+        'output_tokens': usage['output_tokens']
+    })
+    Path(out_root).mkdir(parents=True, exist_ok=True)
+    (Path(out_root) / 'summary.json').write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8')
+    return summary
+
+# ============= HTTP SERVICE =============
+
+SERVICE_MAX_BODY_BYTES = 50 * 1024 * 1024
+# Finished jobs are dropped after this many seconds, and the oldest first above this many jobs
+SERVICE_JOB_TTL = int(os.getenv('SERVICE_JOB_TTL', '3600'))
+SERVICE_MAX_JOBS = int(os.getenv('SERVICE_MAX_JOBS', '200'))
+
+class ClauseService:
+    """Jobs and a bounded worker pool behind the HTTP API; one backend model is shared by all requests"""
+    
+    def __init__(self, df, backend, workers, rate_limiter=None):
+        self.df = df
+        self.backend = backend
+        self.rate_limiter = rate_limiter
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="service")
+        self.call_log = []
+        self.jobs = {}
+        self.lock = threading.Lock()
+    
+    def model(self, agent=None, clause=None):
+        return InstrumentedModel(self.backend, self.call_log, agent, clause, self.rate_limiter)
+    
+    def ingest_documents(self, documents):
+        """Store documents ({name, text} or {name, content_base64} for PDF) and return their manifest id"""
+        manifest, reports = [], []
+        for document in documents:
+            name = document['name']
+            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(name).suffix) as tmp_file:
+                kind = 'text' if 'text' in document else 'pdf'
+                tmp_file.write(document['text'].encode('utf-8') if kind == 'text' else base64.b64decode(document['content_base64']))
+                tmp_path = tmp_file.name
+            try:
+                part_hash = ingest_document_file(name, tmp_path, reports, kind)
+            finally:
+                os.unlink(tmp_path)
+            if part_hash:
+                manifest.append(part_hash)
+        return {
+            'documents_id': put_json_blob(manifest),
+            'documents': len(manifest),
+            'characters': sum(report['header_chars'] + report['normalized_chars'] for report in reports),
+            'normalization': [
+                {key: report[key] for key in ('document', 'document_type', 'pages', 'empty_pages', 'removed_lines', 'original_tokens', 'normalized_tokens')}
+                for report in reports
+            ]
+        }
+    
+    def load_manifest(self, documents_id):
+        """Part hashes of an uploaded document set; ValueError for a malformed id, FileNotFoundError for an unknown one"""
+        if not isinstance(documents_id, str) or not BLOB_HASH_TEXT_PATTERN.fullmatch(documents_id):
+            raise ValueError("documents_id must be a sha256 hex digest")
+        if not get_blob_store().path(documents_id).exists():
+            raise FileNotFoundError(f"Unknown documents_id {documents_id}")
+        manifest = get_json_blob(documents_id)
+        if not isinstance(manifest, list) or not all(isinstance(h, str) and BLOB_HASH_TEXT_PATTERN.fullmatch(h) for h in manifest):
+            raise ValueError("documents_id does not refer to a document set")
+        return manifest
+    
+    def load_parts(self, documents_id):
+        return [get_text_blob(blob_hash) for blob_hash in self.load_manifest(documents_id)]
+    
+    def extract_intake(self, documents_id):
+        source_content = "".join(self.load_parts(documents_id))
+        identifiers = extract_structured_identifiers(source_content)
+        form_data = parse_extracted_data_for_form(
+            extract_info_from_documents(source_content, self.model('intake_extraction'))
+        )
+        form_data, warnings = apply_local_identifiers_to_form(form_data, identifiers, source_content)
+        return {'form_data': form_data, 'warnings': warnings}
+    
+    def parse_rows(self, payload):
+        return parse_row_selection(payload.get('rows'), len(self.df))
+    
+    def check_applicability(self, payload):
+        rows = self.parse_rows(payload)
+        dossier = build_headless_dossier(
+            payload.get('name', 'api'), dict(payload['intake']), self.load_manifest(payload['documents_id']),
+            self.df, rows, self.model()
+        )
+        decisions = {}
+        for row_number in rows:
+            if is_essential_clause(self.df, row_number):
+                decisions[row_number] = {'may_skip': False, 'reasoning': 'Essentiële clausule'}
+            elif row_number in dossier['applicability']:
+                decision = dossier['applicability'][row_number]
+                decisions[row_number] = {'may_skip': decision['may_skip'], 'reasoning': decision.get('reasoning', decision['analysis'])}
+            else:
+                decisions[row_number] = {'may_skip': False, 'reasoning': 'Geen batchbeslissing ontvangen; de clausule wordt behouden'}
+        return {'decisions': decisions}
+    
+    def submit_job(self, payload):
+        """Queue a full chain run for a dossier; returns the job record"""
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'created': time.time(),
+            'total': None,
+            'results': [],
+            'error': None,
+            'finished': None,
+            'condition': threading.Condition()
+        }
+        with self.lock:
+            self.evict_finished_jobs()
+            self.jobs[job['id']] = job
+        self.executor.submit(self.run_job, job, payload)
+        return job
+    
+    def evict_finished_jobs(self):
+        """Drop finished jobs past SERVICE_JOB_TTL, then the oldest finished ones above SERVICE_MAX_JOBS; call with self.lock held"""
+        now = time.time()
+        finished = sorted(
+            (job['finished'], job_id) for job_id, job in self.jobs.items() if job['finished'] is not None
+        )
+        excess = len(self.jobs) + 1 - SERVICE_MAX_JOBS
+        for index, (finished_at, job_id) in enumerate(finished):
+            if now - finished_at > SERVICE_JOB_TTL or index < excess:
+                del self.jobs[job_id]
+    
+    def run_job(self, job, payload):
+        try:
+            notarial_info = copy.deepcopy(payload['intake'])
+            notarial_info.setdefault('user_answers', {})
+            store_answer_entries(payload.get('answers', []), notarial_info)
+            rows = self.parse_rows(payload)
+            dossier = build_headless_dossier(
+                payload.get('name', job['id']), notarial_info, self.load_manifest(payload['documents_id']),
+                self.df, rows, self.model()
+            )
+        except Exception as e:
+            logger.exception("Job %s failed", job['id'])
+            with job['condition']:
+                job.update(status='failed', error=str(e), finished=time.time())
+                job['condition'].notify_all()
+            return
+        
+        with job['condition']:
+            job.update(status='running', total=len(rows))
+            if not rows:
+                job.update(status='done', finished=time.time())
+            job['condition'].notify_all()
+        for row_number in rows:
+            future = self.executor.submit(
+                run_clause_headless, {'dossier': dossier, 'row_number': row_number}, self.model(clause=row_number)
+            )
+            future.add_done_callback(lambda f, job=job: self.add_result(job, f))
+    
+    def add_result(self, job, future):
+        with job['condition']:
+            job['results'].append(future.result())
+            if len(job['results']) == job['total']:
+                job.update(status='done', finished=time.time())
+            job['condition'].notify_all()
+    
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+    
+    def job_status(self, job):
+        with job['condition']:
+            results = sorted(job['results'], key=lambda r: r['row_number'])
+            return {
+                'job_id': job['id'],
+                'status': job['status'],
+                'error': job['error'],
+                'total': job['total'],
+                'completed': len(results),
+                'results': results,
+                'open_questions': [
+                    {'row_number': r['row_number'], 'clause_type': r['clause_type'], 'missing_info': q['missing_info'],
+                     'question': q.get('question', ''), 'options': q.get('options', []), 'answer': ''}
+                    for r in results for q in r['open_questions']
+                ]
+            }
+    
+    def iter_job_results(self, job, heartbeat=15):
+        """Yield clause results as they complete, then a final summary event; None is a keep-alive"""
+        sent = 0
+        while True:
+            with job['condition']:
+                while sent == len(job['results']) and job['status'] in ('queued', 'running'):
+                    if not job['condition'].wait(timeout=heartbeat):
+                        break
+                new_results = job['results'][sent:]
+                finished = job['status'] in ('done', 'failed') and sent + len(new_results) == len(job['results'])
+            if not new_results and not finished:
+                yield None
+            for result in new_results:
+                yield {'event': 'clause', **result}
+            sent += len(new_results)
+            if finished:
+                yield {'event': job['status'], 'completed': sent, 'error': job['error']}
+                return
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """JSON API; HTTP/1.1 keep-alive so clients can reuse their connection"""
+    
+    protocol_version = "HTTP/1.1"
+    
+    @property
+    def service(self):
+        return self.server.service
+    
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+    
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length > SERVICE_MAX_BODY_BYTES:
+            raise ValueError("Request body too large")
+        return json.loads(self.rfile.read(length) or b'{}')
+    
+    def stream_job(self, job):
+        """Stream clause results as NDJSON with chunked transfer encoding"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for event in self.service.iter_job_results(job):
+            line = (json.dumps(event, ensure_ascii=False) if event else "") + "\n"
+            data = line.encode('utf-8')
+            self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+    
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['health']:
+            self.send_json(200, {'status': 'ok', 'jobs': len(self.service.jobs), 'llm_calls': len(self.service.call_log)})
+        elif len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.service.get_job(parts[1])
+            if not job:
+                self.send_json(404, {'error': 'Unknown job'})
+            elif len(parts) == 3 and parts[2] == 'stream':
+                self.stream_job(job)
+            elif len(parts) == 2:
+                self.send_json(200, self.service.job_status(job))
+            else:
+                self.send_json(404, {'error': 'Not found'})
+        else:
+            self.send_json(404, {'error': 'Not found'})
+    
+    def do_POST(self):
+        routes = {
+            '/documents': lambda payload: (200, self.service.ingest_documents(payload['documents'])),
+            '/intake/extract': lambda payload: (200, self.service.extract_intake(payload['documents_id'])),
+            '/applicability': lambda payload: (200, self.service.check_applicability(payload)),
+            '/jobs': self.create_job
+        }
+        route = routes.get(self.path.split('?')[0].rstrip('/'))
+        if not route:
+            self.send_json(404, {'error': 'Not found'})
+            return
+        try:
+            status, payload = route(self.read_json())
+        except FileNotFoundError as e:
+            self.send_json(404, {'error': str(e)})
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': f"Invalid request: {e}"})
+            return
+        except Exception as e:
+            logger.exception("Request %s failed", self.path)
+            self.send_json(500, {'error': str(e)})
+            return
+        self.send_json(status, payload)
+    
+    def create_job(self, payload):
+        if 'documents_id' not in payload or 'intake' not in payload:
+            raise KeyError("documents_id and intake are required")
+        self.service.load_manifest(payload['documents_id'])
+        job = self.service.submit_job(payload)
+        return 202, {'job_id': job['id'], 'status_url': f"/jobs/{job['id']}", 'stream_url': f"/jobs/{job['id']}/stream"}
 
-ORIGINAL PROMPT:
-{prompt}
+def create_service_server(host, port, clauses_csv, workers=None, stub=False, stub_latency=0.0):
+    """Build the HTTP server; the caller runs serve_forever()"""
+    workers = workers or LLM_MAX_CONCURRENCY
+    backend = StubModel(stub_latency) if stub else get_gemini_model()
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.daemon_threads = True
+    server.service = ClauseService(
+        lazy_import('pandas').read_csv(clauses_csv), backend, workers, RateLimiter(workers, 0) if stub else None
+    )
+    return server
 
-RESEARCH SUMMARY:
-{research_summary}
+# ============= PARTY ENCODING BENCHMARK =============
 
-APPLICABLE SCENARIO:
-{applicable_scenario}
+BENCHMARK_PARTY_COUNTS = (1, 5, 20, 50)
 
-{info_context}
+def build_benchmark_intake(party_count):
+    """Synthetic intake with the given number of parties, split over sellers and buyers"""
+    verkoper_count = max(1, (party_count + 1) // 2)
+    info = {
+        'ondertekening_datum': '01/01/2025', 'ondertekening_dag': '1', 'ondertekening_maand_nl': 'januari',
+        'ondertekening_jaar': '2025', 'videoconferentie': False,
+        'verkoper_type': 'natuurlijke_personen', 'koper_type': 'natuurlijke_personen'
+    }
+    for key, count in (('verkopers', verkoper_count), ('kopers', party_count - verkoper_count)):
+        info[key] = [{
+            'volgnummer': n, 'voornaam': f'Voornaam{n}', 'achternaam': f'Achternaam{n}',
+            'rijksregisternummer': f'85.01.{n % 100:02d}-123.{n % 97:02d}', 'adres': f'Dorpsstraat {n}, 9000 Gent',
+            'burgerlijke_staat': 'Gehuwd' if n % 2 else 'Ongehuwd', 'partner_naam': f'Partner {n}' if n % 2 else None
+        } for n in range(1, count + 1)]
+        info[f'{key}_aanwezig'] = [{'volgnummer': n, 'aanwezig': n % 3 != 0} for n in range(1, count + 1)]
+    return info
 
-SOURCE DOCUMENTS:
-{source_content}
+def benchmark_party_encodings(party_counts=BENCHMARK_PARTY_COUNTS, model=None, repeat=1):
+    """Compare prompt size (and, with a model, call latency) of the 'lines' and 'table' party encodings"""
+    clause = "[Clausule] Benchmark clausule over de verkopers en kopers."
+    results = []
+    for party_count in party_counts:
+        info = build_benchmark_intake(party_count)
+        reference = build_applicability_prompt(clause, "", info)
+        for encoding in ('lines', 'table'):
+            start = time.perf_counter()
+            blocks = {kind: get_notarial_model(info).build_notarial_text(kind, encoding) for kind in ('document', 'klantinfo', 'search')}
+            build_ms = (time.perf_counter() - start) * 1000
+            prompt = reference.replace(format_klantinfo_text(info), blocks['klantinfo'])
+            row = {
+                'parties': party_count, 'encoding': encoding,
+                'applicability_tokens': estimate_tokens(prompt),
+                'document_tokens': estimate_tokens(blocks['document']),
+                'search_tokens': estimate_tokens(blocks['search']),
+                'build_ms': round(build_ms, 2), 'latency_s': None
+            }
+            if model is not None:
+                call_log = []
+                instrumented = InstrumentedModel(model, call_log, 'benchmark')
+                for _ in range(repeat):
+                    instrumented.generate_content(prompt)
+                row['applicability_tokens'] = call_log[-1]['prompt_tokens']
+                row['latency_s'] = round(sum(e['seconds'] for e in call_log) / len(call_log), 2)
+            results.append(row)
+    return results
 
-CRITICAL INSTRUCTIONS:
-1. Pay careful attention to the RESEARCH SUMMARY and APPLICABLE SCENARIO
-2. ABSOLUTELY DO NOT generate any text related to conditions listed under "EXCLUDED CONDITIONS"
-3. Respect conditional logic: if research or user confirms conditions are NOT met, do NOT generate those sections
-4. Only generate clause text that matches the actual situation found in the documents
-5. Do NOT include block indicators like [BLOCK ...] or [/BLOCK] in the output
-6. If a condition is explicitly excluded or false, omit ANY text related to that condition
+def print_party_benchmark(results):
+    print(f"{'partijen':>8} {'encoding':>8} {'applic.':>8} {'document':>9} {'search':>7} {'bouw ms':>8} {'latency s':>10}")
+    for row in results:
+        latency = '-' if row['latency_s'] is None else f"{row['latency_s']:.2f}"
+        print(f"{row['parties']:>8} {row['encoding']:>8} {row['applicability_tokens']:>8} {row['document_tokens']:>9} "
+              f"{row['search_tokens']:>7} {row['build_ms']:>8.2f} {latency:>10}")
 
-CONDITIONAL LOGIC RULES:
-- When information indicates a condition is "false", "not present", "nee", or listed in EXCLUDED CONDITIONS, exclude ALL related text
-- When user explicitly confirms something is NOT present, this overrides any template suggestions
-- Generate ONLY text for conditions that are confirmed as true or applicable
+# ============= INGESTION BENCHMARK =============
 
-Create a legally sound clause using ONLY the applicable information based on the actual conditions found.
-If the entire clause depends on an excluded condition, return an appropriate message explaining why the clause cannot be generated.
-Ensure the clause is complete, clear, and professionally written in Dutch."""
+BENCHMARK_PAGE_COUNTS = (10, 100, 1000)
+BENCHMARK_PAGE_LINES = 45
+# Size of the grayscale image on every page, standing in for the scan of a scanned bundle
+BENCHMARK_SCAN_KB = 100
 
-        response = model.generate_content(final_prompt)
-        
-        # Clean up the response
-        cleaned_text = response.text
-        
-        # Remove block indicators using regex
-        cleaned_text = re.sub(r'\[BLOCK\s+[^\]]+\]', '', cleaned_text)
-        cleaned_text = re.sub(r'\[/BLOCK\]', '', cleaned_text)
-        
-        # Clean up any extra whitespace
-        cleaned_text = re.sub(r'\n\s*\n', '\n\n', cleaned_text)
-        cleaned_text = cleaned_text.strip()
-        
-        return cleaned_text
+def write_benchmark_pdf(path, page_count, scan_kb=BENCHMARK_SCAN_KB):
+    """Write a synthetic scanned bundle (page image, running header, body text and page footer) as a minimal PDF
+    
+    Objects are written one page at a time, so generating a large bundle needs little memory.
+    """
+    offsets = {}
+    scan = os.urandom(scan_kb * 1024)
+    with open(path, 'wb') as f:
+        def write_object(number, body):
+            offsets[number] = f.tell()
+            f.write(f"{number} 0 obj\n".encode('latin-1') + body + b"\nendobj\n")
+        f.write(b"%PDF-1.4\n")
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+        kids = []
+        for page_number in range(1, page_count + 1):
+            lines = ["Notariskantoor Benchmark - akte 2025/0001"]
+            lines += [f"Artikel {page_number}.{n} - de verkoper verklaart dat het goed vrij is van alle lasten en "
+                      f"hypotheken, kadastraal perceel {page_number * 100 + n}" for n in range(1, BENCHMARK_PAGE_LINES + 1)]
+            lines.append(f"Pagina {page_number} van {page_count}")
+            content = ("q 595 0 0 842 0 0 cm /Scan Do Q BT /F1 9 Tf 11 TL 40 800 Td "
+                       + " ".join(f"({line}) Tj T*" for line in lines) + " ET").encode('latin-1')
+            content_number, image_number, object_number = 1 + 3 * page_number, 2 + 3 * page_number, 3 + 3 * page_number
+            write_object(content_number, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+            write_object(image_number, b"<< /Type /XObject /Subtype /Image /Width 1024 /Height %d /ColorSpace /DeviceGray "
+                                       b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (scan_kb, len(scan)) + scan + b"\nendstream")
+            write_object(object_number, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << "
+                                        b"/Font << /F1 3 0 R >> /XObject << /Scan %d 0 R >> >> /Contents %d 0 R >>" % (image_number, content_number))
+            kids.append(object_number)
+        write_object(2, f"<< /Type /Pages /Count {page_count} /Kids [{' '.join(f'{n} 0 R' for n in kids)}] >>".encode('latin-1'))
+        xref_offset = f.tell()
+        size = max(offsets) + 1
+        f.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode('latin-1'))
+        for number in range(1, size):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode('latin-1'))
+
+def measure_ingestion(pdf_path, mode):
+    """Ingest one PDF in this process and report its peak RSS; run in a fresh process per measurement
+    
+    'stream' is the normal pipeline; 'memory' is the previous one, a single reader for the whole file
+    and every page collected in a list before normalization.
+    """
+    resource = lazy_import('resource')
+    lazy_import('PyPDF2')
+    # ru_maxrss is in KiB on Linux
+    baseline_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    reports = []
+    if mode == 'memory':
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = lazy_import('PyPDF2').PdfReader(file)
+            pages = [page.extract_text() or "" for page in pdf_reader.pages]
+            ingest_document(Path(pdf_path).name, pages, reports, pdf_path, 'pdf')
+    else:
+        ingest_document_file(Path(pdf_path).name, pdf_path, reports)
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'mode': mode, 'pages': reports[0]['pages'], 'pdf_mb': round(os.path.getsize(pdf_path) / 2**20, 1),
+        'characters': reports[0]['original_chars'], 'seconds': round(time.perf_counter() - start, 2),
+        'baseline_mb': round(baseline_kib / 1024, 1), 'peak_mb': round(peak_kib / 1024, 1),
+        'growth_mb': round((peak_kib - baseline_kib) / 1024, 1)
+    }
+
+def benchmark_ingestion(page_counts=BENCHMARK_PAGE_COUNTS, modes=('stream', 'memory'), scan_kb=BENCHMARK_SCAN_KB):
+    """Peak RSS of ingesting synthetic bundles of the given sizes, each in its own process"""
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, BLOB_STORE_DIR=str(Path(workdir) / 'blobs'))
+        for page_count in page_counts:
+            pdf_path = Path(workdir) / f"bundle-{page_count}.pdf"
+            write_benchmark_pdf(pdf_path, page_count, scan_kb)
+            for mode in modes:
+                completed = lazy_import('subprocess').run(
+                    [sys.executable, os.path.abspath(__file__), 'bench-ingest', '--measure', str(pdf_path), '--mode', mode],
+                    env=env, capture_output=True, text=True, check=True
+                )
+                results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return results
+
+def print_ingestion_benchmark(results):
+    print(f"{'pagina':>7} {'modus':>7} {'pdf MB':>7} {'karakters':>10} {'sec':>6} {'basis MB':>9} {'piek MB':>8} {'groei MB':>9}")
+    for row in results:
+        print(f"{row['pages']:>7} {row['mode']:>7} {row['pdf_mb']:>7.1f} {row['characters']:>10} {row['seconds']:>6.2f} "
+              f"{row['baseline_mb']:>9.1f} {row['peak_mb']:>8.1f} {row['growth_mb']:>9.1f}")
+
+def cli_main(argv):
+    """Command line entry point for headless processing"""
+    parser = argparse.ArgumentParser(
+        description="Notariële Clausule Processor - headless verwerking (start de UI met `streamlit run`)"
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    batch = subparsers.add_parser('batch', help="Verwerk één of meer dossiermappen zonder UI")
+    batch.add_argument('--clauses', required=True, help="Clausule CSV")
+    batch.add_argument('--dossier', action='append', default=[], help="Dossiermap met documenten en intake.json (herhaalbaar)")
+    batch.add_argument('--day', help="Throughput-modus: verwerk elke submap met een intake.json")
+    batch.add_argument('--intake', help="Intake JSON (standaard <dossier>/intake.json)")
+    batch.add_argument('--answers', help="Ingevulde open_questions.json (standaard <dossier>/answers.json)")
+    batch.add_argument('--out', default='batch_output', help="Uitvoermap")
+    batch.add_argument('--rows', help="Selectie van clausules, bv. 1-10,15")
+    batch.add_argument('--workers', type=int, help="Aantal parallelle clausules (standaard LLM_MAX_CONCURRENCY)")
+    batch.add_argument('--stub', action='store_true', help="Gebruik een offline stub in plaats van Gemini")
+    batch.add_argument('--stub-latency', type=float, default=0.0, help="Gesimuleerde latency per stub call (s)")
+    
+    serve = subparsers.add_parser('serve', help="Start de HTTP API")
+    serve.add_argument('--clauses', required=True, help="Clausule CSV")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--workers', type=int, help="Aantal parallelle workers (standaard LLM_MAX_CONCURRENCY)")
+    serve.add_argument('--stub', action='store_true', help="Gebruik een offline stub in plaats van Gemini")
+    serve.add_argument('--stub-latency', type=float, default=0.0, help="Gesimuleerde latency per stub call (s)")
+    
+    bench = subparsers.add_parser('bench-parties', help="Vergelijk prompttokens van de partij-encodings")
+    bench.add_argument('--parties', default=','.join(map(str, BENCHMARK_PARTY_COUNTS)), help="Aantallen partijen, bv. 1,5,20,50")
+    bench.add_argument('--live', action='store_true', help="Meet ook de latency van echte Gemini calls")
+    bench.add_argument('--repeat', type=int, default=1, help="Aantal calls per meting met --live")
+    
+    bench_ingest = subparsers.add_parser('bench-ingest', help="Meet het piekgeheugen (RSS) van het inladen van grote PDF-bundels")
+    bench_ingest.add_argument('--pages', default=','.join(map(str, BENCHMARK_PAGE_COUNTS)), help="Aantallen pagina's, bv. 10,100,1000")
+    bench_ingest.add_argument('--mode', choices=['stream', 'memory'], action='append', help="Enkel deze modus meten (herhaalbaar)")
+    bench_ingest.add_argument('--scan-kb', type=int, default=BENCHMARK_SCAN_KB, help="Grootte van de scan per pagina (KB)")
+    bench_ingest.add_argument('--measure', help=argparse.SUPPRESS)
+    
+    gc_blobs = subparsers.add_parser('gc-blobs', help="Verwijder blobs waar geen bewaard dossier of recente verwijzing naar wijst")
+    gc_blobs.add_argument('--min-age-days', type=float, default=7, help="Enkel blobs en verwijzingen ouder dan dit aantal dagen verwijderen")
+    gc_blobs.add_argument('--dry-run', action='store_true', help="Toon enkel wat verwijderd zou worden")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    
+    if args.command == 'bench-ingest':
+        if args.measure:
+            print(json.dumps(measure_ingestion(args.measure, (args.mode or ['stream'])[0])))
+        else:
+            print_ingestion_benchmark(benchmark_ingestion(
+                [int(n) for n in args.pages.split(',')], args.mode or ('stream', 'memory'), args.scan_kb
+            ))
+        return 0
+    
+    if args.command == 'gc-blobs':
+        stats = collect_blob_garbage(
+            get_blob_store(), get_dossier_store(), args.min_age_days * 86400, dry_run=args.dry_run
+        )
+        verb = "zou verwijderen" if args.dry_run else "verwijderd"
+        print(f"{stats['live']} blobs in gebruik • {verb}: {stats['blobs']} blobs ({stats['bytes'] / 1e6:.1f} MB), {stats['refs']} verwijzingen")
+        return 0
+    
+    if args.command == 'bench-parties':
+        if args.live and not configure_gemini():
+            parser.error("GEMINI_API_KEY ontbreekt voor --live")
+        results = benchmark_party_encodings(
+            [int(n) for n in args.parties.split(',')], get_gemini_model() if args.live else None, args.repeat
+        )
+        print_party_benchmark(results)
+        return 0
+    
+    if args.command == 'serve':
+        if not args.stub and not configure_gemini():
+            parser.error("GEMINI_API_KEY ontbreekt (of gebruik --stub)")
+        server = create_service_server(
+            args.host, args.port, args.clauses, workers=args.workers, stub=args.stub, stub_latency=args.stub_latency
+        )
+        print(f"API luistert op http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+    
+    folders = list(args.dossier)
+    if args.day:
+        folders += [path for path in sorted(Path(args.day).iterdir()) if (path / 'intake.json').exists()]
+    if not folders:
+        parser.error("geef minstens één --dossier of een --day map op")
+    if args.intake and len(folders) > 1:
+        parser.error("--intake kan enkel met één dossier gebruikt worden")
+    if not args.stub and not configure_gemini():
+        parser.error("GEMINI_API_KEY ontbreekt (of gebruik --stub)")
+    
+    summary = run_batch(
+        folders, args.clauses, args.out, workers=args.workers, rows=args.rows,
+        intake_path=args.intake, answers_path=args.answers, stub=args.stub, stub_latency=args.stub_latency
+    )
+    for dossier in summary['dossiers']:
+        if 'error' in dossier:
+            print(f"✗ {dossier['name']}: {dossier['error']}")
+        else:
+            print(f"✓ {dossier['name']}: {dossier['generated']} gegenereerd, {dossier['skipped']} overgeslagen, "
+                  f"{dossier['needs_answers']} wachten op antwoorden ({dossier['open_questions']} vragen), {dossier['errors']} fouten")
+    print(f"{summary['clauses']} clausules in {summary['seconds']}s • {summary['clauses_per_minute']} clausules/min • "
+          f"{summary['dossiers_per_hour']} dossiers/uur • {summary['llm_calls']} LLM calls")
+    return 1 if any('error' in d or d.get('errors') for d in summary['dossiers']) else 0
 
 # ============= STREAMLIT UI FUNCTIONS =============
 
@@ -1384,10 +5212,22 @@ def check_password():
         return True
 
 def main():
-# In your main() function:
+    st.set_page_config(
+        page_title=f"Notariële Clausule Processor v{APP_VERSION}",
+        page_icon="🏛️",
+        layout="wide",
+        initial_sidebar_state="expanded"
+    )
+    init_session_state()
+    
     if not check_password():
+        record_render_time()
         st.stop()  # Do not continue if check_password is not True
     
+    if not configure_gemini():
+        st.error("⚠️ GEMINI_API_KEY not found in environment variables!")
+        st.stop()
+    
     st.title(f"🏛️ Notariële Clausule Processor v{APP_VERSION}")
     st.markdown("Automatische verwerking van notariële clausules met AI")
     st.caption(f"Version: {APP_VERSION} - Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
@@ -1415,7 +5255,7 @@ def main():
         
         progress_items = [
             ("Intake compleet", bool(st.session_state.notarial_info)),
-            ("Documenten geladen", bool(st.session_state.source_content)),
+            ("Documenten geladen", bool(st.session_state.source_manifest)),
             ("CSV geüpload", st.session_state.csv_data is not None),
             (f"Clausules verwerkt ({len(st.session_state.processed_clauses)})", 
              len(st.session_state.processed_clauses) > 0)
@@ -1426,6 +5266,19 @@ def main():
                 st.success(f"✅ {item}")
             else:
                 st.info(f"⭕ {item}")
+        
+        # LLM usage for this session
+        if st.session_state.llm_call_log:
+            usage = summarize_llm_calls(st.session_state.llm_call_log)
+            st.divider()
+            st.subheader("📈 LLM Gebruik")
+            st.caption(f"{usage['calls']} calls • {usage['seconds']:.1f}s • "
+                       f"{usage['prompt_tokens']:,} prompt tokens • {usage['output_tokens']:,} output tokens")
+        
+        show_prefetch_stats()
+        
+        st.divider()
+        show_dossier_store()
     
     # Main content based on current step
     if st.session_state.current_step == 'intake':
@@ -1436,6 +5289,12 @@ def main():
         show_clause_processor()
     elif st.session_state.current_step == 'export':
         show_export_section()
+    
+    checkpoint_dossier()
+    
+    record_render_time()
+    with st.sidebar:
+        show_startup_report()
 
 def show_document_upload():
     """Show document upload section"""
@@ -1458,15 +5317,16 @@ def show_document_upload():
         
         if st.button("🔄 Documenten Verwerken", type="primary"):
             with st.spinner("Documenten worden verwerkt..."):
-                source_content = load_source_documents(uploaded_files)
-                st.session_state.source_content = source_content
+                reports = []
+                manifest = load_source_documents(uploaded_files, reports)
                 
                 # Add notarial info to source content
-                notarial_text = format_notarial_info_as_text(st.session_state.notarial_info)
-                st.session_state.source_content += notarial_text
+                manifest.append(put_text_blob(format_notarial_info_as_text(st.session_state.notarial_info)))
+                st.session_state.source_manifest = tuple(manifest)
+                st.session_state.source_normalization = reports
                 
                 st.success("✅ Documenten succesvol verwerkt!")
-                st.info(f"Totale content lengte: {len(st.session_state.source_content):,} karakters")
+                st.info(f"Totale content lengte: {len(get_source_content()):,} karakters")
                 
                 # Auto navigate to clauses
                 time.sleep(1)
@@ -1474,27 +5334,91 @@ def show_document_upload():
                 st.rerun()
     
     # Show sample of loaded content if available
-    if st.session_state.source_content:
+    if st.session_state.source_manifest:
+        show_normalization_report()
+        show_page_viewer()
         with st.expander("📋 Voorbeeld van geladen content"):
-            st.text(st.session_state.source_content[:1000] + "...")
+            st.text(get_source_content()[:1000] + "...")
+
+def show_normalization_report():
+    """Token reduction per document from stripping headers, footers and empty pages"""
+    reports = st.session_state.source_normalization
+    if not reports:
+        return
+    original = sum(r['original_tokens'] for r in reports)
+    normalized = sum(r['normalized_tokens'] for r in reports)
+    with st.expander(f"🧹 Opschoning: {original:,} → {normalized:,} tokens ({(1 - normalized / max(original, 1)):.0%} minder)"):
+        st.dataframe(lazy_import('pandas').DataFrame([{
+            'Document': r['document'],
+            'Type': DOCUMENT_TYPES.get(r.get('document_type'), {}).get('label', 'Overig'),
+            'Pagina\'s': r['pages'],
+            'Lege pagina\'s': r['empty_pages'],
+            'Verwijderde regels': r['removed_lines'],
+            'Tokens voor': r['original_tokens'],
+            'Tokens na': r['normalized_tokens'],
+            'Reductie': f"{(1 - r['normalized_tokens'] / max(r['original_tokens'], 1)):.0%}"
+        } for r in reports]), hide_index=True)
+
+def show_page_viewer():
+    """Resolve a character offset to its page and show the original text of any page"""
+    page_index = get_page_index(get_source_content())
+    documents = list(dict.fromkeys((entry['document'], entry['document_id']) for entry in page_index.entries))
+    if not documents:
+        return
+    with st.expander("📄 Pagina's bekijken"):
+        offset = st.number_input("Teken-offset in de documenten", min_value=0, value=0, step=1, key="page_lookup_offset")
+        entry = page_index.resolve(int(offset))
+        if entry:
+            original = resolve_original_offset(int(offset))
+            original_text = f", teken {original[1]:,} van de geëxtraheerde tekst" if original else ""
+            st.caption(f"Offset {int(offset):,} ligt in {page_index.label(int(offset))} (tekens {entry['start']:,}-{entry['end']:,}{original_text})")
+        else:
+            st.caption(f"Offset {int(offset):,} ligt buiten de documenten (notariële informatie)")
+        
+        # No widget keys: a new offset re-creates the widgets with the resolved page as default
+        default_document = next((i for i, doc in enumerate(documents) if entry and doc[1] == entry['document_id']), 0)
+        document = st.selectbox("Document", documents, index=default_document, format_func=lambda doc: doc[0])
+        page_map = get_page_map(document[1])
+        if not page_map:
+            st.info("Geen paginagegevens voor dit document (ingeladen vóór de pagina-index).")
+            return
+        default_page = entry['page'] if entry and entry['document_id'] == document[1] and entry['page'] else 1
+        page_number = st.number_input("Pagina", min_value=1, max_value=page_map['page_count'], value=default_page)
+        text = reextract_page(document[1], int(page_number))
+        st.text(text if text is not None else "Het originele bestand is niet beschikbaar.")
+
+def ensure_dossier_digest():
+    """Build the document digests once per source version, before any agent or prefetch runs"""
+    if not USE_DOCUMENT_DIGEST or st.session_state.get('digest_source_hash') == get_source_hash():
+        return
+    with st.spinner("Documentdigest wordt opgebouwd..."):
+        prepare_dossier_digest(get_source_content(), InstrumentedModel(get_gemini_model(), st.session_state.llm_call_log))
+    st.session_state.digest_source_hash = get_source_hash()
 
 def show_clause_processor():
     """Show clause processing section with full agent functionality"""
     st.header("📝 Clausules Verwerken")
     
-    if not st.session_state.source_content:
+    if not st.session_state.source_manifest:
         st.warning("⚠️ Upload eerst documenten voordat u clausules kunt verwerken.")
         if st.button("Ga naar Documenten"):
             st.session_state.current_step = 'documents'
             st.rerun()
         return
     
+    ensure_dossier_digest()
+    
     # Load CSV file
     csv_file = st.file_uploader("Upload clausule CSV bestand", type=['csv'])
     
     if csv_file:
-        df = pd.read_csv(csv_file)
-        st.session_state.csv_data = df
+        st.session_state.csv_data = lazy_import('pandas').read_csv(csv_file)
+    
+    # A resumed dossier keeps its clause CSV without uploading it again
+    df = st.session_state.csv_data
+    if df is not None:
+        if not csv_file:
+            st.caption(f"📄 Clausule CSV uit het dossier ({len(df)} clausules)")
         
         # Show available clauses
         st.subheader("Beschikbare Clausules")
@@ -1506,7 +5430,7 @@ def show_clause_processor():
             display_name = clause_name.replace('_CLAUSULE', '').replace('_', ' ').title()
             
             # Mark essential clauses
-            if (i+1) in ESSENTIAL_CLAUSES:
+            if is_essential_clause(df, i + 1):
                 display_name += " ⭐ (Essentieel)"
             
             clause_options.append((i+1, display_name))
@@ -1516,7 +5440,43 @@ def show_clause_processor():
             options=clause_options,
             format_func=lambda x: f"{x[0]}. {x[1]}"
         )
+
+        # Optional processing order used by the prefetcher
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.multiselect(
+                "📋 Wachtrij (optioneel, anders CSV-volgorde)",
+                options=clause_options,
+                format_func=lambda x: f"{x[0]}. {x[1]}",
+                key="clause_queue"
+            )
+        with col2:
+            st.number_input("⏩ Prefetch diepte", min_value=0, max_value=5, value=PREFETCH_DEPTH, key="prefetch_depth")
+
+        # Overview of the evidence found for Category 1a clauses
+        with st.expander("🔎 Bewijskaart Categorie 1a clausules", expanded=False):
+            evidence_map = get_dossier_evidence_map()
+            for clause_number, evidence in evidence_map.items():
+                if evidence['hits']:
+                    terms = sorted({hit['term'] for hit in evidence['hits']})
+                    st.write(f"**{clause_number}. {evidence['label']}:** {len(evidence['hits'])} treffer(s) — {', '.join(terms)}")
+                elif clause_number in ESSENTIAL_CLAUSES:
+                    st.write(f"{clause_number}. {evidence['label']}: geen bewijs (essentiële clausule, blijft behouden)")
+                else:
+                    st.write(f"{clause_number}. {evidence['label']}: geen bewijs → wordt automatisch overgeslagen")
+
+        # Optional fused review-and-search mode
+        st.checkbox(
+            "⚡ Gecombineerde Review & Search (één call i.p.v. review + zoekactie per ontbrekend item)",
+            key="fused_review_mode"
+        )
         
+        # Evaluate all non-essential clauses at once instead of one call per clause
+        if st.button("⚡ Batch toepasbaarheidscontrole (alle niet-essentiële clausules)"):
+            with st.spinner("⚖️ Alle niet-essentiële clausules worden in één keer beoordeeld..."):
+                run_batch_applicability(df)
+        show_batch_applicability_comparison()
+
         if st.button("🚀 Start Clausule Verwerking", type="primary"):
             row_number = selected_clause[0]
             clause_name = selected_clause[1]
@@ -1530,22 +5490,348 @@ def show_clause_processor():
                 'review_result': None,
                 'user_decision': None,
                 'questions': [],
-                'current_question_index': 0
+                'log_start': len(st.session_state.llm_call_log)
             }
+            
+            # Continue from the background prefetch when it is available
+            prefetched = take_prefetched_clause(row_number)
+            if prefetched:
+                st.session_state.processing_state['prefetched'] = prefetched
+                if is_essential_clause(st.session_state.csv_data, row_number) and prefetched['research_data']:
+                    st.session_state.processing_state.update({
+                        'user_decision': 'apply',
+                        'research_data': prefetched['research_data'],
+                        'stage': 'review'
+                    })
             st.rerun()
     
     # Handle ongoing processing
     if 'processing_state' in st.session_state and st.session_state.processing_state:
         process_clause_workflow()
     
+    # Questions of parked clauses, answered in one batch
+    show_deferred_questions()
+    
     # Show processed clauses
     if st.session_state.processed_clauses:
         st.divider()
         st.subheader("🗂️ Verwerkte Clausules")
+        show_incremental_recompute()
         for clause_name, content in st.session_state.processed_clauses.items():
             with st.expander(f"📄 {clause_name}"):
                 st.text_area("", value=content, height=200, key=f"processed_{clause_name}")
 
+def get_applicability_context_hash():
+    """Hash of everything the applicability agents look at, used to invalidate batch results"""
+    return compute_content_hash(get_source_hash() + format_klantinfo_text(st.session_state.notarial_info))
+
+def run_batch_applicability(df):
+    """Evaluate all non-essential clauses of the CSV in one (chunked) batch call"""
+    evidence_map = get_dossier_evidence_map()
+    decisions = {}
+    batch_clauses = []
+    
+    for i, row in df.iterrows():
+        row_number = i + 1
+        if is_essential_clause(df, row_number):
+            continue
+        # Category 1a clauses without evidence are decided locally
+        evidence = get_clause_evidence(evidence_map, df, row_number)
+        if evidence and not evidence['hits']:
+            decisions[row_number] = {
+                'may_skip': True,
+                'analysis': f"FINALE BESLISSING: JA\n\nREDENERING:\nGeen bewijs voor {evidence['label']} gevonden in het dossier (Categorie 1a).",
+                'reasoning': 'Geen bewijs gevonden door lokale scanner'
+            }
+            continue
+        batch_clauses.append({
+            'row_number': row_number,
+            'clause_number': get_clause_number(df, row_number),
+            'clause_type': row.get('clause', ''),
+            'prompt': row['optimized_prompt']
+        })
+    
+    call_log = st.session_state.llm_call_log
+    log_start = len(call_log)
+    model = InstrumentedModel(get_gemini_model(), call_log).for_agent('applicability_batch')
+    
+    local_skips = len(decisions)
+    start_time = time.time()
+    if batch_clauses:
+        decisions.update(check_clauses_applicability_batch(
+            batch_clauses,
+            get_source_content(),
+            st.session_state.notarial_info,
+            model,
+            evidence_map=evidence_map
+        ))
+    batch_seconds = time.time() - start_time
+    batch_usage = summarize_llm_calls(call_log[log_start:])
+    
+    # What the per-clause path would have sent for the same clauses
+    per_clause_prompt_tokens = sum(
+        estimate_tokens(build_applicability_prompt(
+            clause['prompt'],
+            get_source_content(),
+            st.session_state.notarial_info,
+            evidence_map.get(clause['clause_number'])
+        ))
+        for clause in batch_clauses
+    )
+    
+    st.session_state.batch_applicability = {
+        'context_hash': get_applicability_context_hash(),
+        'decisions': decisions,
+        'stats': {
+            'llm_clauses': len(batch_clauses),
+            'local_skips': local_skips,
+            'batch_calls': batch_usage['calls'],
+            'batch_seconds': batch_seconds,
+            'batch_prompt_tokens': batch_usage['prompt_tokens'],
+            'per_clause_prompt_tokens': per_clause_prompt_tokens
+        }
+    }
+
+def get_batch_applicability_decision(row_number):
+    """Return the batch decision for a clause if it is still valid for the current dossier"""
+    batch = st.session_state.get('batch_applicability')
+    if not batch or batch['context_hash'] != get_applicability_context_hash():
+        return None
+    return batch['decisions'].get(row_number)
+
+def show_batch_applicability_comparison():
+    """Show the batch decisions and compare latency/tokens against the per-clause path"""
+    batch = st.session_state.get('batch_applicability')
+    if not batch:
+        return
+    
+    stats = batch['stats']
+    per_clause = summarize_llm_calls(st.session_state.llm_call_log, agent='applicability')
+    if per_clause['calls']:
+        avg_seconds = per_clause['seconds'] / per_clause['calls']
+        per_clause_latency = f"{avg_seconds * stats['llm_clauses']:.1f}s (gemeten gem. {avg_seconds:.1f}s × {stats['llm_clauses']})"
+    else:
+        per_clause_latency = "n.v.t. (nog geen per-clausule metingen)"
+    
+    with st.expander(f"⚡ Batch toepasbaarheid ({len(batch['decisions'])} clausules)", expanded=False):
+        comparison = lazy_import('pandas').DataFrame([
+            {
+                'Pad': 'Per clausule',
+                'LLM calls': stats['llm_clauses'],
+                'Prompt tokens': stats['per_clause_prompt_tokens'],
+                'Latency': per_clause_latency
+            },
+            {
+                'Pad': 'Batch',
+                'LLM calls': stats['batch_calls'],
+                'Prompt tokens': stats['batch_prompt_tokens'],
+                'Latency': f"{stats['batch_seconds']:.1f}s"
+            }
+        ])
+        st.table(comparison)
+        st.caption(f"{stats['local_skips']} clausule(s) lokaal overgeslagen zonder LLM call")
+        
+        for row_number, decision in sorted(batch['decisions'].items()):
+            label = "🚫 Skip" if decision['may_skip'] else "✅ Keep"
+            st.write(f"**{row_number}.** {label} — {decision['reasoning'][:200]}")
+
+def render_question_form(questions, form_key):
+    """Show all questions in one form; returns the answers after a complete submission, else None"""
+    with st.form(form_key):
+        raw_answers = []
+        for idx, q in enumerate(questions):
+            label = f"**{q['missing_info']}**"
+            if q.get('clause_type'):
+                label += f" — _{q['clause_type']}_"
+            st.warning(label)
+            st.write(q['question'])
+            
+            options = q.get('options', [])
+            if options:
+                selected_option = st.radio("Selecteer een optie:", options, key=f"{form_key}_q_{idx}")
+                custom_answer = ""
+                if any("anders" in option.lower() for option in options):
+                    custom_answer = st.text_input("Specificeer (bij 'Anders'):", key=f"{form_key}_custom_{idx}")
+                raw_answers.append((selected_option, custom_answer))
+            else:
+                raw_answers.append((st.text_input("Uw antwoord:", key=f"{form_key}_text_{idx}"), ""))
+            st.divider()
+        
+        submitted = st.form_submit_button("💾 Alle antwoorden opslaan", type="primary")
+    
+    if not submitted:
+        return None
+    
+    answers, unanswered = [], []
+    for q, (selected_option, custom_answer) in zip(questions, raw_answers):
+        answer = selected_option
+        if selected_option and "anders" in selected_option.lower() and custom_answer:
+            answer = custom_answer
+        if not answer:
+            unanswered.append(q['missing_info'])
+        answers.append(answer)
+    
+    if unanswered:
+        st.error(f"❌ Nog niet beantwoord: {', '.join(unanswered)}")
+        return None
+    return answers
+
+def show_deferred_questions():
+    """Show the questions of all parked clauses in one batch form and let the user resume them"""
+    deferred = st.session_state.deferred_clauses
+    if not deferred:
+        return
+    
+    st.divider()
+    st.subheader(f"📝 Geparkeerde Clausules ({len(deferred)})")
+    
+    # Group identical questions over clauses so each is asked only once
+    grouped = {}
+    for row_number, clause_state in deferred.items():
+        if clause_state['stage'] != 'questions':
+            continue
+        for q in clause_state['questions']:
+            grouped.setdefault(normalize_info_key(q['missing_info']), {'question': q, 'rows': []})['rows'].append(row_number)
+    
+    if grouped:
+        batch_questions = [group['question'] for group in grouped.values()]
+        answers = render_question_form(batch_questions, "deferred_questions")
+        if answers:
+            for group, answer in zip(grouped.values(), answers):
+                for row_number in group['rows']:
+                    q = group['question']
+                    store_user_answer(
+                        st.session_state.notarial_info, deferred[row_number]['clause_type'],
+                        q['missing_info'], q['question'], answer, "manual_input", options=q.get('options', [])
+                    )
+            for row_number in {row for group in grouped.values() for row in group['rows']}:
+                deferred[row_number]['questions'] = []
+                deferred[row_number]['stage'] = 'generation'
+            st.rerun()
+    
+    for row_number, clause_state in list(deferred.items()):
+        status = "klaar voor generatie" if clause_state['stage'] == 'generation' else f"{len(clause_state['questions'])} open vraag/vragen"
+        if st.button(f"▶️ {clause_state['clause_name']} hervatten ({status})", key=f"resume_{row_number}",
+                     disabled=bool(st.session_state.processing_state)):
+            st.session_state.processing_state = deferred.pop(row_number)
+            st.rerun()
+
+def recompute_changed_clauses():
+    """Regenerate only the processed clauses whose recorded inputs changed; returns a report"""
+    report = {'recomputed': [], 'reused': [], 'edited': [], 'advice': []}
+    df = st.session_state.csv_data
+    
+    for clause_name, record in st.session_state.clause_fingerprints.items():
+        row = df.iloc[record['row_number'] - 1]
+        clause_type, prompt, skip_conditions = get_clause_inputs(row)
+        source_content = get_clause_source_content(row)
+        changes = find_changed_inputs(
+            record['fingerprint'], prompt, clause_type,
+            st.session_state.notarial_info, source_content
+        )
+        if not changes:
+            report['reused'].append(clause_name)
+            continue
+        if record['edited']:
+            # Never overwrite manual edits without the notary
+            report['edited'].append((clause_name, [description for _, description in changes]))
+            continue
+        
+        model = InstrumentedModel(
+            get_gemini_model(),
+            st.session_state.llm_call_log,
+            clause=record['row_number']
+        )
+        kinds = {kind for kind, _ in changes}
+        
+        # Changed intake facts may change whether a non-essential clause applies; only advise
+        if 'fact' in kinds and not is_essential_clause(st.session_state.csv_data, record['row_number']):
+            may_skip, _ = check_clause_applicability(
+                prompt, clause_type, skip_conditions, source_content,
+                st.session_state.notarial_info, model.for_agent('applicability')
+            )
+            if may_skip:
+                report['advice'].append(clause_name)
+        
+        research_data = get_json_blob(record['research_hash'])
+        if kinds & {'prompt', 'document'}:
+            research_data = research_agent_determine_needs(
+                prompt, clause_type, source_content, model.for_agent('research')
+            )
+        
+        clause_user_answers = {
+            key: value for key, value in st.session_state.notarial_info.get('user_answers', {}).items()
+            if key.startswith(f"{clause_type}_")
+        }
+        complete_info = create_complete_information_set(research_data, clause_user_answers)
+        final_clause = generate_final_clause(
+            prompt, complete_info, research_data, source_content, model.for_agent('generation'),
+            st.session_state.notarial_info
+        )
+        
+        st.session_state.processed_clauses[clause_name] = final_clause
+        record['research_hash'] = put_json_blob(research_data)
+        record['fingerprint'] = compute_clause_fingerprint(
+            prompt, clause_type, final_clause, research_data,
+            st.session_state.notarial_info, source_content
+        )
+        report['recomputed'].append((clause_name, [description for _, description in changes]))
+    
+    return report
+
+def show_incremental_recompute():
+    """Button and report for regenerating the clauses whose intake facts, documents or prompt changed"""
+    if not st.session_state.clause_fingerprints or st.session_state.csv_data is None:
+        return
+    
+    if st.button("🔁 Gewijzigde clausules herberekenen", disabled=bool(st.session_state.processing_state)):
+        with st.spinner("🔁 Clausules met gewijzigde invoer worden opnieuw gegenereerd..."):
+            st.session_state.last_recompute_report = recompute_changed_clauses()
+    
+    report = st.session_state.get('last_recompute_report')
+    if report:
+        with st.expander(f"🔁 Herberekening: {len(report['recomputed'])} opnieuw, {len(report['reused'])} hergebruikt", expanded=True):
+            for clause_name, reasons in report['recomputed']:
+                st.write(f"🔄 **{clause_name}:** {'; '.join(reasons)}")
+            for clause_name, reasons in report['edited']:
+                st.warning(f"✏️ {clause_name} is handmatig bewerkt en niet herberekend ({'; '.join(reasons)})")
+            for clause_name in report['advice']:
+                st.info(f"⚖️ {clause_name} mag volgens de nieuwe gegevens mogelijk overgeslagen worden")
+            if report['reused']:
+                st.caption(f"♻️ Ongewijzigd hergebruikt: {', '.join(report['reused'])}")
+
+def show_clause_call_report(state):
+    """Report the LLM calls and latency of this clause, comparing the review/search stage with the chained path"""
+    clause_log = st.session_state.llm_call_log[state.get('log_start', 0):]
+    if not clause_log:
+        return
+    
+    with st.expander("📈 LLM Calls voor deze clausule", expanded=False):
+        per_agent = {}
+        for entry in clause_log:
+            per_agent.setdefault(entry['agent'], []).append(entry['seconds'])
+        st.table(lazy_import('pandas').DataFrame([
+            {'Agent': agent, 'Calls': len(times), 'Latency (s)': round(sum(times), 2)}
+            for agent, times in per_agent.items()
+        ]))
+        total = summarize_llm_calls(clause_log)
+        st.caption(f"Totaal: {total['calls']} calls • {total['seconds']:.1f}s")
+        
+        # Compare the fused stage with what the review + focused search chain would have cost
+        if 'review_search' in per_agent:
+            review_result = state.get('review_result') or {}
+            chained_calls = 1 + len(review_result.get('resolved_items', {})) + len(review_result.get('critical_missing', []))
+            review_stats = summarize_llm_calls(st.session_state.llm_call_log, agent='review')
+            search_stats = summarize_llm_calls(st.session_state.llm_call_log, agent='focused_search')
+            if review_stats['calls'] and search_stats['calls']:
+                chained_seconds = (review_stats['seconds'] / review_stats['calls']
+                                   + (chained_calls - 1) * search_stats['seconds'] / search_stats['calls'])
+                chained_latency = f"~{chained_seconds:.1f}s (op basis van gemeten gemiddelden)"
+            else:
+                chained_latency = "n.v.t. (nog geen metingen van de keten)"
+            st.write(f"**Gecombineerd:** {len(per_agent['review_search'])} call(s), {sum(per_agent['review_search']):.1f}s")
+            st.write(f"**Huidige keten (review + focused search):** {chained_calls} calls, {chained_latency}")
+
 def process_clause_workflow():
     """Handle the multi-stage clause processing workflow with enhanced agent feedback display"""
     state = st.session_state.processing_state
@@ -1553,35 +5839,36 @@ def process_clause_workflow():
     if not state:
         return
     
+    # Checkpoint the results of the previous stage before the next agent runs
+    checkpoint_dossier()
+    
     # Get the row data
     row_idx = state['row_number'] - 1
     row = st.session_state.csv_data.iloc[row_idx]
-    clause_type = row.get('clause', '')
-    prompt = row['optimized_prompt']
-    
-    # Get skip conditions
-    skip_conditions = ""
-    if len(row) > 3:
-        skip_conditions = row.iloc[3] if pd.notna(row.iloc[3]) else ""
-    elif 'skip_conditions' in row:
-        skip_conditions = row.get('skip_conditions', '')
+    clause_type, prompt, skip_conditions = get_clause_inputs(row)
+    source_content = get_clause_source_content(row)
     
     # Initialize model with correct version
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
+    model = InstrumentedModel(
+        get_gemini_model(),
+        st.session_state.llm_call_log,
+        clause=state['row_number']
+    )
     
     # Add debug console at the top of processing
     with st.expander("🔧 Debug Console", expanded=True):
         st.caption(f"Current Stage: {state['stage']}")
         st.caption(f"Clause: {state['clause_name']} (#{state['row_number']})")
+        document_types = get_clause_document_types(row)
+        if document_types:
+            st.caption(f"Document types: {', '.join(sorted(document_types))} ({len(source_content):,} tekens)")
         st.caption(f"Processing started at: {datetime.now().strftime('%H:%M:%S')}")
     
     # Stage 1: Applicability Check
     if state['stage'] == 'applicability':
         st.info(f"🤖 Verwerking van: **{state['clause_name']}**")
         
-        is_essential_clause = state['row_number'] in ESSENTIAL_CLAUSES
-        
-        if is_essential_clause:
+        if is_essential_clause(st.session_state.csv_data, state['row_number']):
             st.success("✅ ESSENTIËLE CLAUSULE - wordt altijd toegepast")
             
             # Log to debug console
@@ -1598,20 +5885,61 @@ REASON: Clause is in ESSENTIAL_CLAUSES list
             state['stage'] = 'research'
             st.rerun()
         else:
-            with st.spinner("⚖️ Controleren of clausule van toepassing is..."):
-                start_time = time.time()
-                may_skip, analysis = check_clause_applicability(
-                    prompt, clause_type, skip_conditions, 
-                    st.session_state.source_content, 
-                    st.session_state.notarial_info, 
-                    model
-                )
-                execution_time = time.time() - start_time
+            # Category 1a clauses without any evidence in the dossier are skipped without an LLM call
+            evidence = None
+            evidence = get_clause_evidence(get_dossier_evidence_map(), st.session_state.csv_data, state['row_number'])
+            if evidence is not None:
+                if not evidence['hits']:
+                    with st.expander("🔍 Applicability Agent Log", expanded=True):
+                        st.code(f"""
+AGENT: Evidence Scanner
+TIME: {datetime.now().strftime('%H:%M:%S')}
+DECISION: Auto-skip (Category 1a, no evidence)
+CLAUSE NUMBER: {state['row_number']}
+REASON: No evidence terms for {evidence['label']} found in the full dossier
+                        """)
+                    
+                    state['user_decision'] = 'skip'
+                    state['skip_reason'] = f"Geen bewijs voor {evidence['label']} gevonden in het dossier (Categorie 1a)"
+                    state['stage'] = 'complete'
+                    st.rerun()
+            
+            # Reuse the decision of a prefetch or a batch applicability run when available
+            prefetched = state.get('prefetched')
+            batch_decision = get_batch_applicability_decision(state['row_number'])
+            if prefetched and prefetched['analysis']:
+                batch_decision = {'may_skip': prefetched['may_skip'], 'analysis': prefetched['analysis']}
+            if batch_decision:
+                may_skip, analysis = batch_decision['may_skip'], batch_decision['analysis']
+                execution_time = 0.0
+            else:
+                with st.spinner("⚖️ Controleren of clausule van toepassing is..."):
+                    start_time = time.time()
+                    may_skip, analysis = check_clause_applicability(
+                        prompt, clause_type, skip_conditions, 
+                        source_content, 
+                        st.session_state.notarial_info, 
+                        model.for_agent('applicability'),
+                        evidence=evidence
+                    )
+                    execution_time = time.time() - start_time
+            
+            # Show the passages that triggered the LLM check
+            if evidence:
+                with st.expander(f"🔎 Bewijsfragmenten ({len(evidence['hits'])} treffers)", expanded=False):
+                    for passage in evidence['passages']:
+                        st.caption(f"Trefwoorden: {', '.join(passage['terms'])}")
+                        st.text(passage['text'])
             
             # Enhanced display with agent raw response
             with st.expander("🔍 APPLICABILITY AGENT - Raw Response", expanded=True):
                 st.code(analysis)
-                st.caption(f"⏱️ Execution time: {execution_time:.2f} seconds")
+                if prefetched and prefetched['analysis']:
+                    st.caption("⏩ Beslissing uit prefetch (berekend tijdens de vorige clausule)")
+                elif batch_decision:
+                    st.caption("⚡ Beslissing uit batch toepasbaarheidscontrole (geen extra LLM call)")
+                else:
+                    st.caption(f"⏱️ Execution time: {execution_time:.2f} seconds")
             
             # Show detailed analysis in structured format
             st.subheader("⚖️ Applicability Agent Analyse")
@@ -1641,6 +5969,7 @@ REASON: Clause is in ESSENTIAL_CLAUSES list
                 # Agent decision summary
                 st.metric("AI Advies", "Skip" if may_skip else "Keep")
             
+            schedule_prefetch(state['row_number'])
             st.warning(f"De AI adviseert: {'Clausule MAG verwijderd worden' if may_skip else 'Clausule MOET behouden blijven'}")
             
             col1, col2 = st.columns(2)
@@ -1659,13 +5988,19 @@ REASON: Clause is in ESSENTIAL_CLAUSES list
     elif state['stage'] == 'research':
         st.header("🔬 RESEARCH AGENT")
         
-        with st.spinner("🔬 Research Agent analyseert informatie behoeften..."):
-            start_time = time.time()
-            research_data = research_agent_determine_needs(
-                prompt, clause_type, st.session_state.source_content, model
-            )
-            execution_time = time.time() - start_time
-            state['research_data'] = research_data
+        prefetched = state.get('prefetched')
+        if prefetched and prefetched['research_data']:
+            research_data = prefetched['research_data']
+            execution_time = 0.0
+            st.caption(f"⏩ Research uit prefetch (berekend op de achtergrond in {prefetched['seconds']:.1f}s)")
+        else:
+            with st.spinner("🔬 Research Agent analyseert informatie behoeften..."):
+                start_time = time.time()
+                research_data = research_agent_determine_needs(
+                    prompt, clause_type, source_content, model.for_agent('research')
+                )
+                execution_time = time.time() - start_time
+        state['research_data'] = research_data
         
         # Show raw research data for debugging
         with st.expander("🔍 RESEARCH AGENT - Raw JSON Response", expanded=True):
@@ -1718,6 +6053,19 @@ RESEARCH SUMMARY:
                             st.write(f"**{key}:** `{info['value']}`")
                             if info.get('source_quote'):
                                 st.caption(f"📖 Bron: \"{info['source_quote'][:150]}...\"")
+                                verification = info.get('quote_verification')
+                                if verification and verification['status'] == 'unverified':
+                                    st.caption("⚠️ Citaat niet teruggevonden in de documenten - confidence verlaagd naar LOW")
+                                elif verification and verification['status'] == 'partial':
+                                    st.caption(f"⚠️ Citaat slechts gedeeltelijk teruggevonden ({verification['coverage']:.0%}) - confidence verlaagd naar LOW")
+                                elif verification and not verification.get('value_found', True):
+                                    st.caption("⚠️ De waarde staat niet in het geciteerde fragment - confidence verlaagd naar LOW")
+                                elif verification:
+                                    page = f", p. {verification['page']}" if verification.get('page') else ""
+                                    st.caption(f"🔎 Citaat geverifieerd in {verification.get('document') or 'notariële informatie'}{page} "
+                                               f"(tekens {verification['start']}-{verification['end']})")
+                            elif info.get('quote_verification', {}).get('status') == 'missing':
+                                st.caption("⚠️ Geen broncitaat opgegeven - confidence verlaagd naar LOW")
                         with col2:
                             confidence_color = {"HIGH": "🟢", "MEDIUM": "🟡", "LOW": "🔴"}.get(info['confidence'], "⚪")
                             st.write(f"{confidence_color} {info['confidence']}")
@@ -1741,13 +6089,44 @@ RESEARCH SUMMARY:
     elif state['stage'] == 'review':
         st.header("📋 REVIEW AGENT")
         
-        with st.spinner("📋 Review Agent bepaalt wat nog nodig is..."):
-            start_time = time.time()
-            review_result = review_agent_check(
-                prompt, state['research_data'], clause_type, model
-            )
-            execution_time = time.time() - start_time
-            state['review_result'] = review_result
+        if st.session_state.get('fused_review_mode'):
+            # One call reviews the research and resolves all missing items together
+            with st.spinner("📋 Review & Search Agent bepaalt en zoekt wat nog nodig is..."):
+                start_time = time.time()
+                review_result = review_and_search_agent(
+                    prompt, state['research_data'], clause_type,
+                    source_content,
+                    st.session_state.notarial_info,
+                    model.for_agent('review_search')
+                )
+                execution_time = time.time() - start_time
+                state['review_result'] = review_result
+            
+            resolved = {
+                missing: item for missing, item in review_result.get('resolved_items', {}).items()
+                if isinstance(item, dict) and item.get('found') and item.get('value')
+            }
+            for missing, item in resolved.items():
+                store_user_answer(
+                    st.session_state.notarial_info, clause_type, missing,
+                    f"(automatisch opgelost) {missing}", str(item['value']), "fused_search",
+                    confidence=item.get('confidence', 'HIGH')
+                )
+            if resolved:
+                with st.expander(f"✅ Automatisch opgelost ({len(resolved)})", expanded=True):
+                    for missing, item in resolved.items():
+                        st.write(f"• **{missing}:** `{item['value']}` ({item.get('location', 'N/A')})")
+            
+            # The remaining questions were already searched in the fused call
+            state['questions_presearched'] = True
+        else:
+            with st.spinner("📋 Review Agent bepaalt wat nog nodig is..."):
+                start_time = time.time()
+                review_result = review_agent_check(
+                    prompt, state['research_data'], clause_type, model.for_agent('review')
+                )
+                execution_time = time.time() - start_time
+                state['review_result'] = review_result
         
         # Show raw review data
         with st.expander("🔍 REVIEW AGENT - Raw JSON Response", expanded=True):
@@ -1814,7 +6193,6 @@ ANALYSIS:
                         st.divider()
             
             state['questions'] = review_result.get('questions_for_user', [])
-            state['current_question_index'] = 0
             state['stage'] = 'questions'
         else:
             st.success("✅ Alle benodigde informatie is beschikbaar!")
@@ -1825,121 +6203,100 @@ ANALYSIS:
     
     # Stage 4: Questions with enhanced search feedback
     elif state['stage'] == 'questions':
-        if state['current_question_index'] < len(state['questions']):
-            current_q = state['questions'][state['current_question_index']]
-            
-            st.subheader(f"❓ Vraag {state['current_question_index'] + 1} van {len(state['questions'])}")
-            
-            # Show what we're looking for
-            st.info(f"🔍 Looking for: **{current_q['missing_info']}**")
-            
-            # Try focused search first
-            with st.spinner(f"🔍 Zoeken naar: {current_q['missing_info']}..."):
+        # Questions answered earlier in this dossier are not asked (or searched) again
+        if not state.get('questions_deduplicated'):
+            state['questions'], state['reused_answers'] = dedupe_questions(
+                state['questions'], clause_type, st.session_state.notarial_info
+            )
+            state['questions_deduplicated'] = True
+        
+        if state.get('reused_answers'):
+            with st.expander(f"♻️ Eerder beantwoord ({len(state['reused_answers'])})", expanded=False):
+                for q, existing in state['reused_answers']:
+                    st.write(f"• **{q['missing_info']}:** {existing['answer']} (uit {existing.get('clause_type', 'eerdere vraag')})")
+                    st.caption(f"Eerdere vraag: {existing.get('question', '')}")
+                if st.button("↩️ Deze vragen toch opnieuw stellen"):
+                    state['questions'] = state['questions'] + [q for q, _ in state['reused_answers']]
+                    state['reused_answers'] = []
+                    st.rerun()
+        
+        # Search every missing item at once before asking the user anything
+        if not state.get('questions_presearched'):
+            missing_items = [q['missing_info'] for q in state['questions']]
+            with st.spinner(f"🔍 Zoeken naar {len(missing_items)} ontbrekende item(s) tegelijk..."):
                 start_time = time.time()
-                focused_result = focused_search_for_missing_info(
-                    current_q['missing_info'], 
-                    st.session_state.source_content,
+                search_results = search_missing_items_parallel(
+                    missing_items,
+                    source_content,
                     st.session_state.notarial_info,
-                    model
+                    get_dossier_identifiers(),
+                    model.for_agent('focused_search')
                 )
                 execution_time = time.time() - start_time
             
-            # Show focused search results
-            with st.expander("🔍 FOCUSED SEARCH - Results", expanded=True):
-                if focused_result:
-                    st.json(focused_result)
-                    st.caption(f"⏱️ Search time: {execution_time:.2f} seconds")
-                    
-                    # Log search details
-                    st.code(f"""
-SEARCH TARGET: {current_q['missing_info']}
-FOUND IN: {focused_result.get('found_in', 'not_found')}
-SEARCH NOTES: {focused_result.get('search_notes', 'No notes')}
-                    """)
-                else:
-                    st.error("Search failed - no results")
+            # Merge everything that was found into the answers in one update
+            resolved = set()
+            for q in state['questions']:
+                item_data = get_found_item(search_results.get(q['missing_info']))
+                if item_data:
+                    store_user_answer(
+                        st.session_state.notarial_info, clause_type,
+                        q['missing_info'], q['question'],
+                        str(item_data['value']), "focused_search",
+                        confidence=item_data.get('confidence', 'HIGH')
+                    )
+                    resolved.add(q['missing_info'])
             
-            found_automatically = False
-            if focused_result and focused_result.get('found_items'):
-                for item_key, item_data in focused_result['found_items'].items():
-                    if item_data.get('found') and item_data.get('value'):
-                        st.success(f"✅ Automatisch gevonden: **{item_data['value']}**")
-                        
-                        with st.expander("📍 Found Context", expanded=False):
-                            st.write(f"**Location:** {item_data.get('location', 'N/A')}")
-                            st.write(f"**Context:** {item_data.get('context', 'N/A')}")
-                            st.write(f"**Confidence:** {item_data.get('confidence', 'N/A')}")
-                        
-                        # Store the answer
-                        answer_key = f"{clause_type}_{current_q['missing_info']}"
-                        if 'user_answers' not in st.session_state.notarial_info:
-                            st.session_state.notarial_info['user_answers'] = {}
-                        
-                        st.session_state.notarial_info['user_answers'][answer_key] = {
-                            "question": current_q['question'],
-                            "answer": str(item_data['value']),
-                            "missing_info": current_q['missing_info'],
-                            "clause_type": clause_type,
-                            "source": "focused_search",
-                            "confidence": item_data.get('confidence', 'HIGH')
-                        }
-                        
-                        found_automatically = True
-                        state['current_question_index'] += 1
-                        time.sleep(1)  # Show result briefly
-                        st.rerun()
+            state['search_results'] = search_results
+            state['search_time'] = execution_time
+            state['questions'] = [q for q in state['questions'] if q['missing_info'] not in resolved]
+            state['questions_presearched'] = True
+        
+        # Show focused search results
+        if state.get('search_results'):
+            with st.expander(f"🔍 FOCUSED SEARCH - Results ({len(state['search_results'])} items)", expanded=False):
+                st.caption(f"⏱️ Search time (parallel): {state['search_time']:.2f} seconds")
+                for missing_info, result in state['search_results'].items():
+                    item_data = get_found_item(result)
+                    if item_data:
+                        st.success(f"✅ {missing_info}: **{item_data['value']}**")
+                        st.caption(f"Location: {item_data.get('location', 'N/A')} • Confidence: {item_data.get('confidence', 'N/A')}")
+                    else:
+                        st.info(f"❓ {missing_info}: niet gevonden")
+                    if result:
+                        st.code(f"""
+SEARCH TARGET: {missing_info}
+FOUND IN: {result.get('found_in', 'not_found')}
+SEARCH NOTES: {result.get('search_notes', 'No notes')}
+                        """)
+        
+        if state['questions']:
+            # Use the time the notary spends answering to prepare the next clauses
+            schedule_prefetch(state['row_number'])
+            st.subheader(f"❓ {len(state['questions'])} open vra(a)g(en)")
+            st.info("🔍 Automatisch zoeken leverde geen resultaat op. Handmatige invoer vereist.")
             
-            if not found_automatically:
-                # Show search attempted but failed
-                st.info("🔍 Automatisch zoeken leverde geen resultaat op. Handmatige invoer vereist.")
-                
-                # Ask user
-                st.warning(f"**{current_q['missing_info']}**")
-                st.write(current_q['question'])
-                
-                options = current_q.get('options', [])
-                if options:
-                    selected_option = st.radio("Selecteer een optie:", options, key=f"q_{state['current_question_index']}")
-                    
-                    if "anders" in selected_option.lower():
-                        custom_answer = st.text_input("Specificeer:", key=f"custom_{state['current_question_index']}")
-                        if custom_answer:
-                            selected_option = custom_answer
-                    
-                    if st.button("➡️ Volgende", type="primary"):
-                        # Store answer
-                        answer_key = f"{clause_type}_{current_q['missing_info']}"
-                        if 'user_answers' not in st.session_state.notarial_info:
-                            st.session_state.notarial_info['user_answers'] = {}
-                        
-                        st.session_state.notarial_info['user_answers'][answer_key] = {
-                            "question": current_q['question'],
-                            "answer": selected_option,
-                            "missing_info": current_q['missing_info'],
-                            "clause_type": clause_type,
-                            "source": "manual_input"
-                        }
-                        
-                        state['current_question_index'] += 1
-                        st.rerun()
-                else:
-                    answer = st.text_input("Uw antwoord:", key=f"text_{state['current_question_index']}")
-                    if st.button("➡️ Volgende", type="primary") and answer:
-                        # Store answer
-                        answer_key = f"{clause_type}_{current_q['missing_info']}"
-                        if 'user_answers' not in st.session_state.notarial_info:
-                            st.session_state.notarial_info['user_answers'] = {}
-                        
-                        st.session_state.notarial_info['user_answers'][answer_key] = {
-                            "question": current_q['question'],
-                            "answer": answer,
-                            "missing_info": current_q['missing_info'],
-                            "clause_type": clause_type,
-                            "source": "manual_input"
-                        }
-                        
-                        state['current_question_index'] += 1
-                        st.rerun()
+            # All outstanding questions in one form, stored with a single submission
+            answers = render_question_form(state['questions'], f"questions_{state['row_number']}")
+            if answers:
+                for q, answer in zip(state['questions'], answers):
+                    store_user_answer(
+                        st.session_state.notarial_info, clause_type,
+                        q['missing_info'], q['question'],
+                        answer, "manual_input", options=q.get('options', [])
+                    )
+                state['questions'] = []
+                state['stage'] = 'generation'
+                st.rerun()
+            
+            # Park the clause so its questions can be answered together with other clauses
+            if st.button("⏭️ Later beantwoorden (batch)", type="secondary"):
+                state['clause_type'] = clause_type
+                for q in state['questions']:
+                    q['clause_type'] = clause_type
+                st.session_state.deferred_clauses[state['row_number']] = state
+                st.session_state.processing_state = {}
+                st.rerun()
         else:
             # All questions answered
             state['stage'] = 'generation'
@@ -1968,31 +6325,13 @@ SEARCH NOTES: {focused_result.get('search_notes', 'No notes')}
         with col2:
             st.metric("👤 User provided items", len(clause_user_answers))
         
-        # Create complete information set
+        # Create complete information set (deterministic merge, no LLM call)
         with st.spinner("🔧 Compileren van informatie..."):
             start_time = time.time()
-            if clause_user_answers:
-                complete_info = create_complete_information_set(
-                    state['research_data'], 
-                    clause_user_answers, 
-                    model
-                )
-            else:
-                # No user answers needed
-                complete_info = {
-                    "complete_information": {},
-                    "excluded_conditions": [],
-                    "compilation_notes": "All info from research",
-                    "ready_for_generation": True
-                }
-                # Convert research data
-                for key, data in state['research_data'].get('found_information', {}).items():
-                    if isinstance(data, dict) and 'value' in data:
-                        complete_info["complete_information"][key] = {
-                            "value": data['value'],
-                            "source": "research",
-                            "confidence": data.get('confidence', 'HIGH')
-                        }
+            complete_info = create_complete_information_set(
+                state['research_data'], 
+                clause_user_answers
+            )
             execution_time = time.time() - start_time
         
         # Show compilation results
@@ -2003,7 +6342,7 @@ SEARCH NOTES: {focused_result.get('search_notes', 'No notes')}
         # Show compilation log
         with st.expander("📊 COMPILATION AGENT - Log", expanded=True):
             st.code(f"""
-AGENT: Compilation
+AGENT: Compilation (local merge)
 TIME: {datetime.now().strftime('%H:%M:%S')}
 EXECUTION TIME: {execution_time:.2f}s
 READY FOR GENERATION: {complete_info.get('ready_for_generation', False)}
@@ -2029,8 +6368,9 @@ COMPILATION NOTES:
                 prompt, 
                 complete_info, 
                 state['research_data'], 
-                st.session_state.source_content, 
-                model
+                source_content, 
+                model.for_agent('generation'),
+                st.session_state.notarial_info
             )
             generation_time = time.time() - start_time
         
@@ -2047,8 +6387,18 @@ SCENARIO: {state['research_data'].get('applicable_scenario', 'Unknown')}
         
         st.success("✅ Clausule succesvol gegenereerd!")
         
-        # Store the result
+        # Store the result with the inputs it depended on
         st.session_state.processed_clauses[state['clause_name']] = final_clause
+        st.session_state.clause_fingerprints[state['clause_name']] = {
+            'row_number': state['row_number'],
+            'clause_type': clause_type,
+            'research_hash': put_json_blob(state['research_data']),
+            'edited': False,
+            'fingerprint': compute_clause_fingerprint(
+                prompt, clause_type, final_clause, state['research_data'],
+                st.session_state.notarial_info, source_content
+            )
+        }
         
         # Show the result with syntax highlighting
         st.subheader("📄 Gegenereerde Clausule")
@@ -2071,6 +6421,8 @@ SCENARIO: {state['research_data'].get('applicable_scenario', 'Unknown')}
             edited_clause = st.text_area("Bewerk de clausule:", value=final_clause, height=300, key="edit_clause")
             if st.button("💾 Wijzigingen opslaan"):
                 st.session_state.processed_clauses[state['clause_name']] = edited_clause
+                if state['clause_name'] in st.session_state.clause_fingerprints:
+                    st.session_state.clause_fingerprints[state['clause_name']]['edited'] = True
                 st.success("✅ Wijzigingen opgeslagen!")
         
         state['stage'] = 'complete'
@@ -2080,7 +6432,10 @@ SCENARIO: {state['research_data'].get('applicable_scenario', 'Unknown')}
     # Stage 6: Complete with summary
     elif state['stage'] == 'complete':
         if state['user_decision'] == 'skip':
-            st.info("⭕️ Clausule overgeslagen op gebruikersbeslissing")
+            if state.get('skip_reason'):
+                st.info(f"⭕️ Clausule automatisch overgeslagen: {state['skip_reason']}")
+            else:
+                st.info("⭕️ Clausule overgeslagen op gebruikersbeslissing")
         else:
             st.success(f"✅ Clausule '{state['clause_name']}' verwerkt en opgeslagen!")
             
@@ -2103,6 +6458,8 @@ SCENARIO: {state['research_data'].get('applicable_scenario', 'Unknown')}
                         st.write("5. ❓ User Input → Collected remaining information")
                     st.write("6. 🔧 Compilation Agent → Combined all information")
                     st.write("7. ✏️ Generation Agent → Created final clause")
+            
+            show_clause_call_report(state)
         
         # Clear processing state
         st.session_state.processing_state = {}
@@ -2254,10 +6611,11 @@ def show_export_section():
     """
         
         for i, (clause_name, clause_content) in enumerate(st.session_state.processed_clauses.items(), 1):
+            clause_html = clause_content.replace('\n', '<br>')
             html_content += f"""
     <div class="clause">
         <h3>{i}. {clause_name}</h3>
-        <p>{clause_content.replace('\n', '<br>')}</p>
+        <p>{clause_html}</p>
     </div>
     """
         
@@ -2295,5 +6653,16 @@ def show_export_section():
             st.success("✅ Bedankt voor het gebruik van de Notariële Clausule Processor!")
             st.balloons()
 
+def running_in_streamlit():
+    """True when the script is executed by `streamlit run`"""
+    try:
+        from streamlit import runtime
+        return runtime.exists()
+    except ImportError:
+        return False
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if running_in_streamlit():
+        main()
+    else:
+        sys.exit(cli_main(sys.argv[1:]))
\ No newline at end of file
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+APP_PATH = Path(__file__).resolve().parent.parent / "notarial-clause-streamlit-app.py"
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    os.environ.setdefault("GEMINI_API_KEY", "test")
+    os.environ.setdefault("BLOB_STORE_DIR", str(tmp_path_factory.mktemp("blobs")))
+    spec = importlib.util.spec_from_file_location("notarial_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
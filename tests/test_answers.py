@@ -0,0 +1,82 @@
+import pytest
+
+
+def answer(app, missing_info, question, value, clause="clausule"):
+    notarial_info = {'user_answers': {}}
+    app.store_user_answer(notarial_info, clause, missing_info, question, value, "manual_input")
+    return notarial_info['user_answers']
+
+
+@pytest.mark.parametrize("text, key", [
+    ("rijksregisternummer verkoper 2", "rijksregisternummer:verkoper_2"),
+    ("Rijksregisternummer van de tweede koper", "rijksregisternummer:koper_2"),
+    ("burgerlijke staat koper nr 1", "burgerlijke_staat:koper_1"),
+    ("rijksregisternummers van de kopers", None),
+    ("rijksregisternummer van de verkoper", None),
+    ("Wat is de koopsom?", "koopsom"),
+])
+def test_canonicalize_question(app, text, key):
+    assert app.canonicalize_question(text) == key
+
+
+@pytest.mark.parametrize("text, party", [
+    ("geboortedatum verkoper 1", ("verkoper", 1)),
+    ("adres van de derde koper", ("koper", 3)),
+    ("adres van de kopers", None),
+    ("adres koper", None),
+])
+def test_parse_party_reference(app, text, party):
+    assert app.parse_party_reference(text) == party
+
+
+def test_reuses_same_question_for_same_party(app):
+    answers = answer(app, "geboortedatum verkoper 1", "Wat is de geboortedatum van verkoper 1?", "01-02-1960")
+    entry, match_type = app.find_existing_answer("geboortedatum verkoper 1", "", answers)
+    assert entry['answer'] == "01-02-1960" and match_type == 'exact'
+
+
+@pytest.mark.parametrize("missing_info, question", [
+    ("geboortedatum verkoper 2", "Wat is de geboortedatum van verkoper 2?"),
+    ("geboortedatum", "Wat is de geboortedatum van verkoper 2?"),
+    ("geboortedatum verkoper", "Wat is de geboortedatum van de verkoper?"),
+    ("rijksregisternummer verkoper 2", ""),
+])
+def test_never_reuses_answer_of_other_party(app, missing_info, question):
+    answers = answer(app, "geboortedatum verkoper 1", "Wat is de geboortedatum van verkoper 1?", "01-02-1960")
+    answers.update(answer(app, "rijksregisternummer verkoper 1", "", "60.02.01-123.45"))
+    assert app.find_existing_answer(missing_info, question, answers) == (None, None)
+
+
+def test_reuses_canonical_key_across_wording(app):
+    answers = answer(app, "koopsom", "Wat is de koopsom?", "250.000 euro")
+    entry, match_type = app.find_existing_answer("verkoopprijs van het goed", "", answers)
+    assert entry['answer'] == "250.000 euro" and match_type == 'canonical'
+
+
+@pytest.mark.parametrize("stored, asked", [
+    (("kadastraal inkomen", "Wat is het kadastraal inkomen?", "1.250 euro"), "kadastrale perceelnummer"),
+    (("stookolietank", "Is er een stookolietank?", "Ja"), "inhoud stookolietank"),
+    (("EPC score", "Wat is de EPC score?", "250 kWh/m²"), "datum EPC"),
+])
+def test_topic_answers_are_not_reused_for_other_facts(app, stored, asked):
+    answers = answer(app, *stored)
+    assert app.find_existing_answer(asked, "", answers) == (None, None)
+
+
+@pytest.mark.parametrize("text, key", [
+    ("Is er een stookolietank aanwezig?", "stookolietank_aanwezig"),
+    ("stookolietank", None),
+    ("inhoud stookolietank in liter", "stookolietank_inhoud"),
+    ("Zijn er zonnepanelen?", "zonnepanelen_aanwezig"),
+    ("kadastraal inkomen", "kadastraal_inkomen"),
+    ("kadastrale perceelnummer", "kadastraal_perceel"),
+    ("datum EPC", "epc_datum"),
+])
+def test_canonical_keys_name_one_fact(app, text, key):
+    assert app.canonicalize_question(text) == key
+
+
+def test_presence_answer_is_reused(app):
+    answers = answer(app, "stookolietank aanwezig", "Is er een stookolietank?", "Nee")
+    entry, match_type = app.find_existing_answer("mazouttank", "Is er een mazouttank aanwezig?", answers)
+    assert entry['answer'] == "Nee" and match_type == 'canonical'
@@ -0,0 +1,57 @@
+import json
+from types import SimpleNamespace
+
+SOURCE = "\n\n--- Content from compromis.pdf ---\n\nDe verkoper verkoopt een woning zonder stookolietank.\n"
+
+
+class BatchModel:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return SimpleNamespace(text=response)
+
+
+def clauses(count):
+    return [{'row_number': number, 'clause_type': f"Clausule {number}", 'prompt': f"Prompt {number}"}
+            for number in range(1, count + 1)]
+
+
+def decision(number, beslissing, **extra):
+    return dict({'clause_number': number, 'clausule': f"Clausule {number}", 'finale_beslissing': beslissing,
+                 'redenering': f"Reden {number}"}, **extra)
+
+
+def test_decisions_are_parsed_per_clause(app):
+    response = "```json\n" + json.dumps({'decisions': [
+        decision(1, "JA (mag volledig verwijderd worden)"),
+        decision("2", "NEE"),
+        decision("drie", "JA"),
+    ]}) + "\n```"
+    decisions = app.check_clauses_applicability_batch(clauses(3), SOURCE, {}, BatchModel([response]))
+
+    assert set(decisions) == {1, 2}
+    assert decisions[1]['may_skip'] and not decisions[2]['may_skip']
+    assert decisions[2]['reasoning'] == "Reden 2"
+    assert "FINALE BESLISSING: JA" in decisions[1]['analysis']
+
+
+def test_failed_chunks_leave_clauses_to_the_per_clause_agent(app):
+    model = BatchModel([
+        json.dumps({'decisions': [decision(1, "JA"), decision(2, "NEE")]}),
+        RuntimeError("quota"),
+    ])
+    decisions = app.check_clauses_applicability_batch(clauses(3), SOURCE, {}, model, chunk_size=2)
+
+    assert len(model.prompts) == 2
+    assert "[Clausule 3: Clausule 3]" in model.prompts[1] and "[Clausule 1:" not in model.prompts[1]
+    assert set(decisions) == {1, 2}
+
+
+def test_unparseable_response_gives_no_decisions(app):
+    assert app.check_clauses_applicability_batch(clauses(2), SOURCE, {}, BatchModel(["geen JSON"])) == {}
@@ -0,0 +1,61 @@
+import json
+import os
+import time
+
+import pytest
+
+DAY = 24 * 3600
+
+
+@pytest.fixture
+def stores(app, tmp_path):
+    return app.BlobStore(tmp_path / "blobs"), app.DossierStore(str(tmp_path / "dossiers.sqlite3"))
+
+
+def age(store, *blob_hashes):
+    old = time.time() - 2 * DAY
+    for blob_hash in blob_hashes:
+        os.utime(store.path(blob_hash), (old, old))
+    for path in store.iter_refs():
+        os.utime(path, (old, old))
+
+
+def test_only_unreachable_old_blobs_are_collected(app, stores):
+    store, dossier_store = stores
+    part = store.put(b"--- Content from akte.pdf ---\n\nTekst")
+    research_text = store.put(b"onderzoekstekst")
+    research = store.put(json.dumps({'bron': research_text}).encode())
+    page_map = store.put(json.dumps({'document': "akte.pdf", 'pages': []}).encode())
+    store.set_ref(f"pages-{part}", page_map)
+    orphan = store.put(b"wees")
+    orphan_page_map = store.put(b'{"document": "weg.pdf"}')
+    store.set_ref(f"pages-{orphan}", orphan_page_map)
+    fresh = store.put(b"net geupload")
+    dossier_store.save("d1", "Dossier", "clauses", {
+        'source_manifest': (part,),
+        'clause_fingerprints': {'Clausule': {'research_hash': research}},
+    })
+    age(store, part, research_text, research, page_map, orphan, orphan_page_map)
+
+    dry_run = app.collect_blob_garbage(store, dossier_store, DAY, dry_run=True)
+    assert dry_run['blobs'] == 2 and store.path(orphan).exists()
+
+    stats = app.collect_blob_garbage(store, dossier_store, DAY)
+    assert stats == dry_run
+    assert stats['live'] == 4 and stats['refs'] == 1
+    for blob_hash in (part, research_text, research, page_map, fresh):
+        assert store.path(blob_hash).exists()
+    assert not store.path(orphan).exists() and not store.path(orphan_page_map).exists()
+    assert store.get_ref(f"pages-{part}") == page_map
+    assert store.get_ref(f"pages-{orphan}") is None
+
+
+def test_recently_used_refs_are_roots(app, stores):
+    store, dossier_store = stores
+    digest = store.put(b'{"samenvatting": "kort"}')
+    store.set_ref("digest-abc", digest)
+    age(store, digest)
+    store.get_ref("digest-abc")
+
+    assert app.collect_blob_garbage(store, dossier_store, DAY)['blobs'] == 0
+    assert store.path(digest).exists()
@@ -0,0 +1,47 @@
+import json
+from types import SimpleNamespace
+
+
+class DigestModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        return SimpleNamespace(text=json.dumps({
+            'samenvatting': "Compromis van de verkoop",
+            'feiten': [{'feit': "Prijs", 'citaat': "prijs van 250.000 euro"}],
+            'datums': [], 'bedragen': [], 'partijen': [],
+        }))
+
+
+def corpus(app, name):
+    return app.format_document_part(name, "De verkoper verkoopt het goed voor de prijs van 250.000 euro.\n")
+
+
+def test_agents_only_read_prepared_digests(app):
+    model = DigestModel()
+    source = corpus(app, "digest-test-1.pdf")
+    assert app.build_document_context(source, ["prijs"], model) is None
+    assert model.calls == 0
+
+    assert app.prepare_dossier_digest(source, model) == 1
+    assert model.calls == 1
+    context = app.build_document_context(source, ["prijs"], model)
+    assert "Compromis van de verkoop" in context and "Feit: Prijs" in context
+
+    app.prepare_dossier_digest(source, model)
+    assert model.calls == 1
+
+
+def test_failed_digest_is_not_retried_within_ttl(app):
+    class FailingModel(DigestModel):
+        def generate_content(self, prompt):
+            self.calls += 1
+            raise RuntimeError("quota")
+
+    model = FailingModel()
+    source = corpus(app, "digest-test-2.pdf")
+    assert app.prepare_dossier_digest(source, model) == 0
+    assert app.prepare_dossier_digest(source, model) == 0
+    assert model.calls == 1
@@ -0,0 +1,56 @@
+import pickle
+import zlib
+
+import pandas as pd
+import streamlit as st
+
+
+def test_values_round_trip_as_json(app, tmp_path):
+    store = app.DossierStore(str(tmp_path / "dossiers.sqlite3"))
+    values = {
+        'source_manifest': ("a" * 64, "b" * 64),
+        'deferred_clauses': {5: {'stage': 'questions', 'reused_answers': [({'q': 1}, {'a': 2})]}},
+        'csv_data': pd.DataFrame({'clause': ['A', 'B'], 'optimized_prompt': ['p', None]}),
+        'current_step': 'clauses',
+    }
+    assert store.save("d1", "Dossier", "clauses", values) == 4
+    assert store.save("d1", "Dossier", "clauses", values) == 0
+
+    loaded = store.load("d1")
+    assert loaded['source_manifest'] == values['source_manifest']
+    assert loaded['deferred_clauses'] == values['deferred_clauses']
+    assert loaded['current_step'] == 'clauses'
+    pd.testing.assert_frame_equal(loaded['csv_data'], values['csv_data'])
+    assert all(data[:1] in (b'{', b'[', b'"') for data in store.iter_artifact_data())
+
+
+def test_pickled_artifacts_are_not_loaded(app, tmp_path):
+    store = app.DossierStore(str(tmp_path / "dossiers.sqlite3"))
+    store.save("d1", "Dossier", "intake", {'current_step': 'intake'})
+    store.conn.execute(
+        "INSERT INTO artifacts (dossier_id, key, hash, data) VALUES (?, ?, ?, ?)",
+        ("d1", "notarial_info", "x", zlib.compress(pickle.dumps({'repertorium_nummer': '1'})))
+    )
+    assert store.load("d1") == {'current_step': 'intake'}
+
+
+def test_checkpoint_only_writes_when_progress_changes(app, tmp_path, monkeypatch):
+    store = app.DossierStore(str(tmp_path / "dossiers.sqlite3"))
+    saves = []
+    original_save = store.save
+    monkeypatch.setattr(store, "save", lambda *args: saves.append(args) or original_save(*args))
+    monkeypatch.setattr(app, "get_dossier_store", lambda: store)
+    app.init_session_state()
+    st.session_state.notarial_info = {'repertorium_nummer': '2026/1'}
+    st.session_state.pop('checkpoint_marker', None)
+
+    app.checkpoint_dossier()
+    app.checkpoint_dossier()
+    assert len(saves) == 1
+
+    st.session_state.notarial_info['user_answers'] = {'q': {'answer': 'ja'}}
+    app.checkpoint_dossier()
+    st.session_state.current_step = 'documents'
+    app.checkpoint_dossier()
+    app.checkpoint_dossier()
+    assert len(saves) == 3
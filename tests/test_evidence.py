@@ -0,0 +1,32 @@
+import pandas as pd
+
+
+def test_evidence_hits_and_passages(app):
+    source = "Het goed beschikt over een ondergrondse stookolietank van 3000 liter. Er is geen alarm."
+    evidence_map = app.scan_factual_evidence(source)
+    tank = evidence_map[39]
+    assert 'stookolietank' in {hit['term'] for hit in tank['hits']}
+    assert tank['passages'] and "stookolietank" in tank['passages'][0]['text']
+    assert evidence_map[46]['hits'] == []
+
+
+def test_essential_clauses_have_no_evidence_entry(app):
+    assert not set(app.FACTUAL_CLAUSE_EVIDENCE) & set(app.ESSENTIAL_CLAUSES)
+
+
+def test_clause_number_column_keys_the_lookup(app):
+    df = pd.DataFrame({
+        'clause': ["ZONNEPANELEN_CLAUSULE", "IDENTITEIT_CLAUSULE"],
+        'optimized_prompt': ["p", "p"],
+        'clause_number': [46, 1],
+    })
+    evidence_map = app.scan_factual_evidence("Geen bijzonderheden.")
+    assert app.get_clause_number(df, 1) == 46
+    assert app.get_clause_evidence(evidence_map, df, 1)['label'] == 'ZONNEPANELEN'
+    assert app.get_clause_evidence(evidence_map, df, 2) is None
+    assert app.is_essential_clause(df, 2) and not app.is_essential_clause(df, 1)
+
+
+def test_row_position_without_clause_number_column(app):
+    df = pd.DataFrame({'clause': ["X"] * 3, 'optimized_prompt': ["p"] * 3})
+    assert app.get_clause_number(df, 3) == 3
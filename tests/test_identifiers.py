@@ -0,0 +1,67 @@
+import pytest
+
+
+def percelen(app, text):
+    return [item['value'] for item in app.extract_structured_identifiers(text)['kadastrale_percelen']]
+
+
+@pytest.mark.parametrize("conjunction", ["en", "of", "En"])
+def test_kadaster_number_followed_by_conjunction(app, conjunction):
+    values = percelen(app, f"sectie B nummer 123 {conjunction} 124")
+    assert [value['nummer'] for value in values] == ["123"]
+    assert values[0]['sectie'] == "B"
+
+
+@pytest.mark.parametrize("text, nummer", [
+    ("sectie B nummer 123A", "123A"),
+    ("sectie B nummer 123 A en 124", "123A"),
+    ("sectie C perceelnummer 45/02B", "45/02B"),
+    ("2e afdeling sectie a nr. 678 of 679", "678"),
+])
+def test_kadaster_uppercase_suffix(app, text, nummer):
+    assert [value['nummer'] for value in percelen(app, text)] == [nummer]
+
+
+@pytest.mark.parametrize("value, valid", [
+    ("85.07.30-033.28", True),
+    ("85073003328", True),
+    ("05.01.01-123.85", True),
+    ("85.07.30-033.29", False),
+    ("05.01.01-123.57", False),
+    ("85.07.30-033", False),
+])
+def test_validate_rijksregisternummer(app, value, valid):
+    assert app.validate_rijksregisternummer(value) is valid
+
+
+RRN_SOURCE = (
+    "Verkoper: de heer Jan Peeters, rijksregisternummer 85.07.30-033.28, wonende te Gent.\n"
+    "Koper 1: mevrouw An Janssens, rijksregisternummer 62.02.15-145.42, wonende te Brugge.\n"
+    "Koper 2: de heer Tom Maes, rijksregisternummer 05.01.01-123.85, wonende te Brugge.\n"
+)
+RRN_INFO = {
+    'verkopers': [{'volgnummer': 1, 'voornaam': "Jan", 'achternaam': "Peeters"}],
+    'kopers': [{'volgnummer': 1, 'voornaam': "An", 'achternaam': "Janssens"},
+               {'volgnummer': 2, 'voornaam': "Tom", 'achternaam': "Maes"}],
+}
+
+
+def local_rrn(app, missing_info):
+    result = app.local_search_for_missing_info(
+        missing_info, app.extract_structured_identifiers(RRN_SOURCE), RRN_SOURCE, RRN_INFO
+    )
+    return result and result['found_items'][missing_info]['value']
+
+
+@pytest.mark.parametrize("missing_info, value", [
+    ("rijksregisternummer koper 2", "05.01.01-123.85"),
+    ("rijksregisternummer van de tweede koper", "05.01.01-123.85"),
+    ("rijksregisternummer koper 1", "62.02.15-145.42"),
+    ("rijksregisternummer van de verkoper", "85.07.30-033.28"),
+    ("rijksregisternummers van de kopers", None),
+    ("rijksregisternummer van de koper", None),
+    ("rijksregisternummer koper 3", None),
+    ("rijksregisternummer", None),
+])
+def test_local_rijksregisternummer_needs_one_named_party(app, missing_info, value):
+    assert local_rrn(app, missing_info) == value
@@ -0,0 +1,80 @@
+import pytest
+
+
+def user_answers(app, *answers):
+    notarial_info = {'user_answers': {}}
+    for missing_info, question, answer, options in answers:
+        app.store_user_answer(notarial_info, "C1_CLAUSULE", missing_info, question, answer, "manual_input", options=options)
+    return notarial_info['user_answers']
+
+
+def research(**items):
+    return {'found_information': {key: {'value': value, 'confidence': 'HIGH'} for key, value in items.items()}}
+
+
+@pytest.mark.parametrize("raw, typed", [
+    ("Nee", (False, 'boolean')),
+    ("ja, 3000 liter", (True, 'boolean')),
+    ("Geen idee", ("Geen idee", 'text')),
+    ("n.v.t.", (False, 'boolean')),
+    ("3 januari 2020", ("03-01-2020", 'date')),
+    ("€ 250.000,00", (250000.0, 'amount')),
+    ("12", (12, 'number')),
+    ("Gent", ("Gent", 'text')),
+])
+def test_parse_typed_value(app, raw, typed):
+    assert app.parse_typed_value(raw) == typed
+
+
+def test_research_values_are_typed_with_provenance(app):
+    merged = app.create_complete_information_set(research(koopsom="250.000 euro", datum="03/01/2020"), {})
+    info = merged['complete_information']
+    assert info['datum']['typed_value'] == "03-01-2020" and info['datum']['source'] == 'research'
+    assert merged['ready_for_generation'] and merged['excluded_conditions'] == []
+
+
+def test_user_answer_overrides_research_for_same_item(app):
+    answers = user_answers(app, ("verkoopprijs", "Wat is de verkoopprijs?", "260.000 euro", []))
+    merged = app.create_complete_information_set(research(koopsom="250.000 euro"), answers)
+    koopsom = merged['complete_information']['koopsom']
+    assert koopsom['value'] == "260.000 euro" and koopsom['source'] == 'user'
+    assert koopsom['provenance']['overrides'] == {'value': "250.000 euro", 'source': 'research'}
+    assert "vervangt onderzoekswaarde" in merged['compilation_notes']
+
+
+def test_unrelated_answer_does_not_override(app):
+    answers = user_answers(app, ("kadastraal inkomen", "Wat is het kadastraal inkomen?", "1.250", []))
+    merged = app.create_complete_information_set(research(kadastrale_perceelnummer="sectie B 123A"), answers)
+    assert merged['complete_information']['kadastrale_perceelnummer']['value'] == "sectie B 123A"
+    assert merged['complete_information']['kadastraal_inkomen']['value'] == "1.250"
+
+
+@pytest.mark.parametrize("missing_info, question, options", [
+    ("stookolietank", "Is er een stookolietank aanwezig?", []),
+    ("bodemattest", "Heeft de verkoper een bodemattest?", []),
+    ("gezinswoning", "Is het goed de gezinswoning van de verkoper?", ["Ja", "Nee", "Anders"]),
+])
+def test_negative_presence_answer_excludes_condition(app, missing_info, question, options):
+    merged = app.create_complete_information_set({}, user_answers(app, (missing_info, question, "Nee", options)))
+    assert merged['excluded_conditions'] == [missing_info]
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("Welke afspraken gelden voor de erfdienstbaarheid?", "Nee, maar er is een recht van overgang"),
+    ("Wat is de datum van het EPC?", "Geen idee"),
+])
+def test_other_negative_answers_do_not_exclude(app, question, answer):
+    merged = app.create_complete_information_set({}, user_answers(app, ("erfdienstbaarheid", question, answer, [])))
+    assert merged['excluded_conditions'] == []
+
+
+def test_user_decision_condition(app):
+    answers = user_answers(app, ("beding van aanwas", "Wensen de kopers een beding van aanwas?", "Nee", ["Ja", "Nee"]))
+    merged = app.create_complete_information_set({}, answers)
+    assert merged['complete_information']['beding_van_aanwas_aanwezig']['typed_value'] is False
+    assert "beding van aanwas" in merged['excluded_conditions']
+
+
+def test_empty_answer_blocks_generation(app):
+    merged = app.create_complete_information_set({}, user_answers(app, ("koopsom", "Wat is de koopsom?", "", [])))
+    assert not merged['ready_for_generation']
@@ -0,0 +1,103 @@
+import PyPDF2
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+
+def write_pdf(path, texts):
+    writer = PyPDF2.PdfWriter()
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'), NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    })
+    for text in texts:
+        page = PyPDF2.PageObject.create_blank_page(width=595, height=842)
+        contents = DecodedStreamObject()
+        contents.set_data(f"BT /F1 12 Tf 72 700 Td ({text}) Tj ET".encode())
+        page[NameObject('/Contents')] = contents
+        page[NameObject('/Resources')] = DictionaryObject({NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})})
+        writer.add_page(page)
+    with open(path, 'wb') as file:
+        writer.write(file)
+    return path
+
+
+def ingest_text_file(app, tmp_path, name, pages):
+    path = tmp_path / name
+    path.write_bytes("\f".join(pages).encode("utf-8"))
+    return app.ingest_document_file(name, path)
+
+
+def test_page_index_follows_the_manifest_parts(app, tmp_path):
+    part_hash = ingest_text_file(app, tmp_path, "pagina's.txt", ["Eerste pagina met de prijs", "Tweede pagina: één woning"])
+    intake_hash = app.put_text_blob(app.format_notarial_info_as_text({'videoconferentie': False}))
+    source_content = app.assemble_source_content((part_hash, intake_hash))
+
+    page_index = app.get_page_index(source_content)
+    second = page_index.resolve(source_content.index("Tweede"))
+    assert second['document_id'] == part_hash
+    assert page_index.label(second['start']) == "pagina's.txt, p. 2"
+    assert page_index.resolve(source_content.index("NOTARIËLE INFORMATIE")) is None
+
+    # Text that was not assembled from a manifest has no link to page maps
+    unlinked = app.PageIndex(app.format_document_part("pagina's.txt", "Eerste pagina"))
+    assert unlinked.entries[0]['page'] is None
+
+
+def test_reextract_text_page_by_byte_offsets(app, tmp_path):
+    pages = ["Één — eerste pagina", "Tweede pagina", "Derde pagina\nmet twee regels"]
+    part_hash = ingest_text_file(app, tmp_path, "bundel.txt", pages)
+    page_map = app.get_page_map(part_hash)
+    assert page_map['page_count'] == 3 and len(page_map['page_offsets']) == 3
+
+    assert [app.reextract_page(part_hash, number) for number in (1, 2, 3)] == pages
+    assert app.reextract_page(part_hash, 4) is None
+
+
+def test_pdf_pages_stream_with_a_fresh_reader_per_batch(app, tmp_path, monkeypatch):
+    texts = [f"Artikel {number} van de verkoop" for number in range(1, 6)]
+    path = write_pdf(tmp_path / "bundel.pdf", texts)
+    readers = []
+
+    class CountingReader(PyPDF2.PdfReader):
+        def __init__(self, stream):
+            readers.append(self)
+            super().__init__(stream)
+
+    monkeypatch.setattr(app, "PDF_READER_BATCH_PAGES", 2)
+    monkeypatch.setattr(PyPDF2, "PdfReader", CountingReader)
+    assert list(app.iter_pdf_pages(path)) == texts
+    assert len(readers) == 3
+
+    part_hash = app.ingest_document_file("bundel.pdf", path)
+    assert app.reextract_page(part_hash, 4) == "Artikel 4 van de verkoop"
+
+
+def normalize(app, pages):
+    normalizer = app.PageNormalizer(app.find_repeated_lines(pages))
+    text = "".join(normalizer.add_page(page) for page in pages)
+    offset_map = {'normalized': list(normalizer.normalized_offsets), 'original': list(normalizer.original_offsets)}
+    return normalizer, text, offset_map
+
+
+def test_normalizer_strips_boilerplate_and_keeps_content(app):
+    pages = [
+        "Notariskantoor Peeters\nDe   koper betaalt\n250\nPagina 1 van 4",
+        "Notariskantoor Peeters\nHet goed is een woning\n2\nPagina 2 van 4",
+        "Notariskantoor Peeters\n\n   \nPagina 3 van 4",
+        "Notariskantoor Peeters\nkadastraal inkomen 2025\nPagina 4 van 4",
+    ]
+    normalizer, text, _ = normalize(app, pages)
+
+    assert text == "De koper betaalt\n250\n\nHet goed is een woning\n\nkadastraal inkomen 2025\n"
+    assert normalizer.stats() == {'pages': 4, 'empty_pages': 1, 'removed_lines': 9}
+    assert [page for _, _, page in normalizer.page_ranges] == [1, 2, 4]
+
+
+def test_normalized_offsets_map_back_to_the_extracted_text(app):
+    pages = ["Kop\n  De   koper  betaalt 250 euro", "Kop\nHet goed\tis een woning", "Kop\nEinde"]
+    _, text, offset_map = normalize(app, pages)
+    original = "".join(page + "\n" for page in pages)
+
+    assert text == "De koper betaalt 250 euro\n\nHet goed is een woning\n\nEinde\n"
+    for word, original_word in (("koper", "koper"), ("250", "250"), ("goed is", "goed\tis"), ("woning", "woning"), ("Einde", "Einde")):
+        assert original[app.map_to_original_offset(offset_map, text.index(word)):].startswith(original_word)
+    assert app.map_to_original_offset(offset_map, -1) == 0
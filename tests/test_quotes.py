@@ -0,0 +1,72 @@
+import pytest
+
+@pytest.fixture(scope="module")
+def corpus(app):
+    return app.format_document_part("compromis.pdf", CONTENT)
+
+
+CONTENT = (
+    "De verkoper verkoopt aan de koper het goed voor de prijs van 250.000,00 euro.\n"
+    "Het elektrisch keuringsverslag werd opgemaakt op 3 januari 2020 door Vinçotte.\n"
+)
+
+
+@pytest.fixture
+def index(app, corpus):
+    return app.QuoteIndex(corpus)
+
+
+def test_exact_quote_is_located(index, corpus):
+    verification = index.verify("opgemaakt op 3 januari 2020 door Vinçotte")
+    assert verification['status'] == 'exact'
+    assert verification['document'] == "compromis.pdf"
+    assert corpus[verification['start']:verification['end']] == "opgemaakt op 3 januari 2020 door Vinçotte"
+
+
+def test_partial_and_unverified_quotes(index):
+    long_quote = "de verkoper verkoopt aan de koper het goed voor de prijs van 250.000,00 euro. het elektrisch keuringsverslag werd"
+    assert index.verify(long_quote.replace("verkoopt", "verkocht"))['status'] == 'partial'
+    assert index.verify("de koper betaalt een voorschot van tien procent")['status'] == 'unverified'
+
+
+@pytest.mark.parametrize("value, found", [
+    ("250000", True),
+    ("250.000 euro", True),
+    ("03-01-2020", True),
+    ("300.000 euro", False),
+])
+def test_value_in_quoted_range(index, value, found):
+    quote = "voor de prijs van 250.000,00 euro. Het elektrisch keuringsverslag werd opgemaakt op 3 januari 2020"
+    verification = index.verify(quote)
+    assert index.value_in_range(value, verification['start'], verification['end']) is found
+
+
+def research(items):
+    return {'found_information': {key: dict(item, confidence='HIGH') for key, item in items.items()}}
+
+
+def test_verify_research_quotes_downgrades_unverified_items(app, corpus):
+    data = app.verify_research_quotes(research({
+        'koopsom': {'value': "250.000 euro", 'source_quote': "voor de prijs van 250.000,00 euro"},
+        'wrong_value': {'value': "300.000 euro", 'source_quote': "voor de prijs van 250.000,00 euro"},
+        'partial': {'value': "250.000 euro", 'source_quote': "de verkoper verkocht aan de koper het goed voor de prijs van 250.000,00 euro"},
+        'no_quote': {'value': "ja"},
+    }), corpus)
+    found = data['found_information']
+    assert found['koopsom']['confidence'] == 'HIGH'
+    assert found['koopsom']['quote_verification']['value_found']
+    for key in ('wrong_value', 'partial', 'no_quote'):
+        assert found[key]['confidence'] == 'LOW'
+        assert found[key]['original_confidence'] == 'HIGH'
+    assert found['no_quote']['quote_verification'] == {'status': 'missing'}
+    assert sorted(data['unverified_quotes']) == ['no_quote', 'partial', 'wrong_value']
+
+
+def test_unconfirmed_research_is_not_a_fact(app, corpus):
+    data = app.verify_research_quotes(research({
+        'koopsom': {'value': "250.000 euro", 'source_quote': "voor de prijs van 250.000,00 euro"},
+        'keuringsdatum': {'value': "03-01-2021", 'source_quote': "opgemaakt op 3 januari 2020"},
+    }), corpus)
+    merged = app.create_complete_information_set(data, {})
+    assert list(merged['complete_information']) == ['koopsom']
+    assert "keuringsdatum" in merged['compilation_notes']
@@ -0,0 +1,52 @@
+import pytest
+
+
+def test_split_research_chunks_cover_the_corpus_with_overlap(app):
+    text = "".join(f"regel {n} van het dossier\n" for n in range(3000))
+    chunks = app.split_research_chunks(text, chunk_chars=10000, overlap=500)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(text)
+    for (start, end), (next_start, _) in zip(chunks, chunks[1:]):
+        assert next_start < end <= start + 10000
+        assert text[end - 1] == "\n"
+
+
+def test_merge_research_results(app):
+    merged = app.merge_research_results([
+        {
+            'applicable_scenario': "verkoop",
+            'research_summary': "eerste deel",
+            'found_information': {
+                'koopsom': {'value': "250.000 euro", 'confidence': 'MEDIUM'},
+                'leeg': {'value': 'NOT_FOUND'},
+            },
+            'missing_information': ["EPC datum", {'item': "Koopsom"}],
+            'required_information': [{'item': "koopsom"}],
+        },
+        {
+            'applicable_scenario': "Unknown",
+            'found_information': {
+                'koopsom': {'value': "260.000 euro", 'confidence': 'HIGH'},
+                'epc_datum': {'value': "01-01-2020", 'confidence': 'HIGH'},
+            },
+            'missing_information': ["stookolietank"],
+            'required_information': [{'item': "Koopsom"}, "EPC datum"],
+        },
+    ])
+    found = merged['found_information']
+    assert found['koopsom']['value'] == "260.000 euro" and found['koopsom']['source_chunk'] == 2
+    assert 'leeg' not in found
+    assert [item['value'] for item in merged['map_reduce']['conflicts']['koopsom']] == ["250.000 euro", "260.000 euro"]
+    assert merged['missing_information'] == ["stookolietank"]
+    assert len(merged['required_information']) == 2
+    assert merged['applicable_scenario'] == "verkoop"
+    assert merged['map_reduce']['chunks'] == 2
+
+
+@pytest.mark.parametrize("size, expected", [(20000, 'single'), (950000, 'map_reduce')])
+def test_research_uses_map_reduce_only_above_threshold(app, monkeypatch, size, expected):
+    calls = []
+    monkeypatch.setattr(app, 'research_map_reduce', lambda *args: calls.append('map_reduce') or {})
+    monkeypatch.setattr(app, 'build_document_context', lambda *args, **kwargs: "digest")
+    monkeypatch.setattr(app, 'run_research_prompt', lambda prompt, model: calls.append('single') or {})
+    app.research_agent_determine_needs("prompt", "C1_CLAUSULE", "x" * size, None)
+    assert calls == [expected]
@@ -0,0 +1,81 @@
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+INTAKE = {
+    "repertorium_nummer": "R1", "videoconferentie": False,
+    "verkopers": [{"volgnummer": 1, "voornaam": "Jan", "achternaam": "Peeters", "burgerlijke_staat": "gehuwd"}],
+    "kopers": [{"volgnummer": 1, "voornaam": "An", "achternaam": "Janssens", "burgerlijke_staat": "ongehuwd"}],
+}
+
+
+@pytest.fixture(scope="module")
+def server(app, tmp_path_factory):
+    clauses = tmp_path_factory.mktemp("service") / "clauses.csv"
+    clauses.write_text("clause,optimized_prompt,x,skip_conditions\n"
+                       "C1_CLAUSULE,Prompt over de woning,,\n"
+                       "C2_CLAUSULE,Prompt over de prijs,,\n", encoding="utf-8")
+    server = app.create_service_server("127.0.0.1", 0, str(clauses), workers=2, stub=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method, path, payload=None):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else None
+    connection.request(method, path, body=body, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    data = json.loads(response.read())
+    connection.close()
+    return response.status, data
+
+
+@pytest.fixture(scope="module")
+def documents_id(server):
+    status, data = request(server, "POST", "/documents", {"documents": [
+        {"name": "../akte.txt", "text": "De verkoper verkoopt het goed voor 250.000 euro.\fPagina twee van de akte."}
+    ]})
+    assert status == 200 and data['documents'] == 1
+    return data['documents_id']
+
+
+def test_health(server):
+    status, data = request(server, "GET", "/health")
+    assert status == 200 and data['status'] == 'ok'
+
+
+def test_job_runs_to_completion(server, documents_id):
+    status, data = request(server, "POST", "/jobs", {"documents_id": documents_id, "intake": INTAKE})
+    assert status == 202
+    deadline = time.time() + 10
+    while True:
+        status, job = request(server, "GET", data['status_url'])
+        if job['status'] in ('done', 'failed') or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert status == 200 and job['status'] == 'done'
+    assert job['completed'] == job['total'] == 2
+
+
+@pytest.mark.parametrize("path", ["/jobs", "/intake/extract", "/applicability"])
+@pytest.mark.parametrize("documents_id, expected", [
+    ("../../etc/passwd", 400),
+    ("ab" * 31 + "/x", 400),
+    (12, 400),
+    ("0" * 64, 404),
+])
+def test_bad_documents_id_is_rejected(server, path, documents_id, expected):
+    status, data = request(server, "POST", path, {"documents_id": documents_id, "intake": INTAKE})
+    assert status == expected
+    assert 'error' in data
+
+
+def test_unknown_routes(server):
+    assert request(server, "GET", "/jobs/unknown")[0] == 404
+    assert request(server, "POST", "/nothing", {})[0] == 404